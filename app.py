@@ -1,11 +1,17 @@
 # app.py
+import atexit
 import os
-from datetime import datetime
-from flask import Flask, request, abort, jsonify
-from dotenv import load_dotenv
+import signal
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+# Start of the cold-start clock reported as todo_startup_seconds.
+STARTED_AT = time.perf_counter()
 
-from linebot.v3.messaging import Configuration, ApiClient, MessagingApi
-from linebot.v3.messaging.models import ReplyMessageRequest, TextMessage as V3TextMessage
+from flask import Flask, Response, request, abort, jsonify
+from dotenv import load_dotenv
 
 try:
     from linebot.v3.webhook import WebhookParser
@@ -13,289 +19,307 @@ except Exception:
     from linebot.v3.webhooks import WebhookParser
 
 import database as db
+import metrics
+import transfer
+from archiver import Archiver
+from commands import list_cache, router, user_states
+from dedupe import EventDeduplicator
+from line_client import ReplySender
+from ratelimit import RateLimiter
+from reminders import ReminderScheduler
+from workers import EventDispatcher
 
 load_dotenv()
 
 CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
 CHANNEL_SECRET = os.getenv("LINE_CHANNEL_SECRET")
+# With WEBHOOK_WORKERS > 0, /callback only verifies and queues events and
+# returns right away; replies are sent from a pool of background workers.
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 0))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))
+# Redelivered webhook events are dropped if their webhookEventId was seen in the
+# last WEBHOOK_DEDUPE_WINDOW seconds; WEBHOOK_DEDUPE_PERSIST=1 shares the record
+# between worker processes through the database.
+WEBHOOK_DEDUPE_WINDOW = int(os.getenv("WEBHOOK_DEDUPE_WINDOW", 3600))
+WEBHOOK_DEDUPE_MAX = int(os.getenv("WEBHOOK_DEDUPE_MAX", 100000))
+WEBHOOK_DEDUPE_PERSIST = os.getenv("WEBHOOK_DEDUPE_PERSIST", "0") == "1"
+# Each user may send RATE_LIMIT_BURST messages at once, refilled at
+# RATE_LIMIT_PER_SEC per second (0 disables); at most MAX_CONCURRENT_HANDLERS
+# commands run at the same time. Anything over gets a canned reply.
+RATE_LIMIT_PER_SEC = float(os.getenv("RATE_LIMIT_PER_SEC", 1))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 10))
+MAX_CONCURRENT_HANDLERS = int(os.getenv("MAX_CONCURRENT_HANDLERS", 32))
+# Completed items older than ARCHIVE_AFTER_DAYS days (0 disables) are moved to
+# the archive every ARCHIVE_INTERVAL seconds, ARCHIVE_BATCH_SIZE rows at a time.
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", 30))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", 3600))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 500))
+# Reminders for items with a due date are pushed by one process at a time,
+# chosen through a lease row that expires REMINDER_LEASE_TTL seconds after
+# its holder stops renewing it. REMINDERS_ENABLED=0 keeps this process out.
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "1") == "1"
+REMINDER_LOOKAHEAD = float(os.getenv("REMINDER_LOOKAHEAD", 600))
+REMINDER_REFILL_INTERVAL = float(os.getenv("REMINDER_REFILL_INTERVAL", 30))
+REMINDER_LEASE_TTL = float(os.getenv("REMINDER_LEASE_TTL", 30))
+# Sent for an event whose command raised; the other events of the delivery are still applied.
+EVENT_ERROR_REPLY = "處理時發生錯誤，請稍後再試。"
+# Overrides https://api.line.me, e.g. to send replies to a local stub server.
+LINE_API_HOST = os.getenv("LINE_API_HOST")
 
 if not CHANNEL_ACCESS_TOKEN or not CHANNEL_SECRET:
     raise RuntimeError("請在 .env 設定 LINE_CHANNEL_ACCESS_TOKEN 與 LINE_CHANNEL_SECRET")
 
 app = Flask(__name__)
+startup_timer = metrics.StartupTimer(STARTED_AT)
 parser = WebhookParser(channel_secret=CHANNEL_SECRET)
+reply_sender = ReplySender(CHANNEL_ACCESS_TOKEN, host=LINE_API_HOST, pool_maxsize=max(WEBHOOK_WORKERS, 4),
+                           logger=app.logger)
+
+deduplicator = EventDeduplicator(window=WEBHOOK_DEDUPE_WINDOW, maxsize=WEBHOOK_DEDUPE_MAX,
+                                 persistent=WEBHOOK_DEDUPE_PERSIST)
+
+rate_limiter = RateLimiter(rate=RATE_LIMIT_PER_SEC, burst=RATE_LIMIT_BURST,
+                           max_concurrent=MAX_CONCURRENT_HANDLERS)
 
-# Initialize the database
+# Creates or upgrades the schema; an up-to-date database costs a single query.
 db.init_db()
 
+archiver = None
+if ARCHIVE_AFTER_DAYS > 0:
+    archiver = Archiver(min_age_days=ARCHIVE_AFTER_DAYS, interval=ARCHIVE_INTERVAL,
+                        batch_size=ARCHIVE_BATCH_SIZE, logger=app.logger).start()
+
+reminder_scheduler = None
+if REMINDERS_ENABLED:
+    reminder_scheduler = ReminderScheduler(reply_sender, lookahead=REMINDER_LOOKAHEAD,
+                                           refill_interval=REMINDER_REFILL_INTERVAL,
+                                           lease_ttl=REMINDER_LEASE_TTL, logger=app.logger).start()
+    router.on_due = reminder_scheduler.notify
+
 # ------------------------
 # Flask + LINE Webhook
 # ------------------------
-user_states = {}
-
-def handle_stateful_message(user_id, text):
-    state = user_states[user_id]
-    action = state.get("action")
-    t = text.strip()
-
-    if t.lower() == "取消":
-        del user_states[user_id]
-        return "操作已取消。"
-
-    # --- Add Item Flow ---
-    if action == "add_item":
-        stage = state.get("stage")
-        if stage == "awaiting_category":
-            state["data"]["category"] = t
-            state["stage"] = "awaiting_sub_category"
-            return "請輸入子分類："
-        elif stage == "awaiting_sub_category":
-            state["data"]["sub_category"] = t
-            state["stage"] = "awaiting_title"
-            return "請輸入待辦事項名稱："
-        elif stage == "awaiting_title":
-            state["data"]["title"] = t
-            state["stage"] = "awaiting_place"
-            return "請輸入地點（若無請輸入'無'）："
-        elif stage == "awaiting_place":
-            place = t if t.lower() not in ["無", "none", "skip"] else None
-            data = state["data"]
-            db.add_item(user_id, data["category"], data["sub_category"], data["title"], place=place)
-            del user_states[user_id]
-            return f"已新增：{data['title']} ({data['category']}/{data['sub_category']})" + (f"，地點：{place}" if place else "")
-    
-    # --- Edit Item Flow ---
-    elif action == "edit_item":
-        stage = state.get("stage")
-        item_id = state.get("item_id")
-
-        if stage == "awaiting_field_choice":
-            if t in ["1", "名稱"]:
-                state["stage"] = "awaiting_new_value"
-                state["field"] = "title"
-                return "請輸入新的「名稱」："
-            elif t in ["2", "地點"]:
-                state["stage"] = "awaiting_new_value"
-                state["field"] = "place"
-                return "請輸入新的「地點」（若要清空請輸入'無'）："
-            else:
-                return "無效的選項，請重新輸入 (1 或 2)，或輸入'取消'。"
-        
-        elif stage == "awaiting_new_value":
-            field = state.get("field")
-            value = t if not (field == 'place' and t.lower() in ['無', 'none']) else None
-            
-            if db.edit_item(user_id, item_id, field, value):
-                del user_states[user_id]
-                return f"待辦事項 [{item_id}] 已更新。"
-            else:
-                del user_states[user_id] # Clear state even on failure
-                return f"更新失敗，找不到項目 [{item_id}] 或欄位不正確。"
-
-    return "發生未知錯誤，請取消後重試。"
-
-
 @app.get("/health")
 def health():
     return jsonify({"status": "ok"})
 
+def build_reply(event):
+    """Runs the command for one event; returns (reply_token, messages) or None.
+
+    Shared by the Flask handler below and by asgi.py, which sends the reply
+    itself through an async client.
+    """
+    ev_type = getattr(event, "type", None)
+    user_id = getattr(event.source, "user_id", None)
+    reply_token = getattr(event, "reply_token", None)
+
+    if ev_type == "message":
+        msg = getattr(event, "message", None)
+        text = getattr(msg, "text", None) if msg else None
+
+        if text is None:
+            reply_text = "我目前只處理文字訊息，請傳文字給我。"
+        elif not rate_limiter.allow(user_id):
+            reply_text = "訊息太頻繁了，請稍後再試。"
+        elif not rate_limiter.acquire():
+            reply_text = "系統忙碌中，請稍後再試。"
+        else:
+            try:
+                reply_text = router.dispatch(user_id, text)
+            finally:
+                rate_limiter.release()
+
+        if reply_token:
+            return reply_token, reply_text if isinstance(reply_text, list) else [reply_text]
+
+    elif ev_type == "follow":
+        if reply_token:
+            return reply_token, ["謝謝你加我為好友！輸入 help 查看指令。"]
+    else:
+        app.logger.debug("Unhandled event type: %s", ev_type)
+    return None
+
+def run_events(events, deduplicate=True):
+    """Runs the events of one delivery and returns their replies once the work is committed.
+
+    Several events share one database transaction and commit once (a single
+    event already commits once, and a shared write transaction would only hold
+    SQLite's write lock through its reads); each runs inside a savepoint, so a failing event is rolled back and answered with an
+    error while the others are kept. Replies are only returned after the
+    commit, so nothing is confirmed to the user that could still be rolled
+    back. If the commit itself fails, the events are forgotten by the
+    deduplicator so a redelivery runs them again, and the error is raised.
+    Events queued for the webhook workers were checked for duplicates when
+    they arrived and pass `deduplicate=False`.
+    """
+    replies = []
+    claimed = []
+    try:
+        with db.unit_of_work() if len(events) > 1 else nullcontext():
+            for event in events:
+                if deduplicate and deduplicator.is_duplicate(event):
+                    app.logger.info("Skipping already processed event %s", event.webhook_event_id)
+                    continue
+                claimed.append(event)
+                try:
+                    with db.savepoint():
+                        reply = build_reply(event)
+                except Exception:
+                    app.logger.exception("Handling event %s failed", getattr(event, "webhook_event_id", None))
+                    reply_token = getattr(event, "reply_token", None)
+                    reply = (reply_token, [EVENT_ERROR_REPLY]) if reply_token else None
+                if reply:
+                    replies.append(reply)
+    except Exception:
+        for event in claimed:
+            deduplicator.forget(event)
+        raise
+    return replies
+
+def handle_event(event):
+    for reply in run_events([event], deduplicate=False):
+        reply_sender.reply(*reply)
+
+dispatcher = None
+if WEBHOOK_WORKERS > 0:
+    dispatcher = EventDispatcher(handle_event, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE,
+                                 logger=app.logger)
+    # Queued events were already acknowledged to LINE, so they are handled before the process exits.
+    atexit.register(dispatcher.shutdown)
+    # Python's default SIGTERM action skips atexit; servers that install their own handler are left alone.
+    if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+router.on_timing = lambda name, seconds: metrics.command_latency.observe(seconds, command=name)
+reply_sender.on_latency = lambda name, seconds, ok: metrics.line_api_latency.observe(
+    seconds, call=name, status="ok" if ok else "error")
+
+metrics.registry.gauge("todo_db_connections", "Open database connections by state.",
+                       lambda: {k: v for k, v in db.pool_stats().items() if k != "open"}, ["state"])
+metrics.registry.counter("todo_db_commits_total", "Database transactions committed.", db.commit_count)
+metrics.registry.gauge("todo_conversation_states", "Active multi-step conversations.", lambda: len(user_states))
+metrics.registry.gauge("todo_event_queue_depth", "Events waiting for a webhook worker.",
+                       lambda: dispatcher.depth() if dispatcher is not None else 0)
+metrics.registry.gauge("todo_rate_limited_users", "Users with a token bucket.",
+                       lambda: rate_limiter.stats()["users"])
+metrics.registry.counter("todo_events_shed_total", "Messages answered with a canned reply instead of running.",
+                         lambda: {"rate_limited": rate_limiter.stats()["shed_rate_limited"],
+                                  "busy": rate_limiter.stats()["shed_busy"]}, ["reason"])
+metrics.registry.counter("todo_duplicate_events_total", "Redelivered webhook events that were dropped.",
+                         lambda: deduplicator.stats()["duplicates"])
+metrics.registry.counter("todo_redelivered_events_total", "Webhook events LINE marked as redeliveries.",
+                         lambda: deduplicator.stats()["redeliveries"])
+metrics.registry.counter("todo_archived_items_total", "Completed items moved to the archive.",
+                         lambda: archiver.stats()["archived"] if archiver is not None else 0)
+metrics.registry.counter("todo_id_cache_requests_total", "Category ID cache lookups.",
+                         lambda: {(cache, result): stats[result]
+                                  for cache, stats in db.cache_stats().items() for result in ("hits", "misses")},
+                         ["cache", "result"])
+metrics.registry.counter("todo_reminders_total", "Due-date reminders pushed by this process.",
+                         lambda: {result: reminder_scheduler.stats()[result] if reminder_scheduler else 0
+                                  for result in ("sent", "failed")}, ["result"])
+metrics.registry.gauge("todo_reminders_scheduled", "Upcoming reminders held in the scheduler's heap.",
+                       lambda: reminder_scheduler.stats()["scheduled"] if reminder_scheduler else 0)
+metrics.registry.gauge("todo_reminder_leader", "1 if this process holds the reminder lease.",
+                       lambda: int(reminder_scheduler.leader) if reminder_scheduler else 0)
+metrics.registry.counter("todo_list_cache_requests_total", "Lookups of cached list pages.",
+                         lambda: {"hits": list_cache.hits, "misses": list_cache.misses}, ["result"])
+metrics.registry.gauge("todo_list_cache_hit_ratio", "Share of list lookups answered from the cache.",
+                       lambda: list_cache.hits / max(1, list_cache.hits + list_cache.misses))
+metrics.registry.gauge("todo_list_cache_bytes", "Approximate memory used by cached list pages.",
+                       lambda: list_cache.weight)
+metrics.registry.gauge("todo_startup_seconds", "Seconds from loading app.py until each startup phase.",
+                       startup_timer.collect, ["phase"])
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.get("/export/<token>")
+def export_items(token):
+    user_id = transfer.verify_token(token, "export")
+    if user_id is None:
+        abort(403, "連結無效或已過期，請重新輸入 export。")
+    fmt = request.args.get("format", "csv")
+    if fmt not in transfer.FORMATS:
+        abort(400, "format 需為 csv 或 jsonl")
+    return Response(transfer.export_chunks(user_id, fmt), mimetype=transfer.FORMATS[fmt],
+                    headers={"Content-Disposition": f'attachment; filename="todo.{fmt}"'})
+
+@app.post("/import/<token>")
+def import_items(token):
+    user_id = transfer.verify_token(token, "import")
+    if user_id is None:
+        abort(403, "連結無效或已過期，請重新輸入 import。")
+    fmt = request.args.get("format", "csv")
+    if fmt not in transfer.FORMATS:
+        abort(400, "format 需為 csv 或 jsonl")
+    chunks = iter(lambda: request.stream.read(64 * 1024), b"")
+    importer = transfer.Importer(user_id, fmt, on_due=router.on_due).run(transfer.decode_lines(chunks))
+    return jsonify(importer.stats())
+
 @app.post("/callback")
 def callback():
     signature = request.headers.get("X-Line-Signature", "")
     body = request.get_data(as_text=True)
     app.logger.debug("LINE Webhook body: %s", body)
 
+    with metrics.request_latency.time():
+        if metrics.should_profile(forced=request.args.get("profile") == "1"):
+            response = metrics.run_profiled(process_callback, "callback", app.logger, body, signature)
+        else:
+            response = process_callback(body, signature)
+    startup_timer.mark("first_request", app.logger)
+    return response
+
+def process_callback(body, signature):
     try:
-        events = parser.parse(body, signature)
+        with metrics.parse_latency.time():
+            events = parser.parse(body, signature)
     except Exception as e:
         app.logger.error("Webhook parse/signature failed: %s", e)
         abort(400, f"Invalid signature or parse error: {e}")
 
+    if dispatcher is None:
+        try:
+            replies = run_events(events)
+        except Exception:
+            app.logger.exception("Committing webhook events failed, asking LINE to retry")
+            return "Error", 500
+        for reply in replies:
+            reply_sender.reply(*reply)
+        return "OK", 200
+
     for event in events:
-        ev_type = getattr(event, "type", None)
-        user_id = getattr(event.source, "user_id", None)
-
-        if ev_type == "message":
-            msg = getattr(event, "message", None)
-            text = getattr(msg, "text", None) if msg else None
-            reply_token = getattr(event, "reply_token", None)
-
-            if text is None:
-                reply_text = "我目前只處理文字訊息，請傳文字給我。"
-            else:
-                t = text.strip()
-
-                if user_id in user_states:
-                    reply_text = handle_stateful_message(user_id, t)
-                # 快捷指令判斷
-                elif "++" in t:
-                    parts = [p.strip() for p in t.split("++")]
-                    if len(parts) == 2:
-                        context_parts = [p.strip() for p in parts[0].split("+")]
-                        if len(context_parts) >= 2:
-                            category = context_parts[0]
-                            sub_category = context_parts[1]
-                            place = None
-                            if len(context_parts) >= 3:
-                                place = context_parts[2]
-
-                            items = [i.strip() for i in parts[1].split(",")]
-                            added_count = 0
-                            for item_title in items:
-                                if item_title: # Avoid adding empty items
-                                    db.add_item(user_id, category, sub_category, item_title, place=place)
-                                    added_count += 1
-                            if added_count > 0:
-                                reply_text = f"已在 {category}/{sub_category}"
-                                if place:
-                                    reply_text += f" (地點: {place})"
-                                reply_text += f" 新增 {added_count} 個項目。"
-                            else:
-                                reply_text = "沒有可新增的項目。"
-                        else:
-                            reply_text = "快捷指令格式錯誤，範例：主分類 + 子分類 [+ 地點] ++ 項目1, 項目2, ..."
-                    else:
-                        reply_text = "快捷指令格式錯誤，範例：主分類 + 子分類 [+ 地點] ++ 項目1, 項目2, ..."
-                elif "+" in t:
-                    parts = [p.strip() for p in t.split("+")]
-                    if len(parts) >= 3:
-                        category = parts[0]
-                        sub_category = parts[1]
-                        title = parts[2]
-                        place = None
-                        if len(parts) >= 4:
-                            place = parts[3]
-                        
-                        db.add_item(user_id, category, sub_category, title, done=0, place=place)
-                        reply_text = f"已新增：{title} ({category}/{sub_category})" + (f"，地點：{place}" if place else "")
-                    else:
-                        reply_text = "快捷指令格式錯誤，範例：主分類 + 子分類 + 名稱 [+ 地點]"
-                else:
-                    t_lower = t.lower()
-                    if t_lower == "ping":
-                        reply_text = "pong"
-                    elif t_lower in ["新增", "add"]:
-                        user_states[user_id] = {
-                            "action": "add_item",
-                            "stage": "awaiting_category",
-                            "data": {}
-                        }
-                        reply_text = "好的，我們來新增一個待辦事項。請輸入主分類（或輸入'取消'）："
-                    elif t_lower.startswith("編輯 ") or t_lower.startswith("edit "):
-                        try:
-                            item_id_str = t.split(" ")[1]
-                            item_id = int(item_id_str)
-                            item = db.get_item(user_id, item_id)
-                            if item:
-                                user_states[user_id] = {
-                                    "action": "edit_item",
-                                    "stage": "awaiting_field_choice",
-                                    "item_id": item_id
-                                }
-                                reply_text = (
-                                    f"您正要編輯項目 [{item['id']}]：{item['title']}\n"
-                                    f"分類：{item['category_name']}/{item['sub_category_name']}\n"
-                                    f"地點：{item['place'] or '未設定'}\n\n"
-                                    "您想編輯哪個欄位？\n"
-                                    "1. 名稱\n"
-                                    "2. 地點\n\n"
-                                    "請輸入選項（或輸入'取消'）"
-                                )
-                            else:
-                                reply_text = f"找不到待辦事項 [{item_id}]。"
-                        except (IndexError, ValueError):
-                            reply_text = "編輯指令格式錯誤，請使用 '編輯 <編號>'"
-                    elif t_lower.startswith("刪除 ") or t_lower.startswith("del "):
-                        try:
-                            item_ids_str = t.split(" ", 1)[1]
-                            item_ids = [int(i.strip()) for i in item_ids_str.split(",")]
-                            deleted_count = db.delete_item(user_id, item_ids)
-                            reply_text = f"已刪除 {deleted_count} 個項目。"
-                        except (IndexError, ValueError):
-                            reply_text = "刪除指令格式錯誤，請使用 '刪除 <編號1>,<編號2>...'"
-                    elif t_lower.startswith("完成 ") or t_lower.startswith("done "):
-                        try:
-                            item_ids_str = t.split(" ", 1)[1]
-                            item_ids = [int(i.strip()) for i in item_ids_str.split(",")]
-                            updated_count = db.mark_item_as_done(user_id, item_ids)
-                            reply_text = f"已將 {updated_count} 個項目標示為完成。"
-                        except (IndexError, ValueError):
-                            reply_text = "完成指令格式錯誤，請使用 '完成 <編號1>,<編號2>...'"
-                    elif t_lower == "help":
-                        reply_text = "指令：\n- 新增 (逐步新增)\n- 編輯 <編號>\n- 刪除 <編號1>,<編號2>...\n- 完成 <編號1>,<編號2>...\n- list (列出項目)\n- 快捷指令: 主分類 + 子分類 + 名稱 [+ 地點]\n- 多筆新增: 主分類 + 子分類 [+ 地點] ++ 項目1, 項目2, ..."
-                    elif t_lower.startswith("echo "):
-                        reply_text = t[5:]
-                    elif t_lower.startswith("list"):
-                        category_from_command = t[4:].strip() if len(t) > 4 else None
-                        items = db.list_items(user_id, category_from_command)
-                        if not items:
-                            reply_text = "目前沒有任何清單。"
-                        else:
-                            lines = []
-                            current_category = None
-                            for i in items:
-                                # 索引: 6=主分類名, 7=子分類名
-                                category_name = i[6]
-                                if category_name != current_category:
-                                    lines.append(f"\n--- {category_name} ---")
-                                    current_category = category_name
-
-                                status = "✅" if i[3] else "📝"
-                                # 索引: 0=id, 1=title, 3=done, 5=completed_date, 7=sub_category_name
-                                line = f"{status} [{i[0]}] {i[1]} ({i[7]})"
-                                if i[3]:
-                                    completed_time = datetime.fromisoformat(i[5]).strftime('%Y-%m-%d %H:%M')
-                                    line += f" - 完成於 {completed_time}"
-                                lines.append(line)
-                            reply_text = "\n".join(lines).strip()
-                    else:
-                        reply_text = f"收到：{text}"
-
-            if reply_token:
-                try:
-                    with ApiClient(Configuration(access_token=CHANNEL_ACCESS_TOKEN)) as api_client:
-                        messaging_api = MessagingApi(api_client)
-                        req = ReplyMessageRequest(
-                            reply_token=reply_token,
-                            messages=[V3TextMessage(type="text", text=reply_text)]
-                        )
-                        messaging_api.reply_message(req)
-                except Exception as e:
-                    app.logger.error("Failed to reply message: %s", e)
-
-        elif ev_type == "follow":
-            reply_token = getattr(event, "reply_token", None)
-            if reply_token:
-                try:
-                    with ApiClient(Configuration(access_token=CHANNEL_ACCESS_TOKEN)) as api_client:
-                        messaging_api = MessagingApi(api_client)
-                        req = ReplyMessageRequest(
-                            reply_token=reply_token,
-                            messages=[V3TextMessage(type="text", text="謝謝你加我為好友！輸入 help 查看指令。")]
-                        )
-                        messaging_api.reply_message(req)
-                except Exception as e:
-                    app.logger.error("Failed to reply follow event: %s", e)
-        else:
-            app.logger.debug("Unhandled event type: %s", ev_type)
+        if deduplicator.is_duplicate(event):
+            app.logger.info("Skipping already processed event %s", event.webhook_event_id)
+            continue
+        if not dispatcher.submit(getattr(event.source, "user_id", None), event):
+            deduplicator.forget(event)
+            app.logger.warning("Event queue is full, asking LINE to retry later")
+            return "Busy", 503
 
     return "OK", 200
 
+startup_timer.mark("import", app.logger)
+
 # ------------------------
 # Main
 # ------------------------
 if __name__ == "__main__":
     debug_mode = True
     port = int(os.getenv("PORT", 5000))
-    if debug_mode:
+    # The tunnel is only opened when an ngrok token is configured.
+    ngrok_authtoken = os.getenv("NGROK_AUTHTOKEN")
+    if debug_mode and ngrok_authtoken:
         try:
             from pyngrok import ngrok
-            ngrok_authtoken = os.getenv("NGROK_AUTHTOKEN")
-            if ngrok_authtoken:
-                ngrok.set_auth_token(ngrok_authtoken)
+            ngrok.set_auth_token(ngrok_authtoken)
             public_url = ngrok.connect(port).public_url
             print(f"Ngrok tunnel: {public_url} -> http://127.0.0.1:{port}")
             print("請把 LINE Developers 的 Webhook URL 設為:", public_url + "/callback")
+            # Export/import links point at the tunnel unless PUBLIC_URL is set.
+            os.environ.setdefault("PUBLIC_URL", public_url)
         except Exception as e:
             print("ngrok 啟動失敗或未安裝：", e)
 
@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+
+import database as db
+
+# Keeps the items table down to active data: finished items older than a
+# configurable age are moved to items_archive (read by the `history`
+# command), after which the categories those items left empty are pruned
+# and the database statistics are refreshed.
+
+
+class Archiver:
+    """Periodically archives completed items on a background thread.
+
+    Every `interval` seconds, items completed more than `min_age_days` ago are
+    moved in transactions of at most `batch_size` rows, pausing `batch_pause`
+    seconds between batches so request handlers can take the write lock.
+    """
+
+    def __init__(self, min_age_days=30, interval=3600, batch_size=500, batch_pause=0.05, logger=None):
+        self.min_age_days = min_age_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.logger = logger or logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.archived = 0
+        self.pruned = 0
+        self.vacuums = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="archiver", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_once(self):
+        """Archives everything that is due; returns the number of items moved."""
+        before = int(time.time() - self.min_age_days * 86400)
+        moved = 0
+        owners = set()
+        while not self._stop.is_set():
+            archived = db.archive_done_items(before, self.batch_size)
+            count = sum(archived.values())
+            moved += count
+            owners.update(archived)
+            if count < self.batch_size:
+                break
+            time.sleep(self.batch_pause)
+        pruned = db.prune_orphan_categories(owners) if moved else 0
+        vacuumed = db.compact_db() if moved else False
+        self.runs += 1
+        self.archived += moved
+        self.pruned += pruned
+        self.vacuums += int(vacuumed)
+        if moved:
+            self.logger.info("Archived %d items, pruned %d categories%s", moved, pruned,
+                             ", vacuumed" if vacuumed else "")
+        return moved
+
+    def stats(self):
+        return {"runs": self.runs, "archived": self.archived, "pruned": self.pruned, "vacuums": self.vacuums}
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                self.logger.exception("Archiving failed")
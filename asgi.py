@@ -0,0 +1,192 @@
+# asgi.py
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import app as flask_app
+import database as db
+import metrics
+import transfer
+from line_client import AsyncReplySender
+
+# An asyncio entry point for the same webhook, e.g.
+#
+#     uvicorn asgi:app --host 0.0.0.0 --port 5000
+#
+# Signature checks and LINE replies run on the event loop, so a request that
+# is waiting on the LINE API costs a coroutine rather than a thread. Commands
+# still go through the synchronous router and database layer shared with
+# app.py; they run on ASGI_DB_THREADS threads (by default one per pooled
+# database connection), which bounds the database work in flight while any
+# number of webhooks wait on replies. ASGI_REPLY_CONNECTIONS caps the open
+# connections to the LINE API.
+ASGI_DB_THREADS = int(os.getenv("ASGI_DB_THREADS", db.DB_POOL_SIZE))
+ASGI_REPLY_CONNECTIONS = int(os.getenv("ASGI_REPLY_CONNECTIONS", 100))
+
+logger = flask_app.app.logger
+executor = ThreadPoolExecutor(max_workers=ASGI_DB_THREADS, thread_name_prefix="asgi-db")
+reply_sender = None
+
+
+async def process_callback(body, signature):
+    try:
+        with metrics.parse_latency.time():
+            events = flask_app.parser.parse(body, signature)
+    except Exception as e:
+        logger.error("Webhook parse/signature failed: %s", e)
+        return 400, f"Invalid signature or parse error: {e}"
+
+    # Each user's events run in order as one unit of work on a database
+    # thread; different users run concurrently.
+    by_user = {}
+    for event in events:
+        by_user.setdefault(getattr(event.source, "user_id", None), []).append(event)
+    results = await asyncio.gather(*(handle_events(user_events) for user_events in by_user.values()),
+                                   return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error("Committing webhook events failed, asking LINE to retry: %s", result)
+            return 500, "Error"
+    return 200, "OK"
+
+
+async def handle_events(events):
+    loop = asyncio.get_running_loop()
+    replies = await loop.run_in_executor(executor, flask_app.run_events, events)
+    for reply in replies:
+        await reply_sender.reply(*reply)
+
+
+async def startup():
+    global reply_sender
+    reply_sender = AsyncReplySender(flask_app.CHANNEL_ACCESS_TOKEN, host=flask_app.LINE_API_HOST,
+                                    pool_maxsize=ASGI_REPLY_CONNECTIONS, logger=logger)
+    reply_sender.on_latency = flask_app.reply_sender.on_latency
+
+
+async def shutdown():
+    if reply_sender is not None:
+        await reply_sender.close()
+    executor.shutdown(wait=True)
+    if flask_app.archiver is not None:
+        flask_app.archiver.stop()
+    if flask_app.reminder_scheduler is not None:
+        flask_app.reminder_scheduler.stop()
+    db.close_db()
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    method, path = scope["method"], scope["path"]
+    if path == "/health" and method == "GET":
+        await respond(send, 200, '{"status":"ok"}', "application/json")
+    elif path == "/metrics" and method == "GET":
+        await respond(send, 200, metrics.registry.render(), "text/plain; version=0.0.4")
+    elif path.startswith("/export/") and method == "GET":
+        await export_items(scope, send)
+    elif path.startswith("/import/") and method == "POST":
+        await import_items(scope, receive, send)
+    elif path == "/callback" and method == "POST":
+        body = await read_body(receive)
+        signature = dict(scope["headers"]).get(b"x-line-signature", b"").decode("latin-1")
+        logger.debug("LINE Webhook body: %s", body)
+        with metrics.request_latency.time():
+            status, text = await process_callback(body, signature)
+        await respond(send, status, text)
+        flask_app.startup_timer.mark("first_request", logger)
+    else:
+        await respond(send, 404, "Not Found")
+
+
+def transfer_request(scope, name):
+    """Returns (user_id, format) for an export/import request, or (None, error response)."""
+    user_id = transfer.verify_token(scope["path"].split("/", 2)[2], name)
+    if user_id is None:
+        return None, (403, f"連結無效或已過期，請重新輸入 {name}。")
+    fmt = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("format", ["csv"])[0]
+    if fmt not in transfer.FORMATS:
+        return None, (400, "format 需為 csv 或 jsonl")
+    return user_id, fmt
+
+
+async def export_items(scope, send):
+    user_id, fmt = transfer_request(scope, "export")
+    if user_id is None:
+        await respond(send, *fmt)
+        return
+    # The export generator holds its own database connection and is advanced
+    # one piece at a time on the database threads.
+    loop = asyncio.get_running_loop()
+    chunks = transfer.export_chunks(user_id, fmt)
+    try:
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", f"{transfer.FORMATS[fmt]}; charset=utf-8".encode()),
+                                (b"content-disposition", f'attachment; filename="todo.{fmt}"'.encode())]})
+        while True:
+            chunk = await loop.run_in_executor(executor, next, chunks, None)
+            if chunk is None:
+                break
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        await loop.run_in_executor(executor, chunks.close)
+
+
+def receive_chunks(receive, loop):
+    """Yields request body chunks to a worker thread, awaiting each one on the event loop."""
+    while True:
+        message = asyncio.run_coroutine_threadsafe(receive(), loop).result()
+        yield message.get("body", b"")
+        if not message.get("more_body"):
+            return
+
+
+def run_import(user_id, fmt, receive, loop):
+    lines = transfer.decode_lines(receive_chunks(receive, loop))
+    return transfer.Importer(user_id, fmt, on_due=flask_app.router.on_due).run(lines).stats()
+
+
+async def import_items(scope, receive, send):
+    user_id, fmt = transfer_request(scope, "import")
+    if user_id is None:
+        await respond(send, *fmt)
+        return
+    loop = asyncio.get_running_loop()
+    stats = await loop.run_in_executor(executor, run_import, user_id, fmt, receive, loop)
+    await respond(send, 200, json.dumps(stats, ensure_ascii=False), "application/json")
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await startup()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks).decode("utf-8")
+
+
+async def respond(send, status, text, content_type="text/plain; charset=utf-8"):
+    body = text.encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode()),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,609 @@
+"""Offline benchmark for the webhook path.
+
+Signs synthetic webhook bodies with the channel secret, posts them to
+/callback (through the Flask test client, an in-process Flask or ASGI server
+with --server, or a running server with --url) and sends every reply to a
+local stub of the LINE API. Reports p50/p95/p99 latency, throughput and
+database statements and commits per request for each workload, and can compare the
+results against bench/baseline.json.
+
+    python bench/run.py                                   # SQLite in a temp dir
+    python bench/run.py --database-url postgresql://localhost/todo_bench
+    python bench/run.py --compare                         # fail on regressions
+    python bench/run.py --save-baseline
+    python bench/run.py --replay corpus.jsonl             # {"user": ..., "text": ...} per line
+    python bench/run.py --server asgi --concurrency 200 --line-latency-ms 50
+    python bench/run.py --cold-start 10 --only cold_start   # fresh processes, time to first reply
+    python bench/run.py --transfer 100000 --only export,import   # CSV export/import round trip
+    python bench/run.py --shards 8 --server flask --processes 4 --concurrency 32 --only add_users   # sharded SQLite
+
+Run Postgres benchmarks against a dedicated database; the rows created by the
+run are deleted afterwards.
+"""
+import argparse
+import base64
+import concurrent.futures
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.stub_line import StubLineApi  # noqa: E402
+
+BASELINE_FILE = os.path.join(ROOT, "bench", "baseline.json")
+CHANNEL_SECRET = "bench-secret"
+BATCH_SIZE = 10
+BULK_TITLES = 20
+# Distinct users writing in the add_users workload, spread over the shards.
+WRITER_USERS = 64
+SEED_CATEGORIES = 10
+
+
+class StatementCounter:
+    """Counts SQL statements sent to the database, i.e. round trips."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._last = threading.local()
+
+    def hit(self, statement=None):
+        # SQLite also traces work done inside a statement: the FTS5 index's own
+        # statements ("-- ..." lines, or ones naming 'main'.) and every trigger
+        # the statement fires (its own text again). None are round trips.
+        if statement is not None:
+            if statement.startswith("--") or "'main'." in statement:
+                return
+            if statement == getattr(self._last, "statement", None):
+                return
+            self._last.statement = statement
+        with self._lock:
+            self.count += 1
+
+    def install(self, engine):
+        for shard in getattr(engine, "shards", [engine]):
+            self._install(shard)
+
+    def _install(self, engine):
+        connect = engine._connect
+        counter = self
+
+        if engine.PARAM == "?":
+            def counted_connect():
+                conn = connect()
+                conn.set_trace_callback(counter.hit)
+                return conn
+        else:
+            import psycopg2.extensions
+
+            class CountingCursor(psycopg2.extensions.cursor):
+                def execute(self, *args, **kwargs):
+                    counter.hit()
+                    return super().execute(*args, **kwargs)
+
+                def executemany(self, *args, **kwargs):
+                    counter.hit()
+                    return super().executemany(*args, **kwargs)
+
+            # Cursors opened with an explicit cursor_factory (get_item) are not counted.
+            def counted_connect():
+                conn = connect()
+                conn.cursor_factory = CountingCursor
+                return conn
+
+        engine._connect = counted_connect
+
+
+class TestClientTarget:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def post(self, body, signature):
+        response = self.client.post("/callback", data=body,
+                                    headers={"X-Line-Signature": signature, "Content-Type": "application/json"})
+        return response.status_code
+
+
+class HttpTarget:
+    """Posts to one server, or round-robin to several."""
+
+    def __init__(self, *urls):
+        self.urls = [url.rstrip("/") + "/callback" for url in urls]
+        self._next = itertools.count()
+
+    def post(self, body, signature):
+        url = self.urls[next(self._next) % len(self.urls)]
+        req = urllib.request.Request(url, data=body.encode(), method="POST",
+                                     headers={"X-Line-Signature": signature, "Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except OSError:
+            return None
+
+
+class FlaskServer:
+    """Serves app.py with the threaded Werkzeug server, as `python app.py` does."""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+
+# Serves app.py on an ephemeral port in a process of its own; see ProcessServers.
+SERVER_SCRIPT = """
+import logging, sys
+sys.path.insert(0, sys.argv[1])
+from werkzeug.serving import make_server
+import app
+logging.getLogger("werkzeug").setLevel(logging.WARNING)
+server = make_server("127.0.0.1", 0, app.app, threaded=True)
+print("PORT", server.server_port, flush=True)
+server.serve_forever()
+"""
+
+
+class ProcessServers:
+    """Runs app.py in several processes sharing one database, like a multi-worker deployment.
+
+    Writers in different processes do not share the GIL, so this is where
+    the SQLite write lock, and therefore sharding, decides throughput.
+    """
+
+    def __init__(self, count):
+        self.procs = [subprocess.Popen([sys.executable, "-c", SERVER_SCRIPT, ROOT], stdout=subprocess.PIPE, text=True)
+                      for _ in range(count)]
+        self.urls = []
+
+    def start(self):
+        for proc in self.procs:
+            for line in proc.stdout:
+                if line.startswith("PORT "):
+                    self.urls.append(f"http://127.0.0.1:{line.split()[1]}")
+                    break
+            else:
+                raise SystemExit("a server process exited before it was ready")
+        return self
+
+    def stop(self):
+        for proc in self.procs:
+            proc.terminate()
+            proc.wait()
+
+
+class AsgiServer:
+    """Serves asgi.py with uvicorn on a background thread."""
+
+    def __init__(self):
+        import uvicorn
+
+        import asgi
+
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(1024)
+        self.url = f"http://127.0.0.1:{self.sock.getsockname()[1]}"
+        self.server = uvicorn.Server(uvicorn.Config(asgi.app, lifespan="on", log_level="warning"))
+
+    def start(self):
+        threading.Thread(target=self.server.run, kwargs={"sockets": [self.sock]}, daemon=True).start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+
+
+class EventFactory:
+    def __init__(self, secret):
+        self.secret = secret.encode()
+        self.counter = 0
+
+    def message(self, user_id, text):
+        self.counter += 1
+        return {
+            "type": "message", "mode": "active", "timestamp": int(time.time() * 1000),
+            "source": {"type": "user", "userId": user_id},
+            "webhookEventId": f"bench-{uuid.uuid4().hex}",
+            "deliveryContext": {"isRedelivery": False},
+            "replyToken": f"bench-reply-{self.counter}",
+            "message": {"type": "text", "id": str(self.counter), "text": text, "quoteToken": "q"},
+        }
+
+    def body(self, events):
+        body = json.dumps({"destination": "bench", "events": events}, ensure_ascii=False)
+        signature = base64.b64encode(hmac.new(self.secret, body.encode(), hashlib.sha256).digest()).decode()
+        return body, signature
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile.
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def measure(name, bodies, target, counter, warmup, concurrency=1, commits=None, before_each=None):
+    """Posts the bodies and summarises them; `before_each` runs untimed before every request."""
+    for body, signature in bodies[:warmup]:
+        if before_each:
+            before_each()
+        target.post(body, signature)
+
+    def timed_post(request):
+        if before_each:
+            before_each()
+        t0 = time.perf_counter()
+        ok = target.post(*request) == 200
+        return time.perf_counter() - t0, ok
+
+    before = counter.count if counter else 0
+    commits_before = commits() if commits else 0
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = list(pool.map(timed_post, bodies[warmup:]))
+    elapsed = time.perf_counter() - started
+    statements = counter.count - before if counter else 0
+    committed = commits() - commits_before if commits else 0
+    latencies = sorted(seconds for seconds, _ in timings)
+    errors = sum(1 for _, ok in timings if not ok)
+    n = len(latencies)
+    return {
+        "requests": n,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "throughput_rps": round(n / elapsed, 1) if elapsed else 0.0,
+        "db_statements_per_request": round(statements / n, 2) if counter and n else None,
+        "db_commits_per_request": round(committed / n, 2) if commits and n else None,
+    }
+
+
+# Run in a fresh interpreter: imports app.py and answers one webhook, timing
+# both from the moment `import app` starts.
+COLD_START_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+from bench.run import EventFactory
+events = EventFactory(sys.argv[2])
+body, signature = events.body([events.message(sys.argv[3], "list")])
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+status = app.app.test_client().post("/callback", data=body, headers={"X-Line-Signature": signature}).status_code
+print(json.dumps({"import": imported - started, "first_request": time.perf_counter() - started, "status": status}))
+"""
+
+
+def measure_cold_start(runs, secret, run_id):
+    """Starts `runs` fresh processes; latencies are the time to the first reply."""
+    samples = []
+    # The first process creates the schema and is not counted.
+    for i in range(runs + 1):
+        out = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT, ROOT, secret, f"bench-{run_id}-cold"],
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            raise SystemExit(f"cold start run failed:\n{out.stderr}")
+        if i:
+            samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    first = sorted(sample["first_request"] for sample in samples)
+    imports = sorted(sample["import"] for sample in samples)
+    return {
+        "requests": runs,
+        "errors": sum(1 for sample in samples if sample["status"] != 200),
+        "p50_ms": round(percentile(first, 50) * 1000, 3),
+        "p95_ms": round(percentile(first, 95) * 1000, 3),
+        "p99_ms": round(percentile(first, 99) * 1000, 3),
+        "import_p50_ms": round(percentile(imports, 50) * 1000, 3),
+        "throughput_rps": 0.0,
+        "db_statements_per_request": None,
+        "db_commits_per_request": None,
+    }
+
+
+def measure_transfer(app, db, size, run_id, runs=3):
+    """Times exporting `size` items as CSV and importing that file into a fresh user, through the Flask app."""
+    import transfer
+    user = f"bench-{run_id}-export"
+    seed_items(db, user, size)
+    client = app.test_client()
+    exports, imports, errors = [], [], 0
+    for i in range(runs):
+        started = time.perf_counter()
+        response = client.get(f"/export/{transfer.sign_token('export', user)}")
+        body = response.get_data()
+        exports.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        response = client.post(f"/import/{transfer.sign_token('import', f'bench-{run_id}-import{i}')}", data=body)
+        imports.append(time.perf_counter() - started)
+        errors += response.status_code != 200 or response.json["imported"] != size
+    results = {}
+    for name, timings in (("export", exports), ("import", imports)):
+        timings.sort()
+        results[f"{name}_{size}"] = {
+            "requests": runs,
+            "errors": errors if name == "import" else 0,
+            "p50_ms": round(percentile(timings, 50) * 1000, 3),
+            "p95_ms": round(percentile(timings, 95) * 1000, 3),
+            "p99_ms": round(percentile(timings, 99) * 1000, 3),
+            "throughput_rps": round(runs / sum(timings), 1),
+            "db_statements_per_request": None,
+            "db_commits_per_request": None,
+        }
+    return results
+
+
+def build_workloads(args, events, run_id, db, in_process=True):
+    """Returns ({name: bodies}, {name: callable run before each request})."""
+    from commands import list_cache
+    iterations = args.iterations + args.warmup
+    workloads, before_each = {}, {}
+
+    user = f"bench-{run_id}-add"
+    workloads["add"] = [events.body([events.message(user, f"工作 + 雜事 + 項目{i}")]) for i in range(iterations)]
+
+    workloads["add_users"] = [events.body([events.message(f"bench-{run_id}-writer{i % WRITER_USERS}",
+                                                          f"工作 + 雜事 + 項目{i}")]) for i in range(iterations)]
+
+    user = f"bench-{run_id}-bulk"
+    titles = lambda i: ", ".join(f"項目{i}-{j}" for j in range(BULK_TITLES))
+    workloads["bulk_add"] = [events.body([events.message(user, f"購物 + 超市 ++ {titles(i)}")])
+                             for i in range(iterations)]
+
+    for size in args.list_sizes:
+        user = f"bench-{run_id}-list{size}"
+        seed_items(db, user, size)
+        bodies = [events.body([events.message(user, "list")]) for _ in range(iterations)]
+        # list_N drops the user's cached first page before each request, so it
+        # measures the list query and rendering; list_N_cached measures the cache.
+        # The cache of a server in another process cannot be dropped from here.
+        if in_process:
+            workloads[f"list_{size}"] = bodies
+            before_each[f"list_{size}"] = lambda user=user: list_cache.discard_where(
+                lambda key, entry: key[0] == user)
+        workloads[f"list_{size}_cached"] = bodies
+
+    workloads[f"batch_{BATCH_SIZE}"] = [
+        events.body([events.message(f"bench-{run_id}-batch{j}", f"工作 + 批次 + 項目{i}-{j}")
+                     for j in range(BATCH_SIZE)])
+        for i in range(iterations)
+    ]
+
+    if args.replay:
+        workloads["replay"] = load_replay(args.replay, events, run_id)
+    return {name: bodies for name, bodies in workloads.items() if not args.only or name in args.only}, before_each
+
+
+def seed_items(db, user_id, size):
+    per_category = -(-size // SEED_CATEGORIES)
+    remaining = size
+    for c in range(SEED_CATEGORIES):
+        count = min(per_category, remaining)
+        for start in range(0, count, 1000):
+            db.add_items(user_id, f"分類{c}", "子分類", [f"項目{c}-{i}" for i in range(start, min(start + 1000, count))])
+        remaining -= count
+
+
+def load_replay(path, events, run_id):
+    """Reads a JSONL corpus of chat messages: {"text": ..., "user": optional}."""
+    bodies = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not isinstance(record.get("text"), str):
+                continue
+            user = f"bench-{run_id}-replay-{record.get('user', 'default')}"
+            bodies.append(events.body([events.message(user, record["text"])]))
+    if not bodies:
+        raise SystemExit(f"{path} contains no {{\"text\": ...}} records to replay")
+    return bodies
+
+
+def cleanup(db_engine, run_id):
+    p = db_engine.PARAM
+    pattern = f"bench-{run_id}-%"
+    with db_engine._transaction(write=True) as conn:
+        c = conn.cursor()
+        c.execute(f"DELETE FROM items WHERE user_id LIKE {p}", (pattern,))
+        c.execute(f"DELETE FROM sub_categories WHERE category_id IN "
+                  f"(SELECT id FROM categories WHERE user_id LIKE {p})", (pattern,))
+        c.execute(f"DELETE FROM categories WHERE user_id LIKE {p}", (pattern,))
+        c.execute(f"DELETE FROM conversation_states WHERE user_id LIKE {p}", (pattern,))
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if base[key] and result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name} {key}: {base[key]} -> {result[key]}")
+        base_statements = base.get("db_statements_per_request")
+        statements = result.get("db_statements_per_request")
+        if base_statements is not None and statements is not None and statements > base_statements:
+            regressions.append(f"{name} db_statements_per_request: {base_statements} -> {statements}")
+    return regressions
+
+
+def print_table(results, baseline):
+    header = f"{'workload':<18}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'stmts':>8}{'commits':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        stmts = "-" if r["db_statements_per_request"] is None else r["db_statements_per_request"]
+        commits = "-" if r.get("db_commits_per_request") is None else r["db_commits_per_request"]
+        line = (f"{name:<18}{r['requests']:>6}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+                f"{r['throughput_rps']:>10}{stmts:>8}{commits:>9}")
+        base = baseline.get(name)
+        if base and base["p50_ms"]:
+            line += f"   p50 x{r['p50_ms'] / base['p50_ms']:.2f} vs baseline"
+        print(line)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--database-url", help="benchmark PostgreSQL instead of a temporary SQLite file")
+    arg_parser.add_argument("--url", help="post to a running server instead of the Flask test client "
+                                          "(it must use the same LINE_CHANNEL_SECRET and a stub LINE_API_HOST)")
+    arg_parser.add_argument("--server", choices=["testclient", "flask", "asgi"], default="testclient",
+                            help="serve app.py (flask) or asgi.py (asgi) over HTTP in this process")
+    arg_parser.add_argument("--concurrency", type=int, default=1, help="requests in flight at once")
+    arg_parser.add_argument("--line-latency-ms", type=float, default=0,
+                            help="delay every stub LINE API answer by this much")
+    arg_parser.add_argument("--secret", default=CHANNEL_SECRET, help="channel secret used to sign bodies")
+    arg_parser.add_argument("--iterations", type=int, default=200)
+    arg_parser.add_argument("--warmup", type=int, default=20)
+    arg_parser.add_argument("--list-sizes", type=lambda s: [int(x) for x in s.split(",")], default=[10, 1000, 10000],
+                            help="comma-separated item counts for the list workloads, e.g. 10,1000,100000")
+    arg_parser.add_argument("--cold-start", type=int, default=0, metavar="N",
+                            help="also time N fresh processes from `import app` to the first reply")
+    arg_parser.add_argument("--processes", type=int, default=0, metavar="N",
+                            help="serve app.py from N separate processes (with --server flask)")
+    arg_parser.add_argument("--shards", type=int, default=1,
+                            help="split the SQLite database into this many files (SQLITE_SHARDS)")
+    arg_parser.add_argument("--transfer", type=int, default=0, metavar="N",
+                            help="also time a CSV export and re-import of N items (export_N / import_N)")
+    arg_parser.add_argument("--only", type=lambda s: s.split(","), help="comma-separated workload names to run")
+    arg_parser.add_argument("--replay", help="JSONL corpus of chat messages to replay as an extra workload")
+    arg_parser.add_argument("--compare", action="store_true", help="exit 1 if slower than the baseline")
+    arg_parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown for --compare")
+    arg_parser.add_argument("--save-baseline", action="store_true", help=f"write results to {BASELINE_FILE}")
+    arg_parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = arg_parser.parse_args()
+    if args.concurrency > 1 and args.server == "testclient" and not args.url:
+        arg_parser.error("--concurrency needs --server flask|asgi or --url")
+    if args.processes and args.server != "flask":
+        arg_parser.error("--processes needs --server flask")
+    args.replay = args.replay and os.path.abspath(args.replay)
+    args.output = args.output and os.path.abspath(args.output)
+
+    stub = StubLineApi(latency=args.line_latency_ms / 1000).start()
+    os.environ.update({
+        "LINE_CHANNEL_SECRET": args.secret,
+        "LINE_CHANNEL_ACCESS_TOKEN": "bench-token",
+        "LINE_API_HOST": stub.url,
+        "RATE_LIMIT_PER_SEC": "0",
+        "WEBHOOK_WORKERS": "0",
+    })
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        # Empty rather than unset, so a DATABASE_URL in .env is not picked up.
+        os.environ["DATABASE_URL"] = ""
+        os.environ["SQLITE_SHARDS"] = str(args.shards)
+        # SqliteEngine opens todo.db in the working directory.
+        os.chdir(tempfile.mkdtemp(prefix="todo-bench-"))
+
+    run_id = uuid.uuid4().hex[:8]
+    results = {}
+    if args.cold_start and (not args.only or "cold_start" in args.only):
+        results["cold_start"] = measure_cold_start(args.cold_start, args.secret, run_id)
+
+    import app as app_module
+    import database as db
+
+    engine_name = db.engine_name()
+    counter = commits = None
+    if not args.url and not args.processes:
+        commits = lambda: db.get_engine().commits
+        counter = StatementCounter()
+        db.close_db()
+        counter.install(db.get_engine())
+    server = None
+    if args.url:
+        target = HttpTarget(args.url)
+    elif args.processes:
+        server = ProcessServers(args.processes).start()
+        target = HttpTarget(*server.urls)
+    elif args.server == "testclient":
+        target = TestClientTarget(app_module.app)
+    else:
+        server = (FlaskServer(app_module.app) if args.server == "flask" else AsgiServer()).start()
+        target = HttpTarget(server.url)
+
+    events = EventFactory(args.secret)
+    baseline_all = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            baseline_all = json.load(f)
+    # Runs with a different server, concurrency or LINE latency are compared
+    # against their own baseline entry.
+    profile = engine_name if args.shards <= 1 else f"{engine_name}{args.shards}"
+    if args.server != "testclient" or args.concurrency > 1 or args.line_latency_ms:
+        profile += f"-{args.server}-c{args.concurrency}-{args.line_latency_ms:g}ms"
+    if args.processes:
+        profile += f"-p{args.processes}"
+    baseline = baseline_all.get(profile, {})
+
+    try:
+        in_process = not args.url and not args.processes
+        workloads, before_each = build_workloads(args, events, run_id, db, in_process)
+        for name, bodies in workloads.items():
+            results[name] = measure(name, bodies, target, counter, min(args.warmup, len(bodies) // 2),
+                                    args.concurrency, commits, before_each.get(name))
+        if args.transfer and (not args.only or {"export", "import"} & set(args.only)):
+            results.update(measure_transfer(app_module.app, db, args.transfer, run_id))
+    finally:
+        if server is not None:
+            server.stop()
+        if engine_name == "postgres":
+            cleanup(db.get_engine(), run_id)
+        stub.stop()
+
+    print(f"engine: {engine_name}, server: {args.url or args.server}, concurrency: {args.concurrency}, "
+          f"LINE API calls: {stub.calls}")
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({profile: results}, f, indent=2)
+    if args.save_baseline:
+        baseline_all[profile] = results
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(baseline_all, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_FILE}")
+    if args.compare:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
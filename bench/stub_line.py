@@ -0,0 +1,83 @@
+"""A local stand-in for the LINE Messaging API used by the benchmarks.
+
+Accepts reply and push calls, counts them and answers like the real API, so
+app.py can run unchanged with LINE_API_HOST pointing here. `latency` delays
+every answer, approximating the round trip to the real API. It can also be
+started on its own for benchmarking a separately running server:
+
+    python bench/stub_line.py --port 8081
+    LINE_API_HOST=http://127.0.0.1:8081 python app.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPONSE = json.dumps({"sentMessages": [{"id": "1", "quoteToken": "stub"}]}).encode()
+
+
+class _Server(ThreadingHTTPServer):
+    # Room for the bursts of connections the concurrent benchmarks open.
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class StubLineApi:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        stub = self
+        self.latency = latency
+        self.calls = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; with Nagle on, the
+            # body waits for a delayed ACK and every reply takes ~40 ms.
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    count = len(json.loads(body).get("messages", []))
+                except ValueError:
+                    count = 0
+                with stub._lock:
+                    stub.calls += 1
+                    stub.messages += count
+                if stub.latency:
+                    time.sleep(stub.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(RESPONSE)))
+                self.end_headers()
+                self.wfile.write(RESPONSE)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8081)
+    arg_parser.add_argument("--latency-ms", type=float, default=0, help="delay every answer by this much")
+    args = arg_parser.parse_args()
+    stub = StubLineApi(args.host, args.port, args.latency_ms / 1000)
+    print(f"Stub LINE API listening on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
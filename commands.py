@@ -0,0 +1,597 @@
+import os
+import re
+import sys
+import threading
+import time
+import database as db
+import transfer
+from state_store import create_state_store
+from timeutil import format_timestamp, parse_due, start_of_day
+
+# Chat command handling. Every command is a plain function registered on
+# `router`, so it can be called, tested and timed on its own.
+
+# Conversation state for multi-step commands: "memory" (per process) or
+# "database" (shared by every worker). Abandoned flows expire after STATE_TTL seconds.
+STATE_STORE = os.getenv("STATE_STORE", "memory")
+STATE_TTL = int(os.getenv("STATE_TTL", 600))
+STATE_MAX_ENTRIES = int(os.getenv("STATE_MAX_ENTRIES", 10000))
+
+user_states = create_state_store(STATE_STORE, ttl=STATE_TTL, maxsize=STATE_MAX_ENTRIES)
+
+
+class CommandRouter:
+    """Dispatches a message to the handler registered for it.
+
+    Order of precedence: an ongoing multi-step flow, a keyword matched on the
+    first token (one dict lookup), the `++` / `+` shortcuts, keywords that may
+    be glued to their argument (e.g. `list家`), and finally the fallback.
+    Keywords come before the shortcuts so that their arguments, such as
+    `搜尋 C++` or pasted `import` lines, may contain `+`.
+    Handlers are called as handler(user_id, text, args) and return the reply:
+    a string, or a list of strings sent as separate messages.
+    """
+
+    def __init__(self):
+        self._keywords = {}
+        self._prefixes = []
+        self._shortcuts = []
+        self._stateful = None
+        self._fallback = None
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.on_timing = None
+        # Called with due_at whenever an item with a due date is added.
+        self.on_due = None
+
+    def command(self, *keywords, prefix=False):
+        def register(func):
+            for keyword in keywords:
+                self._keywords[keyword.lower()] = (keywords[0], func)
+                if prefix:
+                    self._prefixes.append((keyword.lower(), keywords[0], func))
+            return func
+        return register
+
+    def shortcut(self, marker):
+        """Registers a handler for messages containing `marker`; checked in registration order."""
+        def register(func):
+            self._shortcuts.append((marker, func))
+            return func
+        return register
+
+    def stateful(self, func):
+        self._stateful = func
+        return func
+
+    def fallback(self, func):
+        self._fallback = func
+        return func
+
+    def resolve(self, user_id, text):
+        """Returns (command name, handler, args) for a message without running it."""
+        state = user_states.get(user_id)
+        if state is not None and self._stateful:
+            return f"state:{state.get('action')}", self._stateful, state
+        # Any whitespace ends the keyword, so pasted lines may follow it directly.
+        token, rest = (text.split(None, 1) + ["", ""])[:2]
+        entry = self._keywords.get(token.lower())
+        if entry:
+            return entry[0], entry[1], rest.strip()
+        for marker, func in self._shortcuts:
+            if marker in text:
+                return f"shortcut {marker}", func, text
+        lowered = text.lower()
+        for keyword, name, func in self._prefixes:
+            if lowered.startswith(keyword):
+                return name, func, text[len(keyword):].strip()
+        return "unknown", self._fallback, text
+
+    def dispatch(self, user_id, text):
+        t = text.strip()
+        name, func, args = self.resolve(user_id, t)
+        start = time.perf_counter()
+        try:
+            return func(user_id, t, args)
+        finally:
+            self._record(name, time.perf_counter() - start)
+
+    def _record(self, name, seconds):
+        with self._lock:
+            count, total, worst = self.timings.get(name, (0, 0.0, 0.0))
+            self.timings[name] = (count + 1, total + seconds, max(worst, seconds))
+        if self.on_timing:
+            self.on_timing(name, seconds)
+
+    def timing_stats(self):
+        """Returns {command: {"count", "total_seconds", "max_seconds"}}."""
+        with self._lock:
+            return {name: {"count": c, "total_seconds": t, "max_seconds": m}
+                    for name, (c, t, m) in self.timings.items()}
+
+
+router = CommandRouter()
+
+# --- List rendering ---
+# LINE rejects text messages over 5000 characters and replies with more than 5 messages.
+# LINE counts UTF-16 code units, so an emoji such as 📝 takes two; see message_length().
+LINE_MESSAGE_LIMIT = 5000
+LINE_MAX_MESSAGES = 5
+LIST_FETCH_SIZE = 200
+LIST_MORE_HINT = "\n\n還有更多項目，輸入 'list next' 繼續。"
+HISTORY_PAGE_SIZE = 30
+# Memory budget (bytes) for rendered first pages of `list`. The cache lives
+# in this process and is only kept fresh by this process's writes, so it is
+# off by default when several workers share state (STATE_STORE=database).
+LIST_CACHE_BYTES = int(os.getenv("LIST_CACHE_BYTES", 4 * 1024 * 1024 if STATE_STORE == "memory" else 0))
+LIST_DONE_FILTERS = {"done": True, "完成": True, "undone": False, "未完成": False}
+# `list done today` / `list done 7d`: items finished today, or in the last N days including today.
+LIST_TODAY = ("today", "今天")
+_LIST_DAYS = re.compile(r"(\d{1,5})(?:d|天)")
+
+# --- Shortcut parsers ---
+_BULK_SPLIT = re.compile(r"\s*\+\+\s*")
+_PLUS_SPLIT = re.compile(r"\s*\+\s*")
+_COMMA_SPLIT = re.compile(r"\s*,\s*")
+_DUE_SPLIT = re.compile(r"\s+@\s*")
+DUE_EXAMPLES = "明天 9:00、10/20 18:30、21:00、2h"
+NO_VALUE = ["無", "none", "skip"]
+
+
+def parse_bulk_add(text):
+    """Parses `主分類 + 子分類 [+ 地點] ++ 項目1, 項目2, ...`.
+
+    Returns (category, sub_category, place, titles), or None if malformed.
+    """
+    parts = _BULK_SPLIT.split(text.strip())
+    if len(parts) != 2:
+        return None
+    context = _PLUS_SPLIT.split(parts[0])
+    if len(context) < 2:
+        return None
+    place = context[2] if len(context) >= 3 else None
+    titles = [title for title in _COMMA_SPLIT.split(parts[1]) if title]
+    return context[0], context[1], place, titles
+
+
+def parse_add(text):
+    """Parses `主分類 + 子分類 + 名稱 [+ 地點] [@ 到期時間]`.
+
+    Returns (category, sub_category, title, place, due text), or None.
+    """
+    text, due = text.strip(), None
+    match = _DUE_SPLIT.search(text)
+    if match:
+        text, due = text[:match.start()], text[match.end():].strip() or None
+    parts = _PLUS_SPLIT.split(text)
+    if len(parts) < 3:
+        return None
+    place = parts[3] if len(parts) >= 4 else None
+    return parts[0], parts[1], parts[2], place, due
+
+
+def parse_future_due(text):
+    """Returns (due_at, None) for a due time in the future, or (None, error reply)."""
+    due_at = parse_due(text)
+    if due_at is None:
+        return None, f"看不懂到期時間「{text}」，範例：{DUE_EXAMPLES}"
+    if due_at <= time.time():
+        return None, "到期時間已經過了，請輸入未來的時間。"
+    return due_at, None
+
+
+def add_with_due(user_id, category, sub_category, title, place=None, due_at=None):
+    """Adds one item and returns the confirmation reply."""
+    db.add_item(user_id, category, sub_category, title, done=0, place=place, due_at=due_at)
+    if due_at is not None and router.on_due:
+        # The scheduler reads from its own connection, so it is only told once the item is committed.
+        db.after_commit(lambda: router.on_due(due_at))
+    reply_text = f"已新增：{title} ({category}/{sub_category})" + (f"，地點：{place}" if place else "")
+    if due_at is not None:
+        reply_text += f"，到期：{format_timestamp(due_at)}"
+    return reply_text
+
+
+def parse_item_ids(args):
+    """Parses `1,2, 3` into [1, 2, 3]; raises ValueError on anything else."""
+    return [int(i) for i in _COMMA_SPLIT.split(args.strip())]
+
+
+# --- Multi-step flows ---
+@router.stateful
+def handle_stateful_message(user_id, t, state):
+    # Stores may hand out a copy (e.g. the database backend), so `state` is
+    # saved back after every change.
+    action = state.get("action")
+
+    if t.lower() == "取消":
+        del user_states[user_id]
+        return "操作已取消。"
+
+    # --- Add Item Flow ---
+    if action == "add_item":
+        stage = state.get("stage")
+        if stage == "awaiting_category":
+            state["data"]["category"] = t
+            state["stage"] = "awaiting_sub_category"
+            user_states[user_id] = state
+            return "請輸入子分類："
+        elif stage == "awaiting_sub_category":
+            state["data"]["sub_category"] = t
+            state["stage"] = "awaiting_title"
+            user_states[user_id] = state
+            return "請輸入待辦事項名稱："
+        elif stage == "awaiting_title":
+            state["data"]["title"] = t
+            state["stage"] = "awaiting_place"
+            user_states[user_id] = state
+            return "請輸入地點（若無請輸入'無'）："
+        elif stage == "awaiting_place":
+            state["data"]["place"] = t if t.lower() not in NO_VALUE else None
+            state["stage"] = "awaiting_due"
+            user_states[user_id] = state
+            return f"請輸入到期時間，例如：{DUE_EXAMPLES}（若無請輸入'無'）："
+        elif stage == "awaiting_due":
+            due_at = None
+            if t.lower() not in NO_VALUE:
+                due_at, error = parse_future_due(t)
+                if error:
+                    return error + "，或輸入'無'、'取消'。"
+            data = state["data"]
+            del user_states[user_id]
+            return add_with_due(user_id, data["category"], data["sub_category"], data["title"], data.get("place"),
+                                due_at)
+
+    # --- Edit Item Flow ---
+    elif action == "edit_item":
+        stage = state.get("stage")
+        item_id = state.get("item_id")
+
+        if stage == "awaiting_field_choice":
+            if t in ["1", "名稱"]:
+                state["stage"] = "awaiting_new_value"
+                state["field"] = "title"
+                user_states[user_id] = state
+                return "請輸入新的「名稱」："
+            elif t in ["2", "地點"]:
+                state["stage"] = "awaiting_new_value"
+                state["field"] = "place"
+                user_states[user_id] = state
+                return "請輸入新的「地點」（若要清空請輸入'無'）："
+            else:
+                return "無效的選項，請重新輸入 (1 或 2)，或輸入'取消'。"
+
+        elif stage == "awaiting_new_value":
+            field = state.get("field")
+            value = t if not (field == 'place' and t.lower() in ['無', 'none']) else None
+
+            if db.edit_item(user_id, item_id, field, value):
+                del user_states[user_id]
+                return f"待辦事項 [{item_id}] 已更新。"
+            else:
+                del user_states[user_id] # Clear state even on failure
+                return f"更新失敗，找不到項目 [{item_id}] 或欄位不正確。"
+
+    return "發生未知錯誤，請取消後重試。"
+
+
+# --- Shortcuts ---
+@router.shortcut("++")
+def bulk_add(user_id, t, args):
+    parsed = parse_bulk_add(t)
+    if not parsed:
+        return "快捷指令格式錯誤，範例：主分類 + 子分類 [+ 地點] ++ 項目1, 項目2, ..."
+    category, sub_category, place, titles = parsed
+    new_ids = db.add_items(user_id, category, sub_category, titles, place=place)
+    if not new_ids:
+        return "沒有可新增的項目。"
+    header = f"已在 {category}/{sub_category}"
+    if place:
+        header += f" (地點: {place})"
+    header += f" 新增 {len(new_ids)} 個項目："
+    return join_item_lines(header, [f"[{item_id}] {title}" for item_id, title in zip(new_ids, titles)])
+
+
+@router.shortcut("+")
+def quick_add(user_id, t, args):
+    parsed = parse_add(t)
+    if not parsed:
+        return "快捷指令格式錯誤，範例：主分類 + 子分類 + 名稱 [+ 地點] [@ 到期時間]"
+    category, sub_category, title, place, due_text = parsed
+    due_at = None
+    if due_text:
+        due_at, error = parse_future_due(due_text)
+        if error:
+            return error
+    return add_with_due(user_id, category, sub_category, title, place, due_at)
+
+
+# --- Keyword commands ---
+@router.command("ping")
+def ping(user_id, t, args):
+    return "pong"
+
+
+@router.command("新增", "add")
+def start_add(user_id, t, args):
+    user_states[user_id] = {
+        "action": "add_item",
+        "stage": "awaiting_category",
+        "data": {}
+    }
+    return "好的，我們來新增一個待辦事項。請輸入主分類（或輸入'取消'）："
+
+
+@router.command("編輯", "edit")
+def start_edit(user_id, t, args):
+    try:
+        item_id = int(args.split()[0])
+    except (IndexError, ValueError):
+        return "編輯指令格式錯誤，請使用 '編輯 <編號>'"
+    item = db.get_item(user_id, item_id)
+    if not item:
+        return f"找不到待辦事項 [{item_id}]。"
+    user_states[user_id] = {
+        "action": "edit_item",
+        "stage": "awaiting_field_choice",
+        "item_id": item_id
+    }
+    return (
+        f"您正要編輯項目 [{item['id']}]：{item['title']}\n"
+        f"分類：{item['category_name']}/{item['sub_category_name']}\n"
+        f"地點：{item['place'] or '未設定'}\n\n"
+        "您想編輯哪個欄位？\n"
+        "1. 名稱\n"
+        "2. 地點\n\n"
+        "請輸入選項（或輸入'取消'）"
+    )
+
+
+@router.command("刪除", "del")
+def delete(user_id, t, args):
+    try:
+        item_ids = parse_item_ids(args)
+    except ValueError:
+        return "刪除指令格式錯誤，請使用 '刪除 <編號1>,<編號2>...'"
+    deleted = db.delete_item(user_id, item_ids, return_items=True)
+    return join_item_lines(f"已刪除 {len(deleted)} 個項目。", [f"[{item_id}] {title}" for item_id, title in deleted])
+
+
+@router.command("完成", "done")
+def complete(user_id, t, args):
+    try:
+        item_ids = parse_item_ids(args)
+    except ValueError:
+        return "完成指令格式錯誤，請使用 '完成 <編號1>,<編號2>...'"
+    updated = db.mark_item_as_done(user_id, item_ids, return_items=True)
+    return join_item_lines(f"已將 {len(updated)} 個項目標示為完成。",
+                           [f"[{item_id}] {title}" for item_id, title in updated])
+
+
+@router.command("help")
+def show_help(user_id, t, args):
+    return "指令：\n- 新增 (逐步新增)\n- 編輯 <編號>\n- 刪除 <編號1>,<編號2>...\n- 完成 <編號1>,<編號2>...\n- list [done|undone] [主分類] (列出項目)\n- list done today|7d [主分類] (今天 / 最近 7 天完成的項目)\n- list next (列出下一頁)\n- 搜尋 <關鍵字> (依名稱或地點搜尋)\n- history (已封存的完成項目)\n- 快捷指令: 主分類 + 子分類 + 名稱 [+ 地點] [@ 到期時間]\n- 到期時間範例: 明天 9:00、10/20 18:30、21:00、2h\n- 多筆新增: 主分類 + 子分類 [+ 地點] ++ 項目1, 項目2, ...\n- export [csv|jsonl] (下載所有項目)\n- import (換行貼上「主分類,子分類,名稱[,地點]」或取得上傳連結)"
+
+
+@router.command("echo")
+def echo(user_id, t, args):
+    return t[5:] if args else unknown(user_id, t, args)
+
+
+def message_length(text):
+    """Length of `text` as LINE counts it, in UTF-16 code units."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def clip_message(text, limit):
+    """Cuts `text` to at most `limit` UTF-16 code units without splitting a character."""
+    if message_length(text) <= limit:
+        return text
+    return text.encode("utf-16-le")[:limit * 2].decode("utf-16-le", "ignore")
+
+
+def join_item_lines(header, lines):
+    """Appends `[id] title` lines to `header` in one message, ending with `…還有 N 項` once the next line would not fit."""
+    budget = LINE_MESSAGE_LIMIT - message_length(f"\n…還有 {len(lines)} 項")
+    # The header can carry a user-supplied category name, so it gets at most half the message.
+    text = clip_message(header, budget // 2)
+    size = message_length(text)
+    for shown, line in enumerate(lines):
+        line_size = 1 + message_length(line)
+        if size + line_size > budget:
+            return text + f"\n…還有 {len(lines) - shown} 項"
+        text += "\n" + line
+        size += line_size
+    return text
+
+
+def format_item_line(row):
+    # 索引: 0=id, 1=title, 3=done, 5=completed_date, 7=sub_category_name, 8=due_at
+    status = "✅" if row[3] else "📝"
+    line = f"{status} [{row[0]}] {row[1]} ({row[7]})"
+    if row[3]:
+        line += f" - 完成於 {format_timestamp(row[5])}"
+    elif row[8] is not None:
+        line += f" ⏰ {format_timestamp(row[8])}"
+    return line
+
+
+def render_list_pages(user_id, category=None, done=None, after=None, completed_since=None):
+    """Renders a user's items into at most LINE_MAX_MESSAGES messages.
+
+    Rows are fetched LIST_FETCH_SIZE at a time and packed into pages of at
+    most LINE_MESSAGE_LIMIT UTF-16 code units. Returns (pages, cursor), where cursor
+    is the (category, id) to continue from, or None once everything is shown.
+    """
+    budget = LINE_MESSAGE_LIMIT - message_length(LIST_MORE_HINT)
+    pages, lines, size = [], [], 0
+    page_category = None
+    cursor = after
+    while True:
+        rows = db.list_items(user_id, category, after=cursor, limit=LIST_FETCH_SIZE, done=done,
+                             completed_since=completed_since)
+        for row in rows:
+            # 索引: 0=id, 6=主分類名
+            line = clip_message(format_item_line(row), budget - 200)
+            header = clip_message(f"--- {row[6]} ---", 200)
+            block = [line] if row[6] == page_category else ([""] if lines else []) + [header, line]
+            block_size = sum(message_length(b) + 1 for b in block)
+            if lines and size + block_size > budget:
+                pages.append("\n".join(lines))
+                if len(pages) == LINE_MAX_MESSAGES:
+                    pages[-1] += LIST_MORE_HINT
+                    return pages, cursor
+                block = [header, line]
+                block_size = sum(message_length(b) + 1 for b in block)
+                lines, size = [], 0
+            lines.extend(block)
+            size += block_size
+            page_category = row[6]
+            cursor = (row[6], row[0])
+        if len(rows) < LIST_FETCH_SIZE:
+            break
+    if lines:
+        pages.append("\n".join(lines))
+    return pages, None
+
+
+# Keyed by (user_id, category, done, since, list version): any write to the
+# user's items changes the version, and stale entries age out of the LRU.
+list_cache = db.LRUCache(LIST_CACHE_BYTES, weigh=lambda entry: sum(sys.getsizeof(page) for page in entry[0]))
+
+
+def cached_list_pages(user_id, category=None, done=None, completed_since=None):
+    """Returns render_list_pages() for the first page, reusing the last rendering if nothing changed."""
+    # Writes still pending in this thread's unit of work have not moved the
+    # list version yet, so the cached rendering would miss them.
+    if LIST_CACHE_BYTES <= 0 or db.has_uncommitted_changes(user_id):
+        return render_list_pages(user_id, category, done, None, completed_since)
+    # Read the version before the rows, so a write that lands in between
+    # leaves this entry under an already outdated version.
+    key = (user_id, category, done, completed_since, db.list_version(user_id))
+    entry = list_cache.get(key)
+    if entry is None:
+        entry = render_list_pages(user_id, category, done, None, completed_since)
+        list_cache.put(key, entry)
+    return entry
+
+
+def parse_list_period(token):
+    """Returns the start (epoch seconds) of `today` / `<N>d` / `<N>天`, or None."""
+    if token in LIST_TODAY:
+        return start_of_day()
+    match = _LIST_DAYS.fullmatch(token)
+    if match and int(match.group(1)) > 0:
+        return start_of_day(int(match.group(1)) - 1)
+    return None
+
+
+def parse_list_args(args):
+    """Splits `list` arguments into (done filter, completed since, category)."""
+    token, _, rest = args.partition(" ")
+    if token.lower() not in LIST_DONE_FILTERS:
+        return None, None, args or None
+    done, rest = LIST_DONE_FILTERS[token.lower()], rest.strip()
+    if done:
+        period, _, category = rest.partition(" ")
+        since = parse_list_period(period.lower())
+        if since is not None:
+            return done, since, category.strip() or None
+    return done, None, rest or None
+
+
+@router.command("list", prefix=True)
+def list_command(user_id, t, args):
+    cursor_key = f"list-cursor:{user_id}"
+    if args.lower() == "next":
+        saved = user_states.get(cursor_key)
+        if not saved:
+            return "沒有更多項目了，請輸入 list 重新列出。"
+        done, category, after = saved["done"], saved["category"], tuple(saved["after"])
+        since = saved.get("since")
+    else:
+        (done, since, category), after = parse_list_args(args), None
+    if after is None:
+        pages, cursor = cached_list_pages(user_id, category, done, since)
+    else:
+        pages, cursor = render_list_pages(user_id, category, done, after, since)
+    if cursor:
+        user_states[cursor_key] = {"done": done, "since": since, "category": category, "after": list(cursor)}
+    else:
+        user_states.delete(cursor_key)
+    if not pages:
+        return "目前沒有任何清單。" if after is None else "沒有更多項目了。"
+    return pages
+
+
+@router.command("歷史", "history")
+def history(user_id, t, args):
+    cursor_key = f"history-cursor:{user_id}"
+    after = None
+    if args.lower() == "next":
+        saved = user_states.get(cursor_key)
+        if not saved:
+            return "沒有更多紀錄了，請輸入 history 重新列出。"
+        after = tuple(saved["after"])
+    rows = db.list_archived_items(user_id, after=after, limit=HISTORY_PAGE_SIZE + 1)
+    if not rows:
+        user_states.delete(cursor_key)
+        return "目前沒有封存的項目。" if after is None else "沒有更多紀錄了。"
+    more = len(rows) > HISTORY_PAGE_SIZE
+    rows = rows[:HISTORY_PAGE_SIZE]
+    # 索引: 0=id, 1=title, 2=place, 3=completed_date, 4=主分類名, 5=子分類名
+    lines = ["已封存的完成項目："]
+    for row in rows:
+        lines.append(f"✅ [{row[0]}] {row[1][:200]} ({row[4]}/{row[5]}) - 完成於 {format_timestamp(row[3])}")
+    if more:
+        user_states[cursor_key] = {"after": [rows[-1][3], rows[-1][0]]}
+        lines.append("\n還有更多紀錄，輸入 'history next' 繼續。")
+    else:
+        user_states.delete(cursor_key)
+    return "\n".join(lines)
+
+
+@router.command("搜尋", "find")
+def search(user_id, t, args):
+    if not args:
+        return "請輸入關鍵字，例如：搜尋 牛奶"
+    rows = db.search_items(user_id, args)
+    if not rows:
+        return f"找不到符合「{args}」的項目。"
+    # 索引: 6=主分類名
+    lines = [f"{format_item_line(row)[:200]} - {row[6]}" for row in rows]
+    return f"找到 {len(rows)} 個項目：\n" + "\n".join(lines)
+
+
+@router.command("匯出", "export")
+def export(user_id, t, args):
+    fmt = args.lower() or "csv"
+    if fmt not in transfer.FORMATS:
+        return "格式請選 csv 或 jsonl，例如：export jsonl"
+    url = transfer.transfer_url("export", user_id, fmt)
+    if url is None:
+        return "伺服器尚未設定 PUBLIC_URL，無法產生下載連結。"
+    return f"請在 {transfer.TRANSFER_LINK_TTL // 60} 分鐘內開啟連結下載所有項目（{fmt}）：\n{url}"
+
+
+@router.command("匯入", "import")
+def import_command(user_id, t, args):
+    first, _, data = args.partition("\n")
+    fmt = first.strip().lower()
+    if fmt not in transfer.FORMATS:
+        fmt, data = "csv", args
+    if data.strip():
+        # Lines pasted into the chat, e.g. `主分類,子分類,名稱,地點` per line.
+        importer = transfer.Importer(user_id, fmt, on_due=router.on_due)
+        return importer.run(data.splitlines(keepends=True)).summary()
+    url = transfer.transfer_url("import", user_id, fmt)
+    if url is None:
+        return "請在「匯入」後換行貼上資料，每行一筆：主分類,子分類,名稱[,地點]"
+    return (f"請在「匯入」後換行貼上資料，每行一筆：主分類,子分類,名稱[,地點]\n"
+            f"或在 {transfer.TRANSFER_LINK_TTL // 60} 分鐘內上傳 {fmt} 檔案：\n"
+            f"curl --data-binary @todo.{fmt} \"{url}\"")
+
+
+@router.fallback
+def unknown(user_id, t, args):
+    return f"收到：{t}"
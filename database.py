@@ -1,308 +1,2084 @@
+import csv
+import io
+import itertools
 import os
 import sqlite3
-import psycopg2
-import psycopg2.extras
-from datetime import datetime
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+
+from metrics import instrument
+from search import index_terms, query_terms
 
 # This file implements a switcher to use a PostgreSQL database in production
 # (if DATABASE_URL is set) and a local SQLite database for development.
 
-class SqliteEngine:
-    def __init__(self, db_file="todo.db"):
-        self.db_file = db_file
-        print("Using SQLite database for local development.")
+# Imported by PostgresEngine, so SQLite deployments never load the driver.
+psycopg2 = None
 
-    def _connect(self):
-        return sqlite3.connect(self.db_file)
+# --- Connection Pool Settings ---
+# DB_POOL_SIZE caps the number of open PostgreSQL connections per process.
+# DB_POOL_IDLE_TIMEOUT (seconds) closes connections that sat unused for too long.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", 300))
+# Idle connections older than this are pinged with SELECT 1 before being reused.
+DB_HEALTH_CHECK_AFTER = 30
+# Older SQLite builds cap bound parameters at 999 per statement.
+SQLITE_MAX_IN_PARAMS = 900
+# Maximum number of (user_id, name) / (category_id, name) lookups kept in memory.
+CATEGORY_CACHE_SIZE = int(os.getenv("CATEGORY_CACHE_SIZE", 10000))
 
-    def init_db(self):
-        conn = self._connect()
+# Number of items returned by a search.
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", 20))
+# Only the newest SEARCH_CANDIDATES matches are ranked, so a query matching
+# most of a large list still costs a bounded amount of scoring.
+SEARCH_CANDIDATES = 500
+# Rows re-tokenized per statement while backfilling search terms.
+SEARCH_BACKFILL_BATCH = 1000
+# Rows fetched per round trip while exporting a user's items.
+EXPORT_FETCH_SIZE = 1000
+
+# SQLite is vacuumed once at least this fraction of its pages is free.
+VACUUM_FREE_RATIO = 0.25
+
+# Arbitrary key for the PostgreSQL advisory lock held while migrating.
+SCHEMA_LOCK_ID = 4170001
+
+# Folds duplicate categories/sub-categories (same owner and name) into the row
+# with the lowest id, so the unique indexes below can be created. Valid on both
+# SQLite and PostgreSQL; used by schema migration 2.
+MERGE_DUPLICATE_CATEGORIES = [
+    """UPDATE sub_categories SET category_id = (
+           SELECT MIN(d.id) FROM categories c JOIN categories d ON d.user_id = c.user_id AND d.name = c.name
+           WHERE c.id = sub_categories.category_id)
+       WHERE category_id IN (SELECT id FROM categories c WHERE EXISTS (
+           SELECT 1 FROM categories d WHERE d.user_id = c.user_id AND d.name = c.name AND d.id < c.id))""",
+    """UPDATE items SET category_id = (
+           SELECT MIN(d.id) FROM categories c JOIN categories d ON d.user_id = c.user_id AND d.name = c.name
+           WHERE c.id = items.category_id)
+       WHERE category_id IN (SELECT id FROM categories c WHERE EXISTS (
+           SELECT 1 FROM categories d WHERE d.user_id = c.user_id AND d.name = c.name AND d.id < c.id))""",
+    """DELETE FROM categories WHERE EXISTS (
+           SELECT 1 FROM categories d WHERE d.user_id = categories.user_id AND d.name = categories.name
+           AND d.id < categories.id)""",
+    """UPDATE items SET sub_category_id = (
+           SELECT MIN(d.id) FROM sub_categories s JOIN sub_categories d ON d.category_id = s.category_id AND d.name = s.name
+           WHERE s.id = items.sub_category_id)
+       WHERE sub_category_id IN (SELECT id FROM sub_categories s WHERE EXISTS (
+           SELECT 1 FROM sub_categories d WHERE d.category_id = s.category_id AND d.name = s.name AND d.id < s.id))""",
+    """DELETE FROM sub_categories WHERE EXISTS (
+           SELECT 1 FROM sub_categories d WHERE d.category_id = sub_categories.category_id
+           AND d.name = sub_categories.name AND d.id < sub_categories.id)""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_categories_user_name ON categories (user_id, name)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_sub_categories_category_name ON sub_categories (category_id, name)",
+]
+
+
+# Keep items_fts (SQLite) in step with items; used by migrations 5 and 7.
+SQLITE_FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts (rowid, user_id, search_terms) VALUES (new.id, new.user_id, new.search_terms);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts (items_fts, rowid, user_id, search_terms)
+        VALUES ('delete', old.id, old.user_id, old.search_terms);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF user_id, search_terms ON items BEGIN
+        INSERT INTO items_fts (items_fts, rowid, user_id, search_terms)
+        VALUES ('delete', old.id, old.user_id, old.search_terms);
+        INSERT INTO items_fts (rowid, user_id, search_terms) VALUES (new.id, new.user_id, new.search_terms);
+    END""",
+]
+
+
+# Holds only reminders still to be sent: rows leave it once they are
+# reminded or done, so the scheduler's range scans stay small however large
+# items grows. Queries must repeat the predicate for SQLite to use it.
+REMINDER_INDEX = """CREATE INDEX IF NOT EXISTS idx_items_due ON items (due_at)
+    WHERE due_at IS NOT NULL AND done = 0 AND reminded_at IS NULL"""
+PENDING_REMINDER = "due_at IS NOT NULL AND done = 0 AND reminded_at IS NULL"
+
+
+def iso_to_epoch(value):
+    """Converts a completed_date written by datetime.now().isoformat() (server-local time) to epoch seconds."""
+    if not value:
+        return None
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def _copy_timestamp(epoch):
+    return None if epoch is None else datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+def convert_completed_date_pg(table):
+    """Returns a PostgreSQL migration step turning `table`.completed_date from ISO text into timestamptz.
+
+    The old strings came from datetime.now().isoformat(), i.e. the server's
+    local time, so they are read with the server's current UTC offset.
+    """
+    def step(c):
+        offset = f"{int(datetime.now().astimezone().utcoffset().total_seconds())} seconds"
+        c.execute(f"""
+            ALTER TABLE {table} ALTER COLUMN completed_date TYPE timestamptz USING date_trunc('second',
+                NULLIF(completed_date, '')::timestamp AT TIME ZONE %s::interval)
+        """, (offset,))
+    return step
+
+
+def backfill_search_terms(param):
+    """Returns a migration step that fills items.search_terms for existing rows."""
+    def step(c):
+        last_id = 0
+        while True:
+            c.execute(f"SELECT id, title, place FROM items WHERE id > {param} ORDER BY id LIMIT {param}",
+                      (last_id, SEARCH_BACKFILL_BATCH))
+            rows = c.fetchall()
+            if not rows:
+                return
+            c.executemany(f"UPDATE items SET search_terms={param} WHERE id={param}",
+                          [(index_terms(title, place), item_id) for item_id, title, place in rows])
+            last_id = rows[-1][0]
+    return step
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of checked-out connections.
+
+    Idle connections are kept on a LIFO stack so the warmest one is reused
+    first; connections idle longer than `idle_timeout` are closed instead of
+    reused, and connections idle longer than `health_check_after` are pinged
+    before being handed out.
+    """
+
+    def __init__(self, connect, maxsize=DB_POOL_SIZE, idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                 health_check_after=DB_HEALTH_CHECK_AFTER, checkout_timeout=30):
+        self._connect = connect
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.checkout_timeout = checkout_timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxsize)
+        self.in_use = 0
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise PoolTimeout(f"No database connection available after {self.checkout_timeout}s")
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    conn = self._connect()
+                    break
+                conn, last_used = entry
+                idle = time.monotonic() - last_used
+                if idle <= self.idle_timeout and self._is_healthy(conn, idle):
+                    break
+                self._close(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+        return conn
+
+    def putconn(self, conn, discard=False):
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            self.in_use -= 1
+            if not discard and not self._is_closed(conn):
+                self._idle.append((conn, now))
+            else:
+                expired.append(conn)
+            # The bottom of the stack holds the least recently used connections.
+            while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                expired.append(self._idle.pop(0)[0])
+        self._slots.release()
+        for c in expired:
+            self._close(c)
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._lock:
+            return {"in_use": self.in_use, "idle": len(self._idle), "max": self.maxsize}
+
+    def _is_healthy(self, conn, idle):
+        if self._is_closed(conn):
+            return False
+        if idle < self.health_check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _is_closed(conn):
+        return bool(getattr(conn, "closed", False))
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class LRUCache:
+    """A bounded, thread-safe mapping that evicts the least recently used key.
+
+    By default `maxsize` counts entries; with `weigh`, it bounds the sum of
+    weigh(value) over all entries instead (e.g. their size in bytes).
+    """
+
+    def __init__(self, maxsize, weigh=None):
+        self.maxsize = maxsize
+        self._weigh = weigh or (lambda value: 1)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self.weight -= self._weigh(self._data[key])
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self.weight += self._weigh(value)
+            while self.weight > self.maxsize and self._data:
+                _, evicted = self._data.popitem(last=False)
+                self.weight -= self._weigh(evicted)
+                self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._data:
+                self.weight -= self._weigh(self._data.pop(key))
+
+    def discard_where(self, predicate):
+        """Removes every entry for which predicate(key, value) is true and returns them."""
+        with self._lock:
+            removed = [(k, v) for k, v in self._data.items() if predicate(k, v)]
+            for k, v in removed:
+                del self._data[k]
+                self.weight -= self._weigh(v)
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "weight": self.weight, "max": self.maxsize, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+class _PooledEngine:
+    """Shared transaction handling and ID caches for the engines below.
+
+    `_transaction()` hands out one connection per thread. Nested calls (e.g.
+    `add_item` -> `get_category_id`) join the outermost transaction instead of
+    opening a new connection, and only the outermost block commits.
+    `unit_of_work()` opens that outermost transaction for a whole batch of
+    commands, and `savepoint()` lets one of them fail without undoing the rest.
+
+    Every user also has a list version that changes whenever their items do,
+    so rendered lists can be cached and checked for staleness without a query.
+    """
+
+    def __init__(self, cache_size=CATEGORY_CACHE_SIZE):
+        self._local = threading.local()
+        self.category_cache = LRUCache(cache_size)
+        self.sub_category_cache = LRUCache(cache_size)
+        # Versions come from one counter and are never reused, so a user whose
+        # entry was evicted simply gets a new version that matches nothing cached.
+        self.list_versions = LRUCache(cache_size)
+        self._version_counter = itertools.count(1)
+        self._version_lock = threading.Lock()
+        self.commits = 0
+
+    # Appended to the category checks below; PostgreSQL locks the rows so a
+    # concurrent prune skips them.
+    LOCK_ROWS = ""
+
+    @contextmanager
+    def _transaction(self, write=False):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.pending = []
+        self._local.touched = set()
+        self._local.after_commit = []
+        self._local.savepoints = 0
+        failed = False
+        callbacks = []
+        try:
+            self._begin(conn, write)
+            yield conn
+            conn.commit()
+            self.commits += 1
+            for cache, key, value in self._local.pending:
+                cache.put(key, value)
+            if self._local.touched:
+                self._bump_list_versions(self._local.touched)
+            callbacks = self._local.after_commit
+        except BaseException:
+            failed = True
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            self._local.conn = None
+            self._local.pending = []
+            self._local.touched = set()
+            self._local.after_commit = []
+            self._release(conn, failed)
+        for callback in callbacks:
+            callback()
+
+    @contextmanager
+    def unit_of_work(self):
+        """Runs every database call inside the block in one write transaction.
+
+        The block commits once at the end, or rolls back entirely if an
+        exception escapes it; use `savepoint()` to isolate parts that may fail.
+        """
+        with self._transaction(write=True):
+            yield
+
+    @contextmanager
+    def savepoint(self):
+        """Undoes only the writes made inside the block if it raises.
+
+        Outside a transaction each call already commits on its own, so the
+        block runs as is.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            yield
+            return
+        self._local.savepoints += 1
+        name = f"sp{self._local.savepoints}"
+        pending, after_commit = len(self._local.pending), len(self._local.after_commit)
         c = conn.cursor()
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS categories (
+        c.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            c.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            c.execute(f"RELEASE SAVEPOINT {name}")
+            # Cached IDs and callbacks for rows that no longer exist are dropped;
+            # users marked as touched stay marked, which only costs a cache miss.
+            del self._local.pending[pending:]
+            del self._local.after_commit[after_commit:]
+            raise
+        else:
+            c.execute(f"RELEASE SAVEPOINT {name}")
+        finally:
+            self._local.savepoints -= 1
+
+    def after_commit(self, callback):
+        """Calls `callback()` once the current transaction commits, or right away outside one."""
+        if getattr(self._local, "conn", None) is None:
+            callback()
+        else:
+            self._local.after_commit.append(callback)
+
+    def has_uncommitted_changes(self, user_id):
+        """True if this thread's open transaction has changed the user's items."""
+        return user_id in getattr(self._local, "touched", ())
+
+    def _begin(self, conn, write):
+        pass
+
+    def _lock_schema(self, c):
+        pass
+
+    def schema_version(self):
+        """Returns the latest applied migration, or 0 if the schema was never created."""
+        try:
+            with self._transaction() as conn:
+                c = conn.cursor()
+                c.execute("SELECT MAX(version) FROM schema_version")
+                return c.fetchone()[0] or 0
+        except Exception:
+            return 0
+
+    def init_db(self):
+        """Creates the schema or upgrades it in place to the latest version.
+
+        An up-to-date database is detected with a single read, without taking
+        the write or migration lock, so starting many workers at once stays
+        cheap. Returns True if any migration was applied.
+        """
+        latest = self.MIGRATIONS[-1][0]
+        if self.schema_version() >= latest:
+            return False
+        applied = False
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            self._lock_schema(c)
+            c.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, applied_at TEXT)")
+            c.execute("SELECT MAX(version) FROM schema_version")
+            current = c.fetchone()[0] or 0
+            for version, steps in self.MIGRATIONS:
+                if version <= current:
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(c)
+                    else:
+                        c.execute(step)
+                c.execute(f"INSERT INTO schema_version (version, applied_at) VALUES ({self.PARAM}, {self.PARAM})",
+                          (version, datetime.now().isoformat()))
+                print(f"Database schema upgraded to version {version}.")
+                applied = True
+        return applied
+
+    def _remember(self, cache, key, value):
+        # IDs of rows inserted in this transaction only become visible to other
+        # threads once it commits; a rollback drops them.
+        self._local.pending.append((cache, key, value))
+
+    def _touch(self, user_id):
+        # Marks the user's items as changed. The version only moves once the
+        # transaction commits; moving it earlier would let a concurrent reader
+        # cache the old rows under the new version.
+        self._local.touched.add(user_id)
+
+    def _bump_list_versions(self, user_ids):
+        with self._version_lock:
+            for user_id in user_ids:
+                self.list_versions.put(user_id, next(self._version_counter))
+
+    def list_version(self, user_id):
+        """Returns a value that changes whenever the user's items change."""
+        with self._version_lock:
+            version = self.list_versions.get(user_id)
+            if version is None:
+                version = next(self._version_counter)
+                self.list_versions.put(user_id, version)
+            return version
+
+    def _category_ids(self, c, user_id, names):
+        """Returns {name: id} for the user's categories, creating missing ones with one statement per batch."""
+        ids, missing = {}, []
+        for name in names:
+            cid = self.category_cache.get((user_id, name))
+            if cid is None:
+                missing.append(name)
+            else:
+                ids[name] = cid
+        if not missing:
+            return ids
+        p = self.PARAM
+        c.executemany(f"INSERT INTO categories (user_id, name) VALUES ({p}, {p}) ON CONFLICT (user_id, name) DO NOTHING",
+                      [(user_id, name) for name in missing])
+        for start in range(0, len(missing), SQLITE_MAX_IN_PARAMS):
+            chunk = missing[start:start + SQLITE_MAX_IN_PARAMS]
+            c.execute(f"SELECT name, id FROM categories WHERE user_id={p} AND name IN ({', '.join([p] * len(chunk))})",
+                      [user_id, *chunk])
+            for name, cid in c.fetchall():
+                ids[name] = cid
+                self._remember(self.category_cache, (user_id, name), cid)
+        return ids
+
+    def _sub_category_ids(self, c, keys):
+        """Returns {(category_id, name): id}, creating missing sub-categories the same way."""
+        ids, missing = {}, []
+        for key in keys:
+            sid = self.sub_category_cache.get(key)
+            if sid is None:
+                missing.append(key)
+            else:
+                ids[key] = sid
+        if not missing:
+            return ids
+        p = self.PARAM
+        c.executemany(f"""INSERT INTO sub_categories (category_id, name) VALUES ({p}, {p})
+                          ON CONFLICT (category_id, name) DO NOTHING""", missing)
+        wanted = set(missing)
+        step = SQLITE_MAX_IN_PARAMS // 2
+        for start in range(0, len(missing), step):
+            chunk = missing[start:start + step]
+            cids = sorted({cid for cid, _ in chunk})
+            names = sorted({name for _, name in chunk})
+            c.execute(f"""SELECT category_id, name, id FROM sub_categories
+                          WHERE category_id IN ({', '.join([p] * len(cids))}) AND name IN ({', '.join([p] * len(names))})""",
+                      [*cids, *names])
+            for cid, name, sid in c.fetchall():
+                if (cid, name) in wanted:
+                    ids[(cid, name)] = sid
+                    self._remember(self.sub_category_cache, (cid, name), sid)
+        return ids
+
+    def _category_pair(self, user_id, category, sub_category, stale=False):
+        """Returns (category_id, sub_category_id), dropping the user's cached IDs first if `stale`.
+
+        The archiver in any process prunes categories once their last item is
+        archived, so cached IDs can outlive their rows; writers check them and
+        call this again with stale=True when they are gone. The sub-category
+        ID is None if the category was pruned.
+        """
+        if stale:
+            self.invalidate_categories(user_id)
+        cid = self.get_category_id(user_id, category)
+        return cid, self.get_sub_category_id(cid, sub_category)
+
+    def _pair_exists(self, c, cid, sid):
+        p = self.PARAM
+        c.execute(f"""SELECT 1 FROM sub_categories s JOIN categories c ON c.id = s.category_id
+                      WHERE s.id = {p} AND c.id = {p}{self.LOCK_ROWS}""", (sid, cid))
+        return c.fetchone() is not None
+
+    def import_items(self, user_id, rows, now=None):
+        """Inserts rows of (category, sub_category, title, place, done, completed_date, created_at, due_at).
+
+        Categories and sub-categories are looked up and created in bulk, and all
+        rows go in within one transaction; returns the number of items added.
+        Items that are done or already past due are stored as reminded, so an
+        import does not set off a burst of stale reminders.
+        """
+        if not rows:
+            return 0
+        now = time.time() if now is None else now
+        with self._transaction(write=True) as conn:
+            self._touch(user_id)
+            # Imports are rare and large, so they read every ID from the database
+            # rather than trusting cached ones that may have been pruned.
+            self.invalidate_categories(user_id)
+            c = conn.cursor()
+            cids = self._category_ids(c, user_id, list(dict.fromkeys(row[0] for row in rows)))
+            sids = self._sub_category_ids(c, list(dict.fromkeys((cids[row[0]], row[1]) for row in rows)))
+            self._insert_items(c, [
+                (user_id, cids[category], sids[(cids[category], sub_category)], title, place, int(bool(done)),
+                 completed_date, created_at or int(now), due_at,
+                 now if due_at is not None and (done or due_at <= now) else None, index_terms(title, place))
+                for category, sub_category, title, place, done, completed_date, created_at, due_at in rows
+            ])
+        return len(rows)
+
+    def export_items(self, user_id, batch_size=EXPORT_FETCH_SIZE):
+        """Yields all of a user's items, then their archived ones, fetching `batch_size` rows at a time.
+
+        Rows have the same shape as import_items() takes; archived items come
+        back as done with no created_at or due_at. The generator reads on a
+        connection of its own in one read transaction, so the export is a
+        consistent snapshot and can be resumed from any thread.
+        """
+        conn = self._open_export_connection()
+        try:
+            for n, query in enumerate(self.EXPORT_QUERIES):
+                c = self._export_cursor(conn, n)
+                c.execute(query, (user_id,))
+                while True:
+                    rows = c.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield from rows
+                c.close()
+        finally:
+            self._close_export_connection(conn)
+
+    def invalidate_categories(self, user_id, category_ids=()):
+        """Drops cached IDs for a user's categories and their sub-categories.
+
+        Call this after deleting categories or sub-categories so later lookups
+        go back to the database.
+        """
+        removed = self.category_cache.discard_where(lambda key, _: key[0] == user_id)
+        stale = set(category_ids) | {cid for _, cid in removed}
+        self.sub_category_cache.discard_where(lambda key, _: key[0] in stale)
+
+    def _forget_pruned(self, sub_parents, categories):
+        # sub_parents: category IDs that lost sub-categories; categories:
+        # (id, user_id) of deleted categories.
+        by_user = {}
+        for cid, user_id in categories:
+            by_user.setdefault(user_id, []).append(cid)
+        for user_id, cids in by_user.items():
+            self.invalidate_categories(user_id, cids)
+        self.sub_category_cache.discard_where(lambda key, _: key[0] in sub_parents)
+
+    def cache_stats(self):
+        return {"categories": self.category_cache.stats(), "sub_categories": self.sub_category_cache.stats()}
+
+
+class _SqliteConnection(sqlite3.Connection):
+    # sqlite3.Connection itself cannot be weakly referenced; see SqliteEngine._connect.
+    pass
+
+
+class SqliteEngine(_PooledEngine):
+    NAME = "sqlite"
+    PARAM = "?"
+
+    # Schema migrations, applied in order by init_db(). A step is either a SQL
+    # statement or a callable taking the cursor.
+    MIGRATIONS = [
+        (1, [
+            """CREATE TABLE IF NOT EXISTS categories (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, name TEXT NOT NULL
-            )""")
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS sub_categories (
+            )""",
+            """CREATE TABLE IF NOT EXISTS sub_categories (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, category_id INTEGER NOT NULL, name TEXT NOT NULL,
                 FOREIGN KEY(category_id) REFERENCES categories(id)
-            )""")
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS items (
+            )""",
+            """CREATE TABLE IF NOT EXISTS items (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, category_id INTEGER NOT NULL,
                 sub_category_id INTEGER NOT NULL, title TEXT NOT NULL, desc TEXT, place TEXT,
                 done INTEGER DEFAULT 0, completed_date TEXT,
                 FOREIGN KEY(category_id) REFERENCES categories(id),
                 FOREIGN KEY(sub_category_id) REFERENCES sub_categories(id)
-            )""")
-        conn.commit()
+            )""",
+        ]),
+        (2, MERGE_DUPLICATE_CATEGORIES + [
+            "CREATE INDEX IF NOT EXISTS idx_items_user_category ON items (user_id, category_id, id)",
+        ]),
+        (3, [
+            """CREATE TABLE IF NOT EXISTS conversation_states (
+                user_id TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_conversation_states_expires ON conversation_states (expires_at)",
+        ]),
+        (4, [
+            "CREATE TABLE IF NOT EXISTS webhook_events (event_id TEXT PRIMARY KEY, received_at REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS idx_webhook_events_received ON webhook_events (received_at)",
+        ]),
+        # items_fts indexes search_terms (see search.py) without storing a
+        # second copy; the triggers keep it in step with items.
+        (5, [
+            "ALTER TABLE items ADD COLUMN search_terms TEXT",
+            backfill_search_terms("?"),
+            """CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+                user_id, search_terms, content='items', content_rowid='id', tokenize='unicode61', prefix='2 3'
+            )""",
+            "INSERT INTO items_fts (items_fts) VALUES ('rebuild')",
+        ] + SQLITE_FTS_TRIGGERS),
+        # Finished items are moved here by archive_done_items(); category names
+        # are copied so the archive does not keep categories alive.
+        (6, [
+            """CREATE TABLE IF NOT EXISTS items_archive (
+                id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, category TEXT NOT NULL, sub_category TEXT NOT NULL,
+                title TEXT NOT NULL, desc TEXT, place TEXT, completed_date TEXT, archived_at REAL NOT NULL
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_items_archive_user_completed ON items_archive (user_id, completed_date, id)",
+            "CREATE INDEX IF NOT EXISTS idx_items_done_completed ON items (done, completed_date)",
+        ]),
+        # completed_date becomes epoch seconds and created_at is added. SQLite
+        # cannot change a column type in place (TEXT affinity would turn the
+        # numbers back into strings), so both tables are rebuilt. Item IDs and
+        # the AUTOINCREMENT counter are kept, so items_fts stays valid.
+        (7, [
+            lambda c: c.connection.create_function("iso_to_epoch", 1, iso_to_epoch, deterministic=True),
+            "DROP TRIGGER IF EXISTS items_fts_insert",
+            "DROP TRIGGER IF EXISTS items_fts_delete",
+            "DROP TRIGGER IF EXISTS items_fts_update",
+            """CREATE TABLE items_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, category_id INTEGER NOT NULL,
+                sub_category_id INTEGER NOT NULL, title TEXT NOT NULL, desc TEXT, place TEXT,
+                done INTEGER DEFAULT 0, completed_date INTEGER, search_terms TEXT,
+                created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+                FOREIGN KEY(category_id) REFERENCES categories(id),
+                FOREIGN KEY(sub_category_id) REFERENCES sub_categories(id)
+            )""",
+            """INSERT INTO items_new (id, user_id, category_id, sub_category_id, title, desc, place, done,
+                                     completed_date, search_terms, created_at)
+               SELECT id, user_id, category_id, sub_category_id, title, desc, place, done,
+                      iso_to_epoch(completed_date), search_terms, NULL
+               FROM items""",
+            "DELETE FROM sqlite_sequence WHERE name = 'items_new'",
+            """INSERT INTO sqlite_sequence (name, seq) SELECT 'items_new', COALESCE(MAX(seq), 0) FROM (
+                   SELECT seq FROM sqlite_sequence WHERE name = 'items' UNION ALL SELECT MAX(id) FROM items_archive)""",
+            "DROP TABLE items",
+            "ALTER TABLE items_new RENAME TO items",
+            "CREATE INDEX IF NOT EXISTS idx_items_user_category ON items (user_id, category_id, id)",
+            "CREATE INDEX IF NOT EXISTS idx_items_done_completed ON items (done, completed_date)",
+            "CREATE INDEX IF NOT EXISTS idx_items_user_done_completed ON items (user_id, done, completed_date)",
+            """CREATE TABLE items_archive_new (
+                id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, category TEXT NOT NULL, sub_category TEXT NOT NULL,
+                title TEXT NOT NULL, desc TEXT, place TEXT, completed_date INTEGER, archived_at REAL NOT NULL
+            )""",
+            """INSERT INTO items_archive_new
+               SELECT id, user_id, category, sub_category, title, desc, place, iso_to_epoch(completed_date), archived_at
+               FROM items_archive""",
+            "DROP TABLE items_archive",
+            "ALTER TABLE items_archive_new RENAME TO items_archive",
+            "CREATE INDEX IF NOT EXISTS idx_items_archive_user_completed ON items_archive (user_id, completed_date, id)",
+        ] + SQLITE_FTS_TRIGGERS),
+        (8, [
+            "ALTER TABLE items ADD COLUMN due_at INTEGER",
+            "ALTER TABLE items ADD COLUMN reminded_at INTEGER",
+            REMINDER_INDEX,
+            "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)",
+        ]),
+    ]
+
+    # Both follow an index (idx_items_user_category / idx_items_archive_user_completed), so rows stream without a sort.
+    EXPORT_QUERIES = [
+        """SELECT c.name, s.name, i.title, i.place, i.done, i.completed_date, i.created_at, i.due_at
+           FROM items i JOIN categories c ON c.id = i.category_id JOIN sub_categories s ON s.id = i.sub_category_id
+           WHERE i.user_id = ? ORDER BY i.category_id, i.id""",
+        """SELECT category, sub_category, title, place, 1, completed_date, NULL, NULL
+           FROM items_archive WHERE user_id = ? ORDER BY completed_date, id""",
+    ]
+
+    def __init__(self, db_file="todo.db", idle_timeout=DB_POOL_IDLE_TIMEOUT, cache_size=CATEGORY_CACHE_SIZE,
+                 announce=True):
+        super().__init__(cache_size)
+        self.db_file = db_file
+        self.idle_timeout = idle_timeout
+        self._threads = threading.local()
+        self._counts_lock = threading.Lock()
+        self.open_connections = 0
+        self.in_use = 0
+        if announce:
+            print("Using SQLite database for local development.")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None, factory=_SqliteConnection)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._counts_lock:
+            self.open_connections += 1
+        # A thread that exits (e.g. one per request under Flask's threaded
+        # server) drops its connection without _close_thread_conn(); the
+        # finalizer counts it as closed either way, exactly once.
+        conn.uncount = weakref.finalize(conn, self._uncount_connection)
+        return conn
+
+    def _uncount_connection(self):
+        with self._counts_lock:
+            self.open_connections -= 1
+
+    def _close_thread_conn(self):
+        conn = self._threads.conn
+        ConnectionPool._close(conn)
+        self._threads.conn = None
+        conn.uncount()
+
+    def _acquire(self):
+        # SQLite connections are cheap to keep but not safe to share, so each
+        # thread opens its own once and keeps it until it goes idle.
+        conn = getattr(self._threads, "conn", None)
+        if conn is not None and time.monotonic() - self._threads.last_used > self.idle_timeout:
+            self._close_thread_conn()
+            conn = None
+        if conn is None:
+            conn = self._connect()
+            self._threads.conn = conn
+        with self._counts_lock:
+            self.in_use += 1
+        return conn
+
+    def _begin(self, conn, write):
+        # Writers take the lock up front; a deferred transaction that reads
+        # first cannot wait for the lock when it later upgrades to write.
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+
+    def _release(self, conn, failed=False):
+        self._threads.last_used = time.monotonic()
+        with self._counts_lock:
+            self.in_use -= 1
+        if failed and conn.in_transaction:
+            self._close_thread_conn()
+
+    def close(self):
+        if getattr(self._threads, "conn", None) is not None:
+            self._close_thread_conn()
+
+    def _open_export_connection(self):
+        conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("BEGIN")
+        return conn
+
+    def _export_cursor(self, conn, n):
+        return conn.cursor()
+
+    def _close_export_connection(self, conn):
         conn.close()
 
+    def _insert_items(self, c, records):
+        c.executemany("""
+            INSERT INTO items (user_id, category_id, sub_category_id, title, desc, place, done, completed_date,
+                               created_at, due_at, reminded_at, search_terms)
+            VALUES (?, ?, ?, ?, '', ?, ?, ?, ?, ?, ?, ?)
+        """, records)
+
+    def pool_stats(self):
+        with self._counts_lock:
+            return {"open": self.open_connections, "in_use": self.in_use,
+                    "idle": self.open_connections - self.in_use}
+
     def get_category_id(self, user_id, name):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("SELECT id FROM categories WHERE user_id=? AND name=?", (user_id, name))
-        row = c.fetchone()
-        if row:
-            cid = row[0]
-        else:
-            c.execute("INSERT INTO categories (user_id, name) VALUES (?, ?)", (user_id, name))
-            cid = c.lastrowid
-            conn.commit()
-        conn.close()
-        return cid
+        key = (user_id, name)
+        cid = self.category_cache.get(key)
+        if cid is not None:
+            return cid
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("SELECT id FROM categories WHERE user_id=? AND name=?", key)
+            row = c.fetchone()
+            if not row:
+                c.execute("""
+                    INSERT INTO categories (user_id, name) VALUES (?, ?)
+                    ON CONFLICT (user_id, name) DO UPDATE SET name=excluded.name RETURNING id
+                """, key)
+                row = c.fetchone()
+            self._remember(self.category_cache, key, row[0])
+            return row[0]
 
     def get_sub_category_id(self, category_id, name):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("SELECT id FROM sub_categories WHERE category_id=? AND name=?", (category_id, name))
-        row = c.fetchone()
-        if row:
-            sid = row[0]
-        else:
-            c.execute("INSERT INTO sub_categories (category_id, name) VALUES (?, ?)", (category_id, name))
-            sid = c.lastrowid
-            conn.commit()
-        conn.close()
-        return sid
+        key = (category_id, name)
+        sid = self.sub_category_cache.get(key)
+        if sid is not None:
+            return sid
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("SELECT id FROM sub_categories WHERE category_id=? AND name=?", key)
+            row = c.fetchone()
+            if not row:
+                c.execute("""
+                    INSERT INTO sub_categories (category_id, name)
+                    SELECT ?, ? WHERE EXISTS (SELECT 1 FROM categories WHERE id = ?)
+                    ON CONFLICT (category_id, name) DO UPDATE SET name=excluded.name RETURNING id
+                """, (*key, category_id))
+                row = c.fetchone()
+                if not row:
+                    return None
+            self._remember(self.sub_category_cache, key, row[0])
+            return row[0]
 
-    def add_item(self, user_id, category, sub_category, title, desc="", done=0, place=None):
-        cid = self.get_category_id(user_id, category)
-        sid = self.get_sub_category_id(cid, sub_category)
-        completed_date = datetime.now().isoformat() if done else None
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO items (user_id, category_id, sub_category_id, title, desc, place, done, completed_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (user_id, cid, sid, title, desc, place, done, completed_date))
-        conn.commit()
-        conn.close()
+    def add_item(self, user_id, category, sub_category, title, desc="", done=0, place=None, due_at=None):
+        with self._transaction(write=True) as conn:
+            self._touch(user_id)
+            completed_date = int(time.time()) if done else None
+            c = conn.cursor()
+            for stale in (False, True):
+                cid, sid = self._category_pair(user_id, category, sub_category, stale)
+                # Inserts nothing if a cached ID was pruned, without an extra query.
+                c.execute("""
+                    INSERT INTO items (user_id, category_id, sub_category_id, title, desc, place, done, completed_date,
+                                       search_terms, due_at)
+                    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+                    WHERE EXISTS (SELECT 1 FROM sub_categories s JOIN categories c ON c.id = s.category_id
+                                  WHERE s.id = ? AND c.id = ?)
+                """, (user_id, cid, sid, title, desc, place, done, completed_date, index_terms(title, place), due_at,
+                      sid, cid))
+                if c.rowcount:
+                    break
 
-    def delete_item(self, user_id, item_ids):
-        conn = self._connect()
-        c = conn.cursor()
-        deleted_count = 0
-        for item_id in item_ids:
-            c.execute("SELECT id FROM items WHERE id=? AND user_id=?", (item_id, user_id))
-            if c.fetchone():
-                c.execute("DELETE FROM items WHERE id=?", (item_id,))
-                deleted_count += 1
-        conn.commit()
-        conn.close()
-        return deleted_count
+    def add_items(self, user_id, category, sub_category, titles, place=None):
+        """Inserts several items into one sub-category in a single transaction and returns their IDs."""
+        titles = [t for t in titles if t]
+        if not titles:
+            return []
+        with self._transaction(write=True) as conn:
+            self._touch(user_id)
+            c = conn.cursor()
+            for stale in (False, True):
+                cid, sid = self._category_pair(user_id, category, sub_category, stale)
+                if sid is not None and self._pair_exists(c, cid, sid):
+                    break
+            c.executemany("""
+                INSERT INTO items (user_id, category_id, sub_category_id, title, desc, place, done, completed_date,
+                                   search_terms)
+                VALUES (?, ?, ?, ?, '', ?, 0, NULL, ?)
+            """, [(user_id, cid, sid, title, place, index_terms(title, place)) for title in titles])
+            # executemany() does not report row IDs, but AUTOINCREMENT hands out
+            # consecutive IDs while this transaction holds the write lock.
+            last_id = c.execute("SELECT last_insert_rowid()").fetchone()[0]
+            return list(range(last_id - len(titles) + 1, last_id + 1))
 
-    def mark_item_as_done(self, user_id, item_ids):
-        conn = self._connect()
-        c = conn.cursor()
-        updated_count = 0
-        for item_id in item_ids:
-            c.execute("SELECT id FROM items WHERE id=? AND user_id=?", (item_id, user_id))
-            if c.fetchone():
-                c.execute("UPDATE items SET done=1, completed_date=? WHERE id=?", (datetime.now().isoformat(), item_id))
-                updated_count += 1
-        conn.commit()
-        conn.close()
-        return updated_count
+    def _update_owned_items(self, statement, params, user_id, item_ids, return_items):
+        # Runs `statement ... WHERE user_id=? AND id IN (...)` once per chunk of
+        # IDs, staying under SQLite's bound-parameter limit.
+        ids = sorted(set(item_ids))
+        affected = []
+        count = 0
+        with self._transaction(write=True) as conn:
+            self._touch(user_id)
+            c = conn.cursor()
+            for start in range(0, len(ids), SQLITE_MAX_IN_PARAMS):
+                chunk = ids[start:start + SQLITE_MAX_IN_PARAMS]
+                query = f"{statement} WHERE user_id=? AND id IN ({','.join('?' * len(chunk))})"
+                if return_items:
+                    c.execute(query + " RETURNING id, title", [*params, user_id, *chunk])
+                    affected.extend(c.fetchall())
+                else:
+                    c.execute(query, [*params, user_id, *chunk])
+                    count += c.rowcount
+        return sorted(affected) if return_items else count
+
+    def delete_item(self, user_id, item_ids, return_items=False):
+        """Deletes the user's items among `item_ids`.
+
+        Returns the number of deleted items, or a list of (id, title) when
+        `return_items` is set.
+        """
+        return self._update_owned_items("DELETE FROM items", [], user_id, item_ids, return_items)
+
+    def mark_item_as_done(self, user_id, item_ids, return_items=False):
+        """Marks the user's items among `item_ids` as done; returns like `delete_item`."""
+        return self._update_owned_items("UPDATE items SET done=1, completed_date=?",
+                                        [int(time.time())], user_id, item_ids, return_items)
 
     def get_item(self, user_id, item_id):
-        conn = self._connect()
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("""
-            SELECT i.id, i.title, i.place, c.name as category_name, sc.name as sub_category_name
-            FROM items i JOIN categories c ON i.category_id = c.id JOIN sub_categories sc ON i.sub_category_id = sc.id
-            WHERE i.id=? AND i.user_id=?
-        """, (item_id, user_id))
-        item = c.fetchone()
-        conn.close()
-        return item
+        with self._transaction() as conn:
+            c = conn.cursor()
+            c.row_factory = sqlite3.Row
+            c.execute("""
+                SELECT i.id, i.title, i.place, c.name as category_name, sc.name as sub_category_name
+                FROM items i JOIN categories c ON i.category_id = c.id JOIN sub_categories sc ON i.sub_category_id = sc.id
+                WHERE i.id=? AND i.user_id=?
+            """, (item_id, user_id))
+            return c.fetchone()
 
     def edit_item(self, user_id, item_id, field, value):
         if field not in ['title', 'place']: return False
-        conn = self._connect()
-        c = conn.cursor()
-        query = f"UPDATE items SET {field}=? WHERE id=? AND user_id=?"
-        c.execute(query, (value, item_id, user_id))
-        updated_rows = c.rowcount
-        conn.commit()
-        conn.close()
-        return updated_rows > 0
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            query = f"UPDATE items SET {field}=? WHERE id=? AND user_id=? RETURNING title, place"
+            c.execute(query, (value, item_id, user_id))
+            row = c.fetchone()
+            if row is None:
+                return False
+            c.execute("UPDATE items SET search_terms=? WHERE id=?", (index_terms(*row), item_id))
+            self._touch(user_id)
+            return True
 
-    def list_items(self, user_id, category=None):
-        conn = self._connect()
-        c = conn.cursor()
-        query = """
-            SELECT i.id, i.title, i.desc, i.done, i.place, i.completed_date, c.name, sc.name
-            FROM items i JOIN categories c ON i.category_id = c.id JOIN sub_categories sc ON i.sub_category_id = sc.id
-            WHERE i.user_id=?
+    def list_items(self, user_id, category=None, after=None, limit=None, done=None, completed_since=None):
+        """Lists a user's items ordered by (category name, id).
+
+        `after` is the (category name, id) of the last row already seen, so a
+        page continues right after it; `done` keeps only finished (True) or
+        unfinished (False) items, and `completed_since` (epoch seconds) only
+        items finished at or after that time. completed_date and due_at are
+        returned as epoch seconds.
         """
-        params = [user_id]
-        if category:
-            query += " AND c.name=?"
-            params.append(category)
-        query += " ORDER BY c.name, i.id"
-        c.execute(query, params)
-        rows = c.fetchall()
-        conn.close()
-        return rows
+        with self._transaction() as conn:
+            c = conn.cursor()
+            query = """
+                SELECT i.id, i.title, i.desc, i.done, i.place, i.completed_date, c.name, sc.name, i.due_at
+                FROM items i JOIN categories c ON i.category_id = c.id JOIN sub_categories sc ON i.sub_category_id = sc.id
+                WHERE i.user_id=?
+            """
+            params = [user_id]
+            if category:
+                query += " AND c.name=?"
+                params.append(category)
+            if done is not None:
+                query += " AND i.done=?"
+                params.append(1 if done else 0)
+            if completed_since is not None:
+                query += " AND i.completed_date >= ?"
+                params.append(completed_since)
+            if after:
+                query += " AND (c.name > ? OR (c.name = ? AND i.id > ?))"
+                params.extend([after[0], after[0], after[1]])
+            query += " ORDER BY c.name, i.id"
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+            c.execute(query, params)
+            return c.fetchall()
 
+    def search_items(self, user_id, text, limit=SEARCH_LIMIT):
+        """Returns the user's items matching every term of `text`, best match first.
 
-class PostgresEngine:
-    def __init__(self):
-        self.db_url = os.getenv("DATABASE_URL")
-        print("Using PostgreSQL database for production.")
+        Rows have the same columns as `list_items`.
+        """
+        terms = query_terms(text)
+        if not terms:
+            return []
+        quote = lambda value: '"' + value.replace('"', '""') + '"'
+        match = " AND ".join([f"user_id:{quote(user_id)}"] +
+                             [f"search_terms:{quote(term)}" + ("*" if prefix else "") for term, prefix in terms])
+        with self._transaction() as conn:
+            c = conn.cursor()
+            c.execute("""
+                SELECT i.id, i.title, i.desc, i.done, i.place, i.completed_date, c.name, sc.name, i.due_at
+                FROM (SELECT rowid, rank FROM items_fts WHERE items_fts MATCH ? ORDER BY rowid DESC LIMIT ?) f
+                JOIN items i ON i.id = f.rowid
+                JOIN categories c ON i.category_id = c.id JOIN sub_categories sc ON i.sub_category_id = sc.id
+                WHERE i.user_id=?
+                ORDER BY f.rank LIMIT ?
+            """, (match, SEARCH_CANDIDATES, user_id, limit))
+            return c.fetchall()
 
-    def _connect(self):
-        return psycopg2.connect(self.db_url)
+    def archive_done_items(self, before, limit):
+        """Moves up to `limit` items completed before `before` into items_archive; returns {user_id: count}."""
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("SELECT id FROM items WHERE done=1 AND completed_date < ? ORDER BY completed_date LIMIT ?",
+                      (before, limit))
+            ids = [row[0] for row in c.fetchall()]
+            if not ids:
+                return {}
+            placeholders = ",".join("?" * len(ids))
+            c.execute(f"""
+                INSERT OR IGNORE INTO items_archive
+                    (id, user_id, category, sub_category, title, desc, place, completed_date, archived_at)
+                SELECT i.id, i.user_id, COALESCE(c.name, ''), COALESCE(sc.name, ''), i.title, i.desc, i.place,
+                       i.completed_date, ?
+                FROM items i LEFT JOIN categories c ON i.category_id = c.id
+                LEFT JOIN sub_categories sc ON i.sub_category_id = sc.id
+                WHERE i.id IN ({placeholders})
+            """, [time.time(), *ids])
+            c.execute(f"DELETE FROM items WHERE id IN ({placeholders}) RETURNING user_id", ids)
+            moved = {}
+            for (user_id,) in c.fetchall():
+                moved[user_id] = moved.get(user_id, 0) + 1
+            for user_id in moved:
+                self._touch(user_id)
+            return moved
 
-    def init_db(self):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS categories (
+    def prune_orphan_categories(self, user_ids):
+        """Deletes the users' sub-categories and categories no item refers to; returns how many rows were removed."""
+        user_ids = sorted(set(user_ids))
+        sub_parents, categories = set(), []
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            for start in range(0, len(user_ids), SQLITE_MAX_IN_PARAMS):
+                chunk = user_ids[start:start + SQLITE_MAX_IN_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                c.execute(f"""
+                    DELETE FROM sub_categories
+                    WHERE category_id IN (SELECT id FROM categories WHERE user_id IN ({placeholders}))
+                    AND NOT EXISTS (SELECT 1 FROM items i WHERE i.sub_category_id = sub_categories.id)
+                    RETURNING category_id
+                """, chunk)
+                sub_parents.update(row[0] for row in c.fetchall())
+                c.execute(f"""
+                    DELETE FROM categories WHERE user_id IN ({placeholders})
+                    AND NOT EXISTS (SELECT 1 FROM items i WHERE i.category_id = categories.id)
+                    AND NOT EXISTS (SELECT 1 FROM sub_categories s WHERE s.category_id = categories.id)
+                    RETURNING id, user_id
+                """, chunk)
+                categories.extend(c.fetchall())
+        self._forget_pruned(sub_parents, categories)
+        return len(sub_parents) + len(categories)
+
+    def compact(self):
+        """Refreshes planner statistics and vacuums once enough pages are free; returns True if vacuumed."""
+        conn = self._acquire()
+        try:
+            conn.execute("PRAGMA analysis_limit=1000")
+            conn.execute("ANALYZE")
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            pages = conn.execute("PRAGMA page_count").fetchone()[0]
+            if pages and free / pages >= VACUUM_FREE_RATIO:
+                conn.execute("VACUUM")
+                return True
+            return False
+        finally:
+            self._release(conn)
+
+    def list_archived_items(self, user_id, after=None, limit=None):
+        """Lists a user's archived items, most recently completed first.
+
+        Rows are (id, title, place, completed_date, category, sub_category);
+        `after` is the (completed_date, id) of the last row already seen.
+        """
+        with self._transaction() as conn:
+            c = conn.cursor()
+            query = """
+                SELECT id, title, place, completed_date, category, sub_category FROM items_archive WHERE user_id=?
+            """
+            params = [user_id]
+            if after:
+                query += " AND (completed_date < ? OR (completed_date = ? AND id < ?))"
+                params.extend([after[0], after[0], after[1]])
+            query += " ORDER BY completed_date DESC, id DESC"
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+            c.execute(query, params)
+            return c.fetchall()
+
+    def pending_reminders(self, until, limit):
+        """Returns (id, due_at) of reminders not yet sent that are due by `until`, earliest first."""
+        with self._transaction() as conn:
+            c = conn.cursor()
+            c.execute(f"SELECT id, due_at FROM items WHERE {PENDING_REMINDER} AND due_at <= ? ORDER BY due_at LIMIT ?",
+                      (until, limit))
+            return c.fetchall()
+
+    def claim_reminders(self, item_ids, now):
+        """Marks the due, unfinished items among `item_ids` as reminded and returns them.
+
+        Rows are (id, user_id, title, place, due_at), earliest first. Each item
+        is returned only once, however many schedulers race for it.
+        """
+        ids = sorted(set(item_ids))
+        claimed = []
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            for start in range(0, len(ids), SQLITE_MAX_IN_PARAMS):
+                chunk = ids[start:start + SQLITE_MAX_IN_PARAMS]
+                c.execute(f"""
+                    UPDATE items SET reminded_at=? WHERE {PENDING_REMINDER} AND due_at <= ?
+                    AND id IN ({','.join('?' * len(chunk))}) RETURNING id, user_id, title, place, due_at
+                """, [int(now), now, *chunk])
+                claimed.extend(c.fetchall())
+        return sorted(claimed, key=lambda row: (row[4], row[0]))
+
+    def acquire_lease(self, name, owner, ttl, now):
+        """Takes or renews the named lease until `now + ttl`; returns True if `owner` holds it."""
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("""
+                INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET owner=excluded.owner, expires_at=excluded.expires_at
+                WHERE leases.owner=excluded.owner OR leases.expires_at < ?
+            """, (name, owner, now + ttl, now))
+            c.execute("SELECT owner FROM leases WHERE name=?", (name,))
+            return c.fetchone()[0] == owner
+
+    def release_lease(self, name, owner):
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM leases WHERE name=? AND owner=?", (name, owner))
+
+    def get_state(self, user_id, now):
+        with self._transaction() as conn:
+            c = conn.cursor()
+            c.execute("SELECT state FROM conversation_states WHERE user_id=? AND expires_at > ?", (user_id, now))
+            row = c.fetchone()
+            return row[0] if row else None
+
+    def set_state(self, user_id, state, expires_at):
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("""
+                INSERT INTO conversation_states (user_id, state, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET state=excluded.state, expires_at=excluded.expires_at
+            """, (user_id, state, expires_at))
+
+    def delete_state(self, user_id):
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM conversation_states WHERE user_id=?", (user_id,))
+
+    def purge_expired_states(self, now):
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM conversation_states WHERE expires_at <= ?", (now,))
+            return c.rowcount
+
+    def count_states(self, now):
+        with self._transaction() as conn:
+            c = conn.cursor()
+            c.execute("SELECT COUNT(*) FROM conversation_states WHERE expires_at > ?", (now,))
+            return c.fetchone()[0]
+
+    def claim_webhook_event(self, event_id, now):
+        """Records a webhook event ID; returns False if it was already recorded."""
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("INSERT INTO webhook_events (event_id, received_at) VALUES (?, ?) ON CONFLICT DO NOTHING",
+                      (event_id, now))
+            return c.rowcount > 0
+
+    def forget_webhook_event(self, event_id):
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM webhook_events WHERE event_id=?", (event_id,))
+
+    def purge_webhook_events(self, before):
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM webhook_events WHERE received_at < ?", (before,))
+            return c.rowcount
+
+
+class PostgresEngine(_PooledEngine):
+    NAME = "postgres"
+    PARAM = "%s"
+    LOCK_ROWS = " FOR KEY SHARE"
+
+    MIGRATIONS = [
+        (1, [
+            """CREATE TABLE IF NOT EXISTS categories (
                 id SERIAL PRIMARY KEY, user_id TEXT NOT NULL, name TEXT NOT NULL
-            )""")
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS sub_categories (
+            )""",
+            """CREATE TABLE IF NOT EXISTS sub_categories (
                 id SERIAL PRIMARY KEY, category_id INTEGER NOT NULL, name TEXT NOT NULL,
                 FOREIGN KEY(category_id) REFERENCES categories(id) ON DELETE CASCADE
-            )""")
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS items (
+            )""",
+            # "desc" is a reserved word in PostgreSQL and must stay quoted.
+            """CREATE TABLE IF NOT EXISTS items (
                 id SERIAL PRIMARY KEY, user_id TEXT NOT NULL, category_id INTEGER NOT NULL,
-                sub_category_id INTEGER NOT NULL, title TEXT NOT NULL, desc TEXT, place TEXT,
+                sub_category_id INTEGER NOT NULL, title TEXT NOT NULL, "desc" TEXT, place TEXT,
                 done INTEGER DEFAULT 0, completed_date TEXT,
                 FOREIGN KEY(category_id) REFERENCES categories(id) ON DELETE CASCADE,
                 FOREIGN KEY(sub_category_id) REFERENCES sub_categories(id) ON DELETE CASCADE
-            )""")
-        conn.commit()
-        conn.close()
+            )""",
+        ]),
+        (2, MERGE_DUPLICATE_CATEGORIES + [
+            "CREATE INDEX IF NOT EXISTS idx_items_user_category ON items (user_id, category_id, id)",
+        ]),
+        (3, [
+            """CREATE TABLE IF NOT EXISTS conversation_states (
+                user_id TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at DOUBLE PRECISION NOT NULL
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_conversation_states_expires ON conversation_states (expires_at)",
+        ]),
+        (4, [
+            "CREATE TABLE IF NOT EXISTS webhook_events (event_id TEXT PRIMARY KEY, received_at DOUBLE PRECISION NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS idx_webhook_events_received ON webhook_events (received_at)",
+        ]),
+        # The terms are already tokenized (see search.py), so the tsvector is
+        # built from the array directly instead of going through a text parser.
+        (5, [
+            "ALTER TABLE items ADD COLUMN IF NOT EXISTS search_terms TEXT",
+            backfill_search_terms("%s"),
+            """ALTER TABLE items ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+                array_to_tsvector(string_to_array(coalesce(search_terms, ''), ' '))
+            ) STORED""",
+            "CREATE INDEX IF NOT EXISTS idx_items_search ON items USING GIN (search_vector)",
+        ]),
+        (6, [
+            """CREATE TABLE IF NOT EXISTS items_archive (
+                id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, category TEXT NOT NULL, sub_category TEXT NOT NULL,
+                title TEXT NOT NULL, "desc" TEXT, place TEXT, completed_date TEXT,
+                archived_at DOUBLE PRECISION NOT NULL
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_items_archive_user_completed ON items_archive (user_id, completed_date, id)",
+            "CREATE INDEX IF NOT EXISTS idx_items_done_completed ON items (done, completed_date)",
+        ]),
+        # completed_date becomes timestamptz and created_at is added; rows that
+        # predate it keep NULL.
+        (7, [
+            convert_completed_date_pg("items"),
+            convert_completed_date_pg("items_archive"),
+            "ALTER TABLE items ADD COLUMN IF NOT EXISTS created_at timestamptz",
+            "ALTER TABLE items ALTER COLUMN created_at SET DEFAULT date_trunc('second', now())",
+            "CREATE INDEX IF NOT EXISTS idx_items_user_done_completed ON items (user_id, done, completed_date)",
+        ]),
+        (8, [
+            "ALTER TABLE items ADD COLUMN IF NOT EXISTS due_at timestamptz",
+            "ALTER TABLE items ADD COLUMN IF NOT EXISTS reminded_at timestamptz",
+            REMINDER_INDEX,
+            """CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at DOUBLE PRECISION NOT NULL
+            )""",
+        ]),
+    ]
+
+    EXPORT_QUERIES = [
+        """SELECT c.name, s.name, i.title, i.place, i.done, EXTRACT(EPOCH FROM i.completed_date)::bigint,
+                  EXTRACT(EPOCH FROM i.created_at)::bigint, EXTRACT(EPOCH FROM i.due_at)::bigint
+           FROM items i JOIN categories c ON c.id = i.category_id JOIN sub_categories s ON s.id = i.sub_category_id
+           WHERE i.user_id = %s ORDER BY i.category_id, i.id""",
+        """SELECT category, sub_category, title, place, 1, EXTRACT(EPOCH FROM completed_date)::bigint, NULL, NULL
+           FROM items_archive WHERE user_id = %s ORDER BY completed_date, id""",
+    ]
+
+    def __init__(self, pool_size=DB_POOL_SIZE, idle_timeout=DB_POOL_IDLE_TIMEOUT, cache_size=CATEGORY_CACHE_SIZE):
+        global psycopg2
+        import psycopg2.extras
+        super().__init__(cache_size)
+        self.db_url = os.getenv("DATABASE_URL")
+        self.pool = ConnectionPool(self._connect, maxsize=pool_size, idle_timeout=idle_timeout)
+        print("Using PostgreSQL database for production.")
+
+    def _connect(self):
+        return psycopg2.connect(self.db_url)
+
+    def _acquire(self):
+        return self.pool.getconn()
+
+    def _release(self, conn, failed=False):
+        self.pool.putconn(conn)
+
+    def close(self):
+        self.pool.closeall()
+
+    def _open_export_connection(self):
+        return self.pool.getconn()
+
+    def _export_cursor(self, conn, n):
+        # A named cursor lives on the server; fetchmany() pulls one batch per round trip.
+        return conn.cursor(name=f"export_{n}")
+
+    def _close_export_connection(self, conn):
+        try:
+            conn.rollback()
+        finally:
+            self.pool.putconn(conn)
+
+    def _insert_items(self, c, records):
+        # COPY streams every row in one statement. In CSV format an unquoted
+        # empty field is NULL, so strings are quoted and None is left empty.
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+        for record in records:
+            writer.writerow([_copy_timestamp(value) if 6 <= i <= 9 else value for i, value in enumerate(record)])
+        buffer.seek(0)
+        c.copy_expert("""
+            COPY items (user_id, category_id, sub_category_id, title, place, done, completed_date, created_at,
+                        due_at, reminded_at, search_terms) FROM STDIN WITH (FORMAT csv)
+        """, buffer)
+
+    def pool_stats(self):
+        stats = self.pool.stats()
+        return {"open": stats["in_use"] + stats["idle"], "in_use": stats["in_use"], "idle": stats["idle"]}
+
+    def _lock_schema(self, c):
+        # Serializes concurrent init_db() calls from several workers.
+        c.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
 
     def get_category_id(self, user_id, name):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("SELECT id FROM categories WHERE user_id=%s AND name=%s", (user_id, name))
-        row = c.fetchone()
-        if row:
-            cid = row[0]
-        else:
-            c.execute("INSERT INTO categories (user_id, name) VALUES (%s, %s) RETURNING id", (user_id, name))
-            cid = c.fetchone()[0]
-            conn.commit()
-        conn.close()
-        return cid
+        key = (user_id, name)
+        cid = self.category_cache.get(key)
+        if cid is not None:
+            return cid
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("SELECT id FROM categories WHERE user_id=%s AND name=%s", key)
+            row = c.fetchone()
+            if not row:
+                # A concurrent first insert of the same name waits on the unique
+                # index and then returns the winner's id instead of a duplicate.
+                c.execute("""
+                    INSERT INTO categories (user_id, name) VALUES (%s, %s)
+                    ON CONFLICT (user_id, name) DO UPDATE SET name=EXCLUDED.name RETURNING id
+                """, key)
+                row = c.fetchone()
+            self._remember(self.category_cache, key, row[0])
+            return row[0]
 
     def get_sub_category_id(self, category_id, name):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("SELECT id FROM sub_categories WHERE category_id=%s AND name=%s", (category_id, name))
-        row = c.fetchone()
-        if row:
-            sid = row[0]
-        else:
-            c.execute("INSERT INTO sub_categories (category_id, name) VALUES (%s, %s) RETURNING id", (category_id, name))
-            sid = c.fetchone()[0]
-            conn.commit()
-        conn.close()
-        return sid
+        key = (category_id, name)
+        sid = self.sub_category_cache.get(key)
+        if sid is not None:
+            return sid
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("SELECT id FROM sub_categories WHERE category_id=%s AND name=%s", key)
+            row = c.fetchone()
+            if not row:
+                # Checking the category first keeps a pruned, cached category ID
+                # from failing the foreign key and aborting the transaction.
+                c.execute("""
+                    INSERT INTO sub_categories (category_id, name)
+                    SELECT %s, %s WHERE EXISTS (SELECT 1 FROM categories WHERE id = %s FOR KEY SHARE)
+                    ON CONFLICT (category_id, name) DO UPDATE SET name=EXCLUDED.name RETURNING id
+                """, (*key, category_id))
+                row = c.fetchone()
+                if not row:
+                    return None
+            self._remember(self.sub_category_cache, key, row[0])
+            return row[0]
 
-    def add_item(self, user_id, category, sub_category, title, desc="", done=0, place=None):
-        cid = self.get_category_id(user_id, category)
-        sid = self.get_sub_category_id(cid, sub_category)
-        completed_date = datetime.now().isoformat() if done else None
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO items (user_id, category_id, sub_category_id, title, desc, place, done, completed_date)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (user_id, cid, sid, title, desc, place, done, completed_date))
-        conn.commit()
-        conn.close()
+    def add_item(self, user_id, category, sub_category, title, desc="", done=0, place=None, due_at=None):
+        with self._transaction(write=True) as conn:
+            self._touch(user_id)
+            completed_date = int(time.time()) if done else None
+            c = conn.cursor()
+            for stale in (False, True):
+                cid, sid = self._category_pair(user_id, category, sub_category, stale)
+                # Inserts nothing if a cached ID was pruned; the lock keeps a
+                # concurrent prune from deleting the rows before this commits.
+                c.execute("""
+                    INSERT INTO items (user_id, category_id, sub_category_id, title, "desc", place, done, completed_date,
+                                       search_terms, due_at)
+                    SELECT %s, %s, %s, %s, %s, %s, %s, to_timestamp(%s), %s, to_timestamp(%s)
+                    WHERE EXISTS (SELECT 1 FROM sub_categories s JOIN categories c ON c.id = s.category_id
+                                  WHERE s.id = %s AND c.id = %s FOR KEY SHARE)
+                """, (user_id, cid, sid, title, desc, place, done, completed_date, index_terms(title, place), due_at,
+                      sid, cid))
+                if c.rowcount:
+                    break
 
-    def delete_item(self, user_id, item_ids):
-        conn = self._connect()
-        c = conn.cursor()
-        deleted_count = 0
-        for item_id in item_ids:
-            c.execute("SELECT id FROM items WHERE id=%s AND user_id=%s", (item_id, user_id))
-            if c.fetchone():
-                c.execute("DELETE FROM items WHERE id=%s", (item_id,))
-                deleted_count += 1
-        conn.commit()
-        conn.close()
-        return deleted_count
+    def add_items(self, user_id, category, sub_category, titles, place=None):
+        """Inserts several items into one sub-category in a single transaction and returns their IDs."""
+        titles = [t for t in titles if t]
+        if not titles:
+            return []
+        with self._transaction(write=True) as conn:
+            self._touch(user_id)
+            c = conn.cursor()
+            for stale in (False, True):
+                cid, sid = self._category_pair(user_id, category, sub_category, stale)
+                if sid is not None and self._pair_exists(c, cid, sid):
+                    break
+            rows = psycopg2.extras.execute_values(c, """
+                INSERT INTO items (user_id, category_id, sub_category_id, title, "desc", place, done, completed_date,
+                                   search_terms)
+                VALUES %s RETURNING id
+            """, [(user_id, cid, sid, title, '', place, 0, None, index_terms(title, place)) for title in titles],
+                fetch=True)
+            return [row[0] for row in rows]
 
-    def mark_item_as_done(self, user_id, item_ids):
-        conn = self._connect()
-        c = conn.cursor()
-        updated_count = 0
-        for item_id in item_ids:
-            c.execute("SELECT id FROM items WHERE id=%s AND user_id=%s", (item_id, user_id))
-            if c.fetchone():
-                c.execute("UPDATE items SET done=1, completed_date=%s WHERE id=%s", (datetime.now().isoformat(), item_id))
-                updated_count += 1
-        conn.commit()
-        conn.close()
-        return updated_count
+    def _update_owned_items(self, statement, params, user_id, item_ids, return_items):
+        ids = sorted(set(item_ids))
+        with self._transaction(write=True) as conn:
+            self._touch(user_id)
+            c = conn.cursor()
+            query = f"{statement} WHERE user_id=%s AND id = ANY(%s)"
+            if return_items:
+                c.execute(query + " RETURNING id, title", [*params, user_id, ids])
+                return sorted(c.fetchall())
+            c.execute(query, [*params, user_id, ids])
+            return c.rowcount
+
+    def delete_item(self, user_id, item_ids, return_items=False):
+        """Deletes the user's items among `item_ids`.
+
+        Returns the number of deleted items, or a list of (id, title) when
+        `return_items` is set.
+        """
+        return self._update_owned_items("DELETE FROM items", [], user_id, item_ids, return_items)
+
+    def mark_item_as_done(self, user_id, item_ids, return_items=False):
+        """Marks the user's items among `item_ids` as done; returns like `delete_item`."""
+        return self._update_owned_items("UPDATE items SET done=1, completed_date=to_timestamp(%s)",
+                                        [int(time.time())], user_id, item_ids, return_items)
 
     def get_item(self, user_id, item_id):
-        conn = self._connect()
-        c = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        c.execute("""
-            SELECT i.id, i.title, i.place, c.name as category_name, sc.name as sub_category_name
-            FROM items i JOIN categories c ON i.category_id = c.id JOIN sub_categories sc ON i.sub_category_id = sc.id
-            WHERE i.id=%s AND i.user_id=%s
-        """, (item_id, user_id))
-        item = c.fetchone()
-        conn.close()
-        return item
+        with self._transaction() as conn:
+            c = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+            c.execute("""
+                SELECT i.id, i.title, i.place, c.name as category_name, sc.name as sub_category_name
+                FROM items i JOIN categories c ON i.category_id = c.id JOIN sub_categories sc ON i.sub_category_id = sc.id
+                WHERE i.id=%s AND i.user_id=%s
+            """, (item_id, user_id))
+            return c.fetchone()
 
     def edit_item(self, user_id, item_id, field, value):
         if field not in ['title', 'place']: return False
-        conn = self._connect()
-        c = conn.cursor()
-        query = f"UPDATE items SET {field}=%s WHERE id=%s AND user_id=%s"
-        c.execute(query, (value, item_id, user_id))
-        updated_rows = c.rowcount
-        conn.commit()
-        conn.close()
-        return updated_rows > 0
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            query = f"UPDATE items SET {field}=%s WHERE id=%s AND user_id=%s RETURNING title, place"
+            c.execute(query, (value, item_id, user_id))
+            row = c.fetchone()
+            if row is None:
+                return False
+            c.execute("UPDATE items SET search_terms=%s WHERE id=%s", (index_terms(*row), item_id))
+            self._touch(user_id)
+            return True
 
-    def list_items(self, user_id, category=None):
-        conn = self._connect()
-        c = conn.cursor()
-        query = """
-            SELECT i.id, i.title, i.desc, i.done, i.place, i.completed_date, c.name, sc.name
-            FROM items i JOIN categories c ON i.category_id = c.id JOIN sub_categories sc ON i.sub_category_id = sc.id
-            WHERE i.user_id=%s
+    def list_items(self, user_id, category=None, after=None, limit=None, done=None, completed_since=None):
+        """Lists a user's items ordered by (category name, id).
+
+        `after` is the (category name, id) of the last row already seen, so a
+        page continues right after it; `done` keeps only finished (True) or
+        unfinished (False) items, and `completed_since` (epoch seconds) only
+        items finished at or after that time. completed_date and due_at are
+        returned as epoch seconds.
         """
-        params = [user_id]
-        if category:
-            query += " AND c.name=%s"
-            params.append(category)
-        query += " ORDER BY c.name, i.id"
-        c.execute(query, params)
-        rows = c.fetchall()
-        conn.close()
-        return rows
+        with self._transaction() as conn:
+            c = conn.cursor()
+            query = """
+                SELECT i.id, i.title, i."desc", i.done, i.place, EXTRACT(EPOCH FROM i.completed_date)::bigint,
+                       c.name, sc.name, EXTRACT(EPOCH FROM i.due_at)::bigint
+                FROM items i JOIN categories c ON i.category_id = c.id JOIN sub_categories sc ON i.sub_category_id = sc.id
+                WHERE i.user_id=%s
+            """
+            params = [user_id]
+            if category:
+                query += " AND c.name=%s"
+                params.append(category)
+            if done is not None:
+                query += " AND i.done=%s"
+                params.append(1 if done else 0)
+            if completed_since is not None:
+                query += " AND i.completed_date >= to_timestamp(%s)"
+                params.append(completed_since)
+            if after:
+                query += " AND (c.name > %s OR (c.name = %s AND i.id > %s))"
+                params.extend([after[0], after[0], after[1]])
+            query += " ORDER BY c.name, i.id"
+            if limit:
+                query += " LIMIT %s"
+                params.append(limit)
+            c.execute(query, params)
+            return c.fetchall()
+
+    def search_items(self, user_id, text, limit=SEARCH_LIMIT):
+        """Returns the user's items matching every term of `text`, best match first.
+
+        Rows have the same columns as `list_items`.
+        """
+        terms = query_terms(text)
+        if not terms:
+            return []
+        # Terms only contain letters and digits, so they can be quoted as-is.
+        query = " & ".join(f"'{term}'" + (":*" if prefix else "") for term, prefix in terms)
+        with self._transaction() as conn:
+            c = conn.cursor()
+            c.execute("""
+                SELECT i.id, i.title, i."desc", i.done, i.place, EXTRACT(EPOCH FROM i.completed_date)::bigint,
+                       c.name, sc.name, EXTRACT(EPOCH FROM i.due_at)::bigint
+                FROM (SELECT id, search_vector FROM items WHERE user_id=%s AND search_vector @@ %s::tsquery
+                      ORDER BY id DESC LIMIT %s) f
+                JOIN items i ON i.id = f.id
+                JOIN categories c ON i.category_id = c.id JOIN sub_categories sc ON i.sub_category_id = sc.id
+                ORDER BY ts_rank(f.search_vector, %s::tsquery) DESC, i.id DESC LIMIT %s
+            """, (user_id, query, SEARCH_CANDIDATES, query, limit))
+            return c.fetchall()
+
+    def archive_done_items(self, before, limit):
+        """Moves up to `limit` items completed before `before` into items_archive; returns {user_id: count}."""
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            # SKIP LOCKED lets archivers in several processes work side by side.
+            c.execute("""
+                WITH moved AS (
+                    DELETE FROM items WHERE id IN (
+                        SELECT id FROM items WHERE done=1 AND completed_date < to_timestamp(%s)
+                        ORDER BY completed_date LIMIT %s FOR UPDATE SKIP LOCKED)
+                    RETURNING id, user_id, category_id, sub_category_id, title, "desc", place, completed_date
+                ), archived AS (
+                    INSERT INTO items_archive
+                        (id, user_id, category, sub_category, title, "desc", place, completed_date, archived_at)
+                    SELECT m.id, m.user_id, c.name, sc.name, m.title, m."desc", m.place, m.completed_date, %s
+                    FROM moved m JOIN categories c ON m.category_id = c.id
+                    JOIN sub_categories sc ON m.sub_category_id = sc.id
+                    ON CONFLICT (id) DO NOTHING
+                )
+                SELECT user_id, COUNT(*) FROM moved GROUP BY user_id
+            """, (before, limit, time.time()))
+            moved = dict(c.fetchall())
+            for user_id in moved:
+                self._touch(user_id)
+            return moved
+
+    def prune_orphan_categories(self, user_ids):
+        """Deletes the users' sub-categories and categories no item refers to; returns how many rows were removed."""
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            # SKIP LOCKED leaves rows that a writer has just checked (LOCK_ROWS) for a later run.
+            c.execute("""
+                DELETE FROM sub_categories WHERE id IN (
+                    SELECT s.id FROM sub_categories s JOIN categories c ON c.id = s.category_id
+                    WHERE c.user_id = ANY(%s) AND NOT EXISTS (SELECT 1 FROM items i WHERE i.sub_category_id = s.id)
+                    FOR UPDATE OF s SKIP LOCKED)
+                RETURNING category_id
+            """, (sorted(set(user_ids)),))
+            sub_parents = {row[0] for row in c.fetchall()}
+            c.execute("""
+                DELETE FROM categories WHERE id IN (
+                    SELECT c.id FROM categories c
+                    WHERE c.user_id = ANY(%s) AND NOT EXISTS (SELECT 1 FROM items i WHERE i.category_id = c.id)
+                    AND NOT EXISTS (SELECT 1 FROM sub_categories s WHERE s.category_id = c.id)
+                    FOR UPDATE SKIP LOCKED)
+                RETURNING id, user_id
+            """, (sorted(set(user_ids)),))
+            categories = c.fetchall()
+        self._forget_pruned(sub_parents, categories)
+        return len(sub_parents) + len(categories)
+
+    def compact(self):
+        """Refreshes planner statistics; autovacuum reclaims the space. Returns False (never vacuums)."""
+        with self._transaction() as conn:
+            c = conn.cursor()
+            for table in ("items", "items_archive", "categories", "sub_categories"):
+                c.execute(f"ANALYZE {table}")
+        return False
+
+    def list_archived_items(self, user_id, after=None, limit=None):
+        """Lists a user's archived items, most recently completed first.
+
+        Rows are (id, title, place, completed_date, category, sub_category);
+        `after` is the (completed_date, id) of the last row already seen.
+        """
+        with self._transaction() as conn:
+            c = conn.cursor()
+            query = """
+                SELECT id, title, place, EXTRACT(EPOCH FROM completed_date)::bigint, category, sub_category
+                FROM items_archive WHERE user_id=%s
+            """
+            params = [user_id]
+            if after:
+                query += " AND (completed_date, id) < (to_timestamp(%s), %s)"
+                params.extend([after[0], after[1]])
+            query += " ORDER BY completed_date DESC, id DESC"
+            if limit:
+                query += " LIMIT %s"
+                params.append(limit)
+            c.execute(query, params)
+            return c.fetchall()
+
+    def pending_reminders(self, until, limit):
+        """Returns (id, due_at) of reminders not yet sent that are due by `until`, earliest first."""
+        with self._transaction() as conn:
+            c = conn.cursor()
+            c.execute(f"""
+                SELECT id, EXTRACT(EPOCH FROM due_at)::bigint FROM items
+                WHERE {PENDING_REMINDER} AND due_at <= to_timestamp(%s) ORDER BY due_at LIMIT %s
+            """, (until, limit))
+            return c.fetchall()
+
+    def claim_reminders(self, item_ids, now):
+        """Marks the due, unfinished items among `item_ids` as reminded and returns them.
+
+        Rows are (id, user_id, title, place, due_at), earliest first. Each item
+        is returned only once, however many schedulers race for it.
+        """
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute(f"""
+                UPDATE items SET reminded_at=to_timestamp(%s)
+                WHERE {PENDING_REMINDER} AND due_at <= to_timestamp(%s) AND id = ANY(%s)
+                RETURNING id, user_id, title, place, EXTRACT(EPOCH FROM due_at)::bigint
+            """, (now, now, sorted(set(item_ids))))
+            return sorted(c.fetchall(), key=lambda row: (row[4], row[0]))
+
+    def acquire_lease(self, name, owner, ttl, now):
+        """Takes or renews the named lease until `now + ttl`; returns True if `owner` holds it."""
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("""
+                INSERT INTO leases (name, owner, expires_at) VALUES (%s, %s, %s)
+                ON CONFLICT (name) DO UPDATE SET owner=EXCLUDED.owner, expires_at=EXCLUDED.expires_at
+                WHERE leases.owner=EXCLUDED.owner OR leases.expires_at < %s
+            """, (name, owner, now + ttl, now))
+            c.execute("SELECT owner FROM leases WHERE name=%s", (name,))
+            return c.fetchone()[0] == owner
+
+    def release_lease(self, name, owner):
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM leases WHERE name=%s AND owner=%s", (name, owner))
+
+    def get_state(self, user_id, now):
+        with self._transaction() as conn:
+            c = conn.cursor()
+            c.execute("SELECT state FROM conversation_states WHERE user_id=%s AND expires_at > %s", (user_id, now))
+            row = c.fetchone()
+            return row[0] if row else None
+
+    def set_state(self, user_id, state, expires_at):
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("""
+                INSERT INTO conversation_states (user_id, state, expires_at) VALUES (%s, %s, %s)
+                ON CONFLICT (user_id) DO UPDATE SET state=EXCLUDED.state, expires_at=EXCLUDED.expires_at
+            """, (user_id, state, expires_at))
+
+    def delete_state(self, user_id):
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM conversation_states WHERE user_id=%s", (user_id,))
+
+    def purge_expired_states(self, now):
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM conversation_states WHERE expires_at <= %s", (now,))
+            return c.rowcount
+
+    def count_states(self, now):
+        with self._transaction() as conn:
+            c = conn.cursor()
+            c.execute("SELECT COUNT(*) FROM conversation_states WHERE expires_at > %s", (now,))
+            return c.fetchone()[0]
+
+    def claim_webhook_event(self, event_id, now):
+        """Records a webhook event ID; returns False if it was already recorded."""
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("INSERT INTO webhook_events (event_id, received_at) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                      (event_id, now))
+            return c.rowcount > 0
+
+    def forget_webhook_event(self, event_id):
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM webhook_events WHERE event_id=%s", (event_id,))
+
+    def purge_webhook_events(self, before):
+        with self._transaction(write=True) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM webhook_events WHERE received_at < %s", (before,))
+            return c.rowcount
 
 
 # --- DB Manager ---
-# This will decide which database engine to use based on environment variables.
-if os.getenv("DATABASE_URL"):
-    db_engine = PostgresEngine()
-else:
-    db_engine = SqliteEngine()
+# The engine is built on first use rather than at import, so importing this
+# module loads no driver and opens no connection. DATABASE_URL selects
+# PostgreSQL, otherwise the local SQLite file is used.
+def shard_files(count, db_file="todo.db"):
+    """Returns the SQLite files of a `count`-shard layout; a single shard is db_file itself."""
+    if count <= 1:
+        return [db_file]
+    root, ext = os.path.splitext(db_file)
+    return [f"{root}-{n}{ext}" for n in range(count)]
+
+
+def shard_index(key, count):
+    """Maps a user_id (or other row key) to its shard; stable across processes and restarts."""
+    return zlib.crc32(str(key).encode()) % count
+
+
+def state_owner(key):
+    """Returns the user_id in a conversation state key: "list-cursor:U123" -> "U123"."""
+    return str(key).rpartition(":")[2]
+
+
+def _by_key(name):
+    # Forwards a call whose first argument is the row key to that key's shard.
+    def call(self, key, *args, **kwargs):
+        return getattr(self._shard(key), name)(key, *args, **kwargs)
+    call.__name__ = name
+    return call
+
+
+def _by_state_key(name):
+    # Like _by_key, but keys such as "list-cursor:{user_id}" go to their user's shard.
+    def call(self, key, *args, **kwargs):
+        return getattr(self._shard(state_owner(key)), name)(key, *args, **kwargs)
+    call.__name__ = name
+    return call
+
+
+class ShardedSqliteEngine:
+    """Spreads users over several SQLite files, each with its own write lock.
+
+    Each user's categories, items, archive and conversation state live in
+    the shard picked by shard_index(user_id), so per-user calls go to one
+    SqliteEngine (state keys such as "list-cursor:{user_id}" are routed by
+    state_owner()) and writers for different shards never wait on each other.
+    Webhook events are sharded by event ID and the leases table lives in
+    shard 0. Calls that span users (archiving, reminders, purges) visit every
+    shard. IDs are only unique within a shard: reminder keys are therefore
+    (shard, id) pairs, and get_sub_category_id() needs the owner's user_id.
+
+    A unit of work opens a transaction only in the shards it touches and
+    commits them one after another, so it is atomic per shard, i.e. per user.
+    reshard.py moves the data when the number of shards changes.
+    """
+
+    NAME = "sqlite-sharded"
+    PARAM = "?"
+
+    def __init__(self, shards=None, db_file="todo.db", idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                 cache_size=CATEGORY_CACHE_SIZE):
+        count = shards or int(os.getenv("SQLITE_SHARDS", 1))
+        self.shards = [SqliteEngine(path, idle_timeout, max(1, cache_size // count), announce=False)
+                       for path in shard_files(count, db_file)]
+        self._local = threading.local()
+        print(f"Using SQLite database split into {count} shards for local development.")
+
+    def _shard(self, key):
+        shard = self.shards[shard_index(key, len(self.shards))]
+        uow = getattr(self._local, "uow", None)
+        if uow is not None and shard not in self._local.open:
+            # Joins the unit of work, and any savepoints opened since it began.
+            self._local.open.append(shard)
+            uow.enter_context(shard.unit_of_work())
+            for stack in self._local.savepoints:
+                stack.enter_context(shard.savepoint())
+        return shard
+
+    def _peek(self, key):
+        return self.shards[shard_index(key, len(self.shards))]
+
+    @property
+    def commits(self):
+        return sum(shard.commits for shard in self.shards)
+
+    @contextmanager
+    def unit_of_work(self):
+        if getattr(self._local, "uow", None) is not None:
+            yield
+            return
+        stack = ExitStack()
+        self._local.uow, self._local.open, self._local.savepoints, self._local.after_commit = stack, [], [], []
+        try:
+            with stack:
+                yield
+            callbacks = self._local.after_commit
+        finally:
+            self._local.uow, self._local.open, self._local.savepoints, self._local.after_commit = None, [], [], []
+        for callback in callbacks:
+            callback()
+
+    @contextmanager
+    def savepoint(self):
+        if getattr(self._local, "uow", None) is None:
+            yield
+            return
+        after_commit = len(self._local.after_commit)
+        with ExitStack() as stack:
+            for shard in self._local.open:
+                stack.enter_context(shard.savepoint())
+            self._local.savepoints.append(stack)
+            try:
+                yield
+            except BaseException:
+                del self._local.after_commit[after_commit:]
+                raise
+            finally:
+                self._local.savepoints.pop()
+
+    def after_commit(self, callback):
+        if getattr(self._local, "uow", None) is None:
+            callback()
+        else:
+            self._local.after_commit.append(callback)
+
+    def has_uncommitted_changes(self, user_id):
+        return self._peek(user_id).has_uncommitted_changes(user_id)
+
+    def list_version(self, user_id):
+        return self._peek(user_id).list_version(user_id)
+
+    def invalidate_categories(self, user_id, category_ids=()):
+        self._peek(user_id).invalidate_categories(user_id, category_ids)
+
+    def schema_version(self):
+        return min(shard.schema_version() for shard in self.shards)
+
+    def init_db(self):
+        applied = [shard.init_db() for shard in self.shards]
+        return any(applied)
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    def pool_stats(self):
+        stats = [shard.pool_stats() for shard in self.shards]
+        return {key: sum(s[key] for s in stats) for key in stats[0]}
+
+    def cache_stats(self):
+        stats = [shard.cache_stats() for shard in self.shards]
+        return {cache: {key: sum(s[cache][key] for s in stats) for key in stats[0][cache]} for cache in stats[0]}
+
+    get_category_id = _by_key("get_category_id")
+    add_item = _by_key("add_item")
+    add_items = _by_key("add_items")
+    delete_item = _by_key("delete_item")
+    mark_item_as_done = _by_key("mark_item_as_done")
+    get_item = _by_key("get_item")
+    edit_item = _by_key("edit_item")
+    list_items = _by_key("list_items")
+    search_items = _by_key("search_items")
+    list_archived_items = _by_key("list_archived_items")
+    import_items = _by_key("import_items")
+    get_state = _by_state_key("get_state")
+    set_state = _by_state_key("set_state")
+    delete_state = _by_state_key("delete_state")
+    claim_webhook_event = _by_key("claim_webhook_event")
+    forget_webhook_event = _by_key("forget_webhook_event")
+
+    def get_sub_category_id(self, category_id, name, user_id=None):
+        if user_id is None:
+            raise ValueError("category IDs are per shard; pass the owner's user_id")
+        return self._shard(user_id).get_sub_category_id(category_id, name)
+
+    def export_items(self, user_id, batch_size=EXPORT_FETCH_SIZE):
+        return self._peek(user_id).export_items(user_id, batch_size)
+
+    def archive_done_items(self, before, limit):
+        moved = {}
+        for shard in self.shards:
+            count = sum(moved.values())
+            if count >= limit:
+                break
+            moved.update(shard.archive_done_items(before, limit - count))
+        return moved
+
+    def prune_orphan_categories(self, user_ids):
+        by_shard = {}
+        for user_id in user_ids:
+            by_shard.setdefault(self._peek(user_id), []).append(user_id)
+        return sum(shard.prune_orphan_categories(users) for shard, users in by_shard.items())
+
+    def compact(self):
+        vacuumed = [shard.compact() for shard in self.shards]
+        return any(vacuumed)
+
+    def pending_reminders(self, until, limit):
+        """Returns ((shard, id), due_at) of the earliest `limit` pending reminders across shards."""
+        rows = [((n, item_id), due_at) for n, shard in enumerate(self.shards)
+                for item_id, due_at in shard.pending_reminders(until, limit)]
+        return sorted(rows, key=lambda row: row[1])[:limit]
+
+    def claim_reminders(self, item_ids, now):
+        by_shard = {}
+        for n, item_id in item_ids:
+            by_shard.setdefault(n, []).append(item_id)
+        claimed = [row for n, ids in by_shard.items() for row in self.shards[n].claim_reminders(ids, now)]
+        return sorted(claimed, key=lambda row: (row[4], row[0]))
+
+    def acquire_lease(self, name, owner, ttl, now):
+        return self.shards[0].acquire_lease(name, owner, ttl, now)
+
+    def release_lease(self, name, owner):
+        self.shards[0].release_lease(name, owner)
+
+    def purge_expired_states(self, now):
+        return sum(shard.purge_expired_states(now) for shard in self.shards)
+
+    def count_states(self, now):
+        return sum(shard.count_states(now) for shard in self.shards)
+
+    def purge_webhook_events(self, before):
+        return sum(shard.purge_webhook_events(before) for shard in self.shards)
+
+
+ENGINES = {"sqlite": SqliteEngine, "sqlite-sharded": ShardedSqliteEngine, "postgres": PostgresEngine}
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def engine_name():
+    if os.getenv("DATABASE_URL"):
+        return "postgres"
+    # SQLITE_SHARDS > 1 splits users over that many files; see reshard.py to change it.
+    return "sqlite-sharded" if int(os.getenv("SQLITE_SHARDS", 1)) > 1 else "sqlite"
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = ENGINES[engine_name()]()
+    return _engine
+
 
 # --- Public API ---
-# Expose the engine's methods to the rest of the application.
-init_db = db_engine.init_db
-get_category_id = db_engine.get_category_id
-get_sub_category_id = db_engine.get_sub_category_id
-add_item = db_engine.add_item
-delete_item = db_engine.delete_item
-mark_item_as_done = db_engine.mark_item_as_done
-get_item = db_engine.get_item
-edit_item = db_engine.edit_item
-list_items = db_engine.list_items
+# Expose the engine's methods to the rest of the application. Each call is
+# timed per engine and function for the /metrics endpoint.
+def _public(name, method=None):
+    method = method or name
+
+    def call(*args, **kwargs):
+        # The first call builds the engine and replaces this module attribute
+        # with the instrumented bound method, so later `db.<name>` calls go
+        # straight to the engine.
+        engine = get_engine()
+        bound = instrument(getattr(engine, method), engine.NAME, method)
+        globals()[name] = bound
+        return bound(*args, **kwargs)
+    call.__name__ = name
+    return call
+
+
+def init_db():
+    return get_engine().init_db()
+
+
+def close_db():
+    if _engine is not None:
+        _engine.close()
+
+
+def invalidate_categories(user_id, category_ids=()):
+    get_engine().invalidate_categories(user_id, category_ids)
+
+
+def cache_stats():
+    return get_engine().cache_stats()
+
+
+def list_version(user_id):
+    return get_engine().list_version(user_id)
+
+
+def unit_of_work():
+    return get_engine().unit_of_work()
+
+
+def savepoint():
+    return get_engine().savepoint()
+
+
+def after_commit(callback):
+    get_engine().after_commit(callback)
+
+
+def has_uncommitted_changes(user_id):
+    return get_engine().has_uncommitted_changes(user_id)
+
+
+def pool_stats():
+    return get_engine().pool_stats()
+
+
+def commit_count():
+    return get_engine().commits
+
+
+def export_items(user_id, batch_size=EXPORT_FETCH_SIZE):
+    return get_engine().export_items(user_id, batch_size)
+
+
+get_category_id = _public("get_category_id")
+get_sub_category_id = _public("get_sub_category_id")
+add_item = _public("add_item")
+add_items = _public("add_items")
+delete_item = _public("delete_item")
+mark_item_as_done = _public("mark_item_as_done")
+get_item = _public("get_item")
+edit_item = _public("edit_item")
+list_items = _public("list_items")
+search_items = _public("search_items")
+archive_done_items = _public("archive_done_items")
+prune_orphan_categories = _public("prune_orphan_categories")
+compact_db = _public("compact_db", "compact")
+list_archived_items = _public("list_archived_items")
+get_state = _public("get_state")
+set_state = _public("set_state")
+delete_state = _public("delete_state")
+purge_expired_states = _public("purge_expired_states")
+count_states = _public("count_states")
+claim_webhook_event = _public("claim_webhook_event")
+forget_webhook_event = _public("forget_webhook_event")
+purge_webhook_events = _public("purge_webhook_events")
+pending_reminders = _public("pending_reminders")
+claim_reminders = _public("claim_reminders")
+acquire_lease = _public("acquire_lease")
+release_lease = _public("release_lease")
+import_items = _public("import_items")
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+
+import aiohttp
+import urllib3
+from linebot.v3.messaging import (ApiClient, ApiException, AsyncApiClient, AsyncMessagingApi, Configuration,
+                                  MessagingApi)
+from linebot.v3.messaging.models import PushMessageRequest, ReplyMessageRequest, TextMessage as V3TextMessage
+
+# HTTP statuses worth retrying: rate limiting and LINE-side errors.
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+
+
+class _SenderStats:
+    """Call counters and latency reporting shared by the sync and async senders."""
+
+    def __init__(self, retries, backoff, logger):
+        self.retries = retries
+        self.backoff = backoff
+        self.logger = logger or logging.getLogger(__name__)
+        self.on_latency = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.retried = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors, "retries": self.retried,
+                    "total_seconds": self.total_seconds, "max_seconds": self.max_seconds}
+
+    @staticmethod
+    def _to_messages(messages):
+        return [V3TextMessage(type="text", text=m) if isinstance(m, str) else m for m in messages]
+
+    @staticmethod
+    def _classify(e):
+        """Returns (transient, description) for an exception raised by an API call."""
+        if isinstance(e, ApiException):
+            return e.status in TRANSIENT_STATUSES, f"{e.status} {e.reason}"
+        if isinstance(e, (urllib3.exceptions.HTTPError, aiohttp.ClientError, asyncio.TimeoutError, OSError)):
+            return True, str(e) or type(e).__name__
+        return False, str(e)
+
+    def _failed(self, name, e, attempt):
+        """Logs a failed attempt; returns True if the call should be retried."""
+        transient, error = self._classify(e)
+        if not transient or attempt == self.retries:
+            self.logger.error("LINE %s failed: %s", name, error)
+            return False
+        with self._lock:
+            self.retried += 1
+        return True
+
+    def _record(self, name, seconds, ok):
+        with self._lock:
+            self.calls += 1
+            self.errors += 0 if ok else 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+        if self.on_latency:
+            self.on_latency(name, seconds, ok)
+
+
+class ReplySender(_SenderStats):
+    """Sends replies through one long-lived LINE MessagingApi client.
+
+    Create it once at startup and share it between threads: the underlying
+    urllib3 pool keeps connections to the API host alive, so consecutive
+    replies skip the TCP/TLS handshake. `host` points the client somewhere
+    other than https://api.line.me, such as a local stub during tests.
+    """
+
+    def __init__(self, access_token, host=None, pool_maxsize=10, retries=2, backoff=0.2, logger=None):
+        super().__init__(retries, backoff, logger)
+        configuration = Configuration(access_token=access_token, host=host)
+        configuration.connection_pool_maxsize = pool_maxsize
+        self._api_client = ApiClient(configuration)
+        self._api = MessagingApi(self._api_client)
+
+    def reply(self, reply_token, messages):
+        """Replies with `messages` (strings or SDK message objects); returns True on success."""
+        req = ReplyMessageRequest(reply_token=reply_token, messages=self._to_messages(messages))
+        return self._call("reply", self._api.reply_message, req)
+
+    def push(self, to, messages):
+        """Pushes up to 5 `messages` to a user in one API call; returns True on success.
+
+        Every attempt carries the same X-Line-Retry-Key, so a retry after a
+        lost response cannot deliver the messages twice.
+        """
+        req = PushMessageRequest(to=to, messages=self._to_messages(messages))
+        return self._call("push", self._push_once, req, str(uuid.uuid4()))
+
+    def close(self):
+        self._api_client.close()
+
+    def _push_once(self, req, retry_key):
+        try:
+            self._api.push_message(req, x_line_retry_key=retry_key)
+        except ApiException as e:
+            # 409: an earlier attempt with this retry key was already accepted.
+            if e.status != 409:
+                raise
+
+    def _call(self, name, method, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                method(*args, **kwargs)
+                self._record(name, time.perf_counter() - start, ok=True)
+                return True
+            except Exception as e:
+                self._record(name, time.perf_counter() - start, ok=False)
+                if not self._failed(name, e, attempt):
+                    return False
+            time.sleep(self.backoff * (2 ** attempt))
+        return False
+
+
+class AsyncReplySender(_SenderStats):
+    """The asyncio counterpart of ReplySender, used by asgi.py.
+
+    Replies go through the SDK's aiohttp client, so waiting on the LINE API
+    does not hold a thread. The aiohttp session belongs to the event loop it
+    is created on: construct the sender inside the running loop (at ASGI
+    startup) and `await close()` before the loop ends. `pool_maxsize` caps the
+    number of simultaneous connections to the API host.
+    """
+
+    def __init__(self, access_token, host=None, pool_maxsize=100, retries=2, backoff=0.2, logger=None):
+        super().__init__(retries, backoff, logger)
+        configuration = Configuration(access_token=access_token, host=host)
+        configuration.connection_pool_maxsize = pool_maxsize
+        self._api_client = AsyncApiClient(configuration)
+        self._api = AsyncMessagingApi(self._api_client)
+
+    async def reply(self, reply_token, messages):
+        """Replies with `messages` (strings or SDK message objects); returns True on success."""
+        req = ReplyMessageRequest(reply_token=reply_token, messages=self._to_messages(messages))
+        return await self._call("reply", self._api.reply_message, req)
+
+    async def close(self):
+        await self._api_client.close()
+
+    async def _call(self, name, method, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                await method(*args, **kwargs)
+                self._record(name, time.perf_counter() - start, ok=True)
+                return True
+            except Exception as e:
+                self._record(name, time.perf_counter() - start, ok=False)
+                if not self._failed(name, e, attempt):
+                    return False
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+        return False
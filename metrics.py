@@ -0,0 +1,211 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Minimal Prometheus text-format metrics (no client library needed) and an
+# opt-in profiler for slow requests. Everything registers on `registry`,
+# which app.py serves at /metrics.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), count, total) for key, (counts, count, total) in self._series.items()}
+        for key, (counts, count, total) in sorted(series.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+        return lines
+
+
+class CallbackMetric:
+    """A gauge or counter whose value is read from `fn` at scrape time.
+
+    `fn` returns a number, or a dict mapping label-value tuples to numbers.
+    """
+
+    def __init__(self, name, documentation, fn, labelnames=(), kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            value = self.fn()
+        except Exception:
+            logging.getLogger(__name__).exception("Collecting %s failed", self.name)
+            return lines
+        if isinstance(value, dict):
+            for key, v in sorted(value.items()):
+                key = key if isinstance(key, tuple) else (key,)
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {v}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, documentation, fn, labelnames=()):
+        self._metrics.append(CallbackMetric(name, documentation, fn, labelnames, "gauge"))
+
+    def counter(self, name, documentation, fn, labelnames=()):
+        self._metrics.append(CallbackMetric(name, documentation, fn, labelnames, "counter"))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_latency = registry.histogram(
+    "todo_webhook_request_seconds", "Time spent handling a /callback request.")
+parse_latency = registry.histogram(
+    "todo_webhook_parse_seconds", "Signature verification and parsing of a webhook body.")
+db_latency = registry.histogram(
+    "todo_db_call_seconds", "Latency of public database.py functions.", ["engine", "function"])
+command_latency = registry.histogram(
+    "todo_command_seconds", "Latency of chat commands, by command.", ["command"])
+line_api_latency = registry.histogram(
+    "todo_line_api_seconds", "Latency of LINE Messaging API calls.", ["call", "status"])
+
+
+def instrument(func, engine, name):
+    """Wraps a database function so every call is timed in db_latency."""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            db_latency.observe(time.perf_counter() - start, engine=engine, function=name)
+    wrapper.__name__ = name
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+# --- Slow request profiler ---
+# PROFILE_SAMPLE_RATE: fraction of requests run under cProfile (0 disables);
+# once enabled, `?profile=1` also forces profiling of a single request.
+# Profiles of requests slower than PROFILE_SLOW_MS are logged, or written to
+# PROFILE_DIR as .prof files when it is set.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", 500))
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+
+
+def should_profile(forced=False):
+    if PROFILE_SAMPLE_RATE <= 0:
+        return False
+    return forced or random.random() < PROFILE_SAMPLE_RATE
+
+
+def run_profiled(func, label, logger, *args, **kwargs):
+    """Runs func under cProfile and reports the profile if it was slow."""
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms >= PROFILE_SLOW_MS:
+            if PROFILE_DIR:
+                path = os.path.join(PROFILE_DIR, f"{label}-{int(time.time() * 1000)}.prof")
+                profiler.dump_stats(path)
+                logger.warning("Slow %s took %.0f ms, profile written to %s", label, elapsed_ms, path)
+            else:
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+                logger.warning("Slow %s took %.0f ms:\n%s", label, elapsed_ms, out.getvalue())
+
+
+# --- Startup time ---
+# Time from the start of loading app.py until it finished importing and until
+# the first webhook was answered. A first response slower than
+# COLD_START_TARGET_MS (0 disables the check) is logged as a warning.
+COLD_START_TARGET_MS = float(os.getenv("COLD_START_TARGET_MS", 0))
+
+
+class StartupTimer:
+    def __init__(self, started):
+        self.started = started
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def mark(self, phase, logger):
+        """Records the first time `phase` is reached; later calls do nothing."""
+        if phase in self.phases:
+            return
+        with self._lock:
+            if phase in self.phases:
+                return
+            self.phases[phase] = time.perf_counter() - self.started
+        elapsed_ms = self.phases[phase] * 1000
+        if phase == "first_request" and COLD_START_TARGET_MS and elapsed_ms > COLD_START_TARGET_MS:
+            logger.warning("Startup: %s after %.0f ms, over the %.0f ms target",
+                           phase, elapsed_ms, COLD_START_TARGET_MS)
+        else:
+            logger.info("Startup: %s after %.0f ms", phase, elapsed_ms)
+
+    def collect(self):
+        return dict(self.phases)
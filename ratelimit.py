@@ -0,0 +1,76 @@
+import threading
+import time
+
+# Load shedding for the webhook path: one user (or script) flooding the bot
+# gets a canned reply instead of database work, and a global cap keeps the
+# number of commands running at once bounded.
+
+
+class RateLimiter:
+    """Per-user token buckets plus a global limit on concurrent handlers.
+
+    Each user's bucket holds up to `burst` tokens and refills at `rate` tokens
+    per second; a bucket is only a [tokens, last_refill] pair, and buckets idle
+    long enough to have refilled completely are evicted since a fresh bucket
+    is equivalent. `rate=0` disables the per-user limit.
+    """
+
+    def __init__(self, rate=1.0, burst=10, max_concurrent=32, evict_interval=60):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.evict_interval = evict_interval
+        self.idle_ttl = burst / rate if rate > 0 else 0
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent > 0 else None
+        self._next_eviction = time.monotonic() + evict_interval
+        self.allowed = 0
+        self.shed_rate = 0
+        self.shed_busy = 0
+
+    def allow(self, user_id, cost=1):
+        """Takes `cost` tokens from the user's bucket; returns False if there are not enough."""
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_eviction:
+                self._evict(now)
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = [float(self.burst), now]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < cost:
+                self.shed_rate += 1
+                return False
+            bucket[0] -= cost
+            self.allowed += 1
+            return True
+
+    def acquire(self):
+        """Claims a global handler slot without waiting; pair with release()."""
+        if self._slots is None:
+            return True
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            self.shed_busy += 1
+        return False
+
+    def release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+    def _evict(self, now):
+        self._next_eviction = now + self.evict_interval
+        idle = [user_id for user_id, (_, last) in self._buckets.items() if now - last >= self.idle_ttl]
+        for user_id in idle:
+            del self._buckets[user_id]
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self._buckets), "allowed": self.allowed,
+                    "shed_rate_limited": self.shed_rate, "shed_busy": self.shed_busy}
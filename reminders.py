@@ -0,0 +1,146 @@
+import heapq
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+import database as db
+from timeutil import format_timestamp
+
+# Sends a push message when an item's due_at arrives. Upcoming deadlines are
+# kept in a min-heap, refilled from the partial index on items.due_at that
+# only holds reminders still to be sent, so no query scans the items table.
+# A lease row in the database makes one process the scheduler; the others
+# stand by and take over once its lease expires.
+
+LEASE_NAME = "reminders"
+# LINE accepts at most 5 messages per push request.
+PUSH_MAX_MESSAGES = 5
+
+
+class ReminderScheduler:
+    """Delivers due-date reminders on a background thread.
+
+    Reminders due within the next `lookahead` seconds are loaded into the
+    heap every `refill_interval` seconds, or right away after `notify()`.
+    Everything that is due when the thread wakes up is claimed in one
+    statement and sent grouped by user, up to PUSH_MAX_MESSAGES per push call.
+    The lease is renewed every `lease_ttl / 3` seconds; claiming marks rows as
+    reminded, so a reminder is sent at most once even across restarts and
+    failovers.
+    """
+
+    def __init__(self, sender, lookahead=600, refill_interval=30, lease_ttl=30, batch_size=1000, logger=None):
+        self.sender = sender
+        self.lookahead = lookahead
+        self.refill_interval = refill_interval
+        self.lease_ttl = lease_ttl
+        self.batch_size = batch_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.leader = False
+        self._heap = []
+        self._scheduled = set()
+        self._refill_at = 0.0
+        self._lease_renew_at = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.sent = 0
+        self.failed = 0
+        self.pushes = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def notify(self, due_at=None):
+        """Refills right away if a reminder due at `due_at` was just added inside the lookahead window."""
+        if due_at is None or due_at <= time.time() + self.lookahead:
+            self._refill_at = 0.0
+            self._wake.set()
+
+    def run_once(self, now=None):
+        """Renews the lease, refills the heap and sends what is due; returns seconds until the next wake-up."""
+        now = time.time() if now is None else now
+        if now >= self._lease_renew_at:
+            self._renew_lease(now)
+        if not self.leader:
+            return self._lease_renew_at - now
+        if now >= self._refill_at:
+            self._refill(now)
+        self._fire(now)
+        wake_at = min(self._refill_at, self._lease_renew_at)
+        if self._heap:
+            wake_at = min(wake_at, self._heap[0][0])
+        return max(0.0, wake_at - now)
+
+    def stats(self):
+        return {"leader": self.leader, "scheduled": len(self._heap), "sent": self.sent,
+                "failed": self.failed, "pushes": self.pushes}
+
+    def _renew_lease(self, now):
+        leader = db.acquire_lease(LEASE_NAME, self.owner, self.lease_ttl, now)
+        if leader != self.leader:
+            self.logger.info("Reminder scheduler %s", "acquired the lease" if leader else "lost the lease")
+        if not leader:
+            self._heap, self._scheduled = [], set()
+        self.leader = leader
+        self._lease_renew_at = now + self.lease_ttl / 3
+
+    def _refill(self, now):
+        for item_id, due_at in db.pending_reminders(now + self.lookahead, self.batch_size):
+            if item_id not in self._scheduled:
+                heapq.heappush(self._heap, (due_at, item_id))
+                self._scheduled.add(item_id)
+        self._refill_at = now + self.refill_interval
+
+    def _fire(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, item_id = heapq.heappop(self._heap)
+            self._scheduled.discard(item_id)
+            due.append(item_id)
+        if not due:
+            return
+        # Items finished, deleted or already reminded since they were loaded
+        # are simply not returned.
+        by_user = {}
+        for item_id, user_id, title, place, due_at in db.claim_reminders(due, now):
+            line = f"⏰ 提醒：[{item_id}] {title}" + (f"，地點：{place}" if place else "")
+            by_user.setdefault(user_id, []).append(f"{line}\n到期時間：{format_timestamp(due_at)}")
+        for user_id, messages in by_user.items():
+            for start in range(0, len(messages), PUSH_MAX_MESSAGES):
+                batch = messages[start:start + PUSH_MAX_MESSAGES]
+                self.pushes += 1
+                if self.sender.push(user_id, batch):
+                    self.sent += len(batch)
+                else:
+                    self.failed += len(batch)
+
+    def _run(self):
+        timeout = 0.0
+        while not self._stop.is_set():
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                timeout = self.run_once()
+            except Exception:
+                self.logger.exception("Reminder scheduling failed")
+                timeout = self.refill_interval
+        if self.leader:
+            try:
+                db.release_lease(LEASE_NAME, self.owner)
+            except Exception:
+                self.logger.exception("Releasing the reminder lease failed")
@@ -0,0 +1,203 @@
+"""Moves the SQLite data to a different number of shards (see SQLITE_SHARDS).
+
+Stop the bot first. Every user's rows are copied from the current files
+into new ones picked by shard_index(user_id), then the current files are
+moved to a backup directory and the new ones take their place. Start the
+bot again with SQLITE_SHARDS set to the new count.
+
+    python reshard.py --to 4                 # todo.db -> todo-0.db .. todo-3.db
+    python reshard.py --from 4 --to 8
+    python reshard.py --from 4 --to 1        # back to a single todo.db
+
+Item IDs are kept where they are unique in the new shard. When shards are
+merged, an ID can already be taken by another user's item; those items get
+a new ID and are counted as renumbered. Leases are not copied.
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import database as db
+
+ITEM_COLUMNS = ("user_id, category_id, sub_category_id, title, desc, place, done, completed_date, "
+                "search_terms, created_at, due_at, reminded_at")
+ARCHIVE_COLUMNS = "user_id, category, sub_category, title, desc, place, completed_date, archived_at"
+
+COPY_CATEGORIES = [
+    "INSERT OR IGNORE INTO categories (user_id, name) SELECT user_id, name FROM src.categories WHERE shard_of(user_id) = ?",
+    """INSERT OR IGNORE INTO sub_categories (category_id, name)
+       SELECT tc.id, s.name FROM src.sub_categories s
+       JOIN src.categories c ON c.id = s.category_id
+       JOIN categories tc ON tc.user_id = c.user_id AND tc.name = c.name
+       WHERE shard_of(c.user_id) = ?""",
+]
+# {id} is the source ID on the first pass and NULL (a new ID) on the second.
+# An ID is free if neither table uses it, since archived items keep theirs.
+COPY_ITEMS = f"""INSERT INTO items (id, {ITEM_COLUMNS})
+    SELECT {{id}}, i.user_id, tc.id, ts.id, i.title, i.desc, i.place, i.done, i.completed_date,
+           i.search_terms, i.created_at, i.due_at, i.reminded_at
+    FROM src.items i
+    JOIN src.categories c ON c.id = i.category_id
+    JOIN src.sub_categories s ON s.id = i.sub_category_id
+    JOIN categories tc ON tc.user_id = c.user_id AND tc.name = c.name
+    JOIN sub_categories ts ON ts.category_id = tc.id AND ts.name = s.name
+    WHERE shard_of(i.user_id) = ? AND {{where}}
+    ORDER BY i.id"""
+COPY_ARCHIVE = f"""INSERT INTO items_archive (id, {ARCHIVE_COLUMNS})
+    SELECT {{id}}, a.user_id, a.category, a.sub_category, a.title, a.desc, a.place, a.completed_date, a.archived_at
+    FROM src.items_archive a
+    WHERE shard_of(a.user_id) = ? AND {{where}}"""
+ID_IS_FREE = "NOT EXISTS (SELECT 1 FROM items WHERE id = {t}.id) AND NOT EXISTS (SELECT 1 FROM items_archive WHERE id = {t}.id)"
+NOT_COPIED = "NOT EXISTS (SELECT 1 FROM {table} WHERE id = {t}.id AND user_id = {t}.user_id)"
+# Renumbered items take IDs above both tables; renumbered archive rows follow on from the same counter.
+LAST_ID = """SELECT MAX(COALESCE((SELECT MAX(seq) FROM sqlite_sequence WHERE name = 'items'), 0),
+    COALESCE((SELECT MAX(id) FROM items), 0), COALESCE((SELECT MAX(id) FROM items_archive), 0))"""
+NEXT_ID = "(SELECT seq FROM sqlite_sequence WHERE name = 'items') + ROW_NUMBER() OVER (ORDER BY a.id)"
+COPY_KEYED = [
+    "INSERT INTO conversation_states SELECT * FROM src.conversation_states WHERE state_shard_of(user_id) = ? AND expires_at > ?",
+    "INSERT OR IGNORE INTO webhook_events SELECT * FROM src.webhook_events WHERE shard_of(event_id) = ?",
+]
+TABLES = ["categories", "items", "items_archive", "conversation_states", "webhook_events"]
+
+
+def sidecars(path):
+    return [path + suffix for suffix in ("", "-wal", "-shm") if os.path.exists(path + suffix)]
+
+
+def sync_sequence(conn):
+    # sqlite_sequence has no key on name, so the row is replaced by hand.
+    last_id = conn.execute(LAST_ID).fetchone()[0]
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'items'")
+    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('items', ?)", (last_id,))
+
+
+def copy_into(target, n, count, sources, now):
+    """Fills one new shard from the old ones, one transaction per file and pass; returns (row counts, renumbered rows)."""
+    conn = sqlite3.connect(target, isolation_level=None)
+    conn.create_function("shard_of", 1, lambda key: db.shard_index(key, count), deterministic=True)
+    conn.create_function("state_shard_of", 1, lambda key: db.shard_index(db.state_owner(key), count),
+                         deterministic=True)
+    renumbered = 0
+    try:
+        for pass_ in ("keep", "renumber"):
+            for source in sources:
+                conn.execute("ATTACH DATABASE ? AS src", (source,))
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if pass_ == "keep":
+                        for sql in COPY_CATEGORIES:
+                            conn.execute(sql, (n,))
+                        conn.execute(COPY_ITEMS.format(id="i.id", where=ID_IS_FREE.format(t="i")), (n,))
+                        conn.execute(COPY_ARCHIVE.format(id="a.id", where=ID_IS_FREE.format(t="a")), (n,))
+                        conn.execute(COPY_KEYED[0], (n, now))
+                        conn.execute(COPY_KEYED[1], (n,))
+                    else:
+                        sync_sequence(conn)
+                        renumbered += conn.execute(COPY_ITEMS.format(
+                            id="NULL", where=NOT_COPIED.format(table="items", t="i")), (n,)).rowcount
+                        renumbered += conn.execute(COPY_ARCHIVE.format(
+                            id=NEXT_ID, where=NOT_COPIED.format(table="items_archive", t="a")), (n,)).rowcount
+                        sync_sequence(conn)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                finally:
+                    conn.execute("DETACH DATABASE src")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLES}
+    finally:
+        conn.close()
+    return counts, renumbered
+
+
+def count_rows(paths):
+    totals = dict.fromkeys(TABLES, 0)
+    for path in paths:
+        conn = sqlite3.connect(path)
+        try:
+            for table in TABLES:
+                totals[table] += conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            conn.close()
+    return totals
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--from", dest="from_count", type=int, default=int(os.getenv("SQLITE_SHARDS", 1)),
+                            help="current number of shards (default: SQLITE_SHARDS or 1)")
+    arg_parser.add_argument("--to", dest="to_count", type=int, required=True, help="new number of shards")
+    arg_parser.add_argument("--db-file", default="todo.db", help="database file name the shard names derive from")
+    args = arg_parser.parse_args()
+    if args.from_count < 1 or args.to_count < 1:
+        arg_parser.error("shard counts must be at least 1")
+    if args.from_count == args.to_count:
+        arg_parser.error("--from and --to are the same")
+
+    sources = db.shard_files(args.from_count, args.db_file)
+    missing = [path for path in sources if not os.path.exists(path)]
+    if missing:
+        raise SystemExit(f"Missing shard files for --from {args.from_count}: {', '.join(missing)}")
+    # Shard files outside the --from layout mean the count is wrong or an earlier run was interrupted.
+    root, ext = os.path.splitext(args.db_file)
+    strays = [path for path in glob.glob(f"{glob.escape(root)}-*{ext}") + [args.db_file]
+              if path not in sources and os.path.exists(path)]
+    if strays:
+        raise SystemExit(f"Found shard files outside a {args.from_count}-shard layout; check --from, "
+                         f"or move them away first: {', '.join(strays)}")
+    targets = db.shard_files(args.to_count, args.db_file)
+    directory = os.path.dirname(os.path.abspath(args.db_file))
+
+    # Brings the old files to the current schema so the copy sees the same columns.
+    for path in sources:
+        engine = db.SqliteEngine(path, announce=False)
+        engine.init_db()
+        engine.close()
+    before = count_rows(sources)
+
+    started = time.perf_counter()
+    now = time.time()
+    staging = tempfile.mkdtemp(prefix=".reshard-", dir=directory)
+    staged = [os.path.join(staging, os.path.basename(path)) for path in targets]
+    renumbered = 0
+    try:
+        for n, path in enumerate(staged):
+            engine = db.SqliteEngine(path, announce=False)
+            with contextlib.redirect_stdout(io.StringIO()):
+                engine.init_db()
+            engine.close()
+            counts, moved = copy_into(path, n, args.to_count, sources, now)
+            renumbered += moved
+            print(f"{os.path.basename(targets[n])}: " + ", ".join(f"{table} {count}" for table, count in counts.items()))
+        after = count_rows(staged)
+        # Expired conversation states are dropped rather than copied.
+        lost = {table: before[table] - after[table] for table in ("categories", "items", "items_archive")
+                if before[table] != after[table]}
+        if lost:
+            raise SystemExit(f"Row counts differ after copying, nothing was changed: {lost}")
+
+        backup = tempfile.mkdtemp(prefix=time.strftime("reshard-backup-%Y%m%d-%H%M%S-"), dir=directory)
+        for path in sources:
+            for file in sidecars(path):
+                shutil.move(file, backup)
+        for path, target in zip(staged, targets):
+            for file in sidecars(path):
+                os.replace(file, os.path.join(directory, os.path.basename(target) + file[len(path):]))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    print(f"Resharded {args.from_count} -> {args.to_count} in {time.perf_counter() - started:.2f}s: "
+          f"{after['items']} items, {after['items_archive']} archived, {renumbered} renumbered. "
+          f"Old files are in {backup}.")
+    print(f"Start the bot with SQLITE_SHARDS={args.to_count}.")
+
+
+if __name__ == "__main__":
+    main()
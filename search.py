@@ -0,0 +1,50 @@
+import re
+import unicodedata
+
+# Tokenization for item search. Chinese has no spaces between words, so CJK
+# runs are indexed as single characters plus overlapping character pairs;
+# any two-character query then matches a stored pair and a one-character
+# query matches a single character. Other scripts are indexed word by word.
+# The terms are stored space-separated in items.search_terms, which the
+# database engines index (FTS5 on SQLite, a GIN tsvector on PostgreSQL).
+
+_WORD = re.compile(r"[^\W_]+")
+_CJK_RUN = re.compile(r"([぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]+)")
+
+
+def _segments(text):
+    """Yields (segment, is_cjk) for every word in the normalized text."""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    for word in _WORD.findall(text):
+        for i, segment in enumerate(_CJK_RUN.split(word)):
+            if segment:
+                yield segment, i % 2 == 1
+
+
+def index_terms(*texts):
+    """Returns the space-separated search terms for an item's title and place."""
+    terms = []
+    for text in texts:
+        for segment, is_cjk in _segments(text):
+            if is_cjk:
+                terms.extend(segment)
+                terms.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+            else:
+                terms.append(segment)
+    return " ".join(dict.fromkeys(terms))
+
+
+def query_terms(text):
+    """Returns the (term, is_prefix) pairs an item must all contain to match `text`.
+
+    Latin words match as prefixes so `mil` finds `milk`.
+    """
+    terms = []
+    for segment, is_cjk in _segments(text):
+        if not is_cjk:
+            terms.append((segment, True))
+        elif len(segment) == 1:
+            terms.append((segment, False))
+        else:
+            terms.extend((segment[i:i + 2], False) for i in range(len(segment) - 1))
+    return list(dict.fromkeys(terms))
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import database as db
+
+# Conversation state for multi-step flows (新增 / 編輯), keyed by user_id.
+# Abandoned flows expire after a TTL instead of living forever, and the
+# database backend lets several worker processes share the same state.
+
+
+class StateStore:
+    """Dict-like interface used by app.py; subclasses implement get/set/delete."""
+
+    def __init__(self, ttl, compact_interval):
+        self.ttl = ttl
+        self.compact_interval = compact_interval
+        self._next_compaction = time.time() + compact_interval
+
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, state):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def compact(self):
+        """Removes expired entries and returns how many were dropped."""
+        raise NotImplementedError
+
+    def _maybe_compact(self):
+        now = time.time()
+        if now >= self._next_compaction:
+            self._next_compaction = now + self.compact_interval
+            self.compact()
+
+    def __getitem__(self, key):
+        state = self.get(key)
+        if state is None:
+            raise KeyError(key)
+        return state
+
+    def __setitem__(self, key, state):
+        self.set(key, state)
+
+    def __delitem__(self, key):
+        self.delete(key)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+class MemoryStateStore(StateStore):
+    """Per-process store bounded by both a TTL and an LRU size limit."""
+
+    def __init__(self, ttl=600, maxsize=10000, compact_interval=60):
+        super().__init__(ttl, compact_interval)
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, state = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return state
+
+    def set(self, key, state):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, state)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        self._maybe_compact()
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def compact(self):
+        now = time.time()
+        with self._lock:
+            expired = [k for k, (expires_at, _) in self._data.items() if expires_at <= now]
+            for k in expired:
+                del self._data[k]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DatabaseStateStore(StateStore):
+    """Store backed by the conversation_states table, shared by every process."""
+
+    def __init__(self, ttl=600, compact_interval=300):
+        super().__init__(ttl, compact_interval)
+
+    def get(self, key, default=None):
+        value = db.get_state(key, time.time())
+        return default if value is None else json.loads(value)
+
+    def set(self, key, state):
+        db.set_state(key, json.dumps(state, ensure_ascii=False), time.time() + self.ttl)
+        self._maybe_compact()
+
+    def delete(self, key):
+        db.delete_state(key)
+
+    def compact(self):
+        return db.purge_expired_states(time.time())
+
+    def __len__(self):
+        return db.count_states(time.time())
+
+
+def create_state_store(backend="memory", ttl=600, maxsize=10000):
+    if backend == "database":
+        return DatabaseStateStore(ttl=ttl)
+    if backend == "memory":
+        return MemoryStateStore(ttl=ttl, maxsize=maxsize)
+    raise ValueError(f"Unknown state store backend: {backend}")
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The modules read their settings and open ./todo.db when they are imported,
+# so the environment and working directory are set up before any test imports them.
+os.environ.update({
+    "LINE_CHANNEL_SECRET": "test-secret",
+    "LINE_CHANNEL_ACCESS_TOKEN": "test-token",
+    "DATABASE_URL": "",
+    "SQLITE_SHARDS": "1",
+    "STATE_STORE": "memory",
+    "ARCHIVE_AFTER_DAYS": "0",
+    "REMINDERS_ENABLED": "0",
+    "RATE_LIMIT_PER_SEC": "0",
+    "WEBHOOK_WORKERS": "0",
+    "WEBHOOK_DEDUPE_PERSIST": "0",
+})
+os.chdir(tempfile.mkdtemp(prefix="todo-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    import database as db
+    db.init_db()
+    yield db
+    db.close_db()
@@ -0,0 +1,101 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import app
+import database as db
+
+
+def new_user():
+    return f"U{uuid.uuid4().hex}"
+
+
+def message(user_id, text, event_id=None, redelivery=False):
+    return SimpleNamespace(type="message", source=SimpleNamespace(user_id=user_id),
+                           reply_token=f"reply-{uuid.uuid4().hex}", message=SimpleNamespace(text=text),
+                           webhook_event_id=event_id or uuid.uuid4().hex,
+                           delivery_context=SimpleNamespace(is_redelivery=redelivery))
+
+
+def titles(user_id):
+    return sorted(row[1] for row in db.list_items(user_id))
+
+
+@pytest.fixture
+def failing_command(monkeypatch):
+    # "boom" writes an item and then fails, so its savepoint has something to roll back.
+    dispatch = app.router.dispatch
+
+    def flaky(user_id, text):
+        if text == "boom":
+            db.add_item(user_id, "生活", "購物", "boom")
+            raise RuntimeError("boom")
+        return dispatch(user_id, text)
+    monkeypatch.setattr(app.router, "dispatch", flaky)
+
+
+def test_failing_event_is_rolled_back_and_the_others_are_kept(failing_command):
+    user_id = new_user()
+    events = [message(user_id, "生活 + 購物 + 牛奶"), message(user_id, "boom"), message(user_id, "生活 + 購物 + 雞蛋")]
+    replies = app.run_events(events)
+    assert [token for token, _ in replies] == [event.reply_token for event in events]
+    assert replies[1][1] == [app.EVENT_ERROR_REPLY]
+    assert titles(user_id) == ["牛奶", "雞蛋"]
+
+
+def test_failed_commit_lets_the_redelivery_run(monkeypatch):
+    user_id = new_user()
+    events = [message(user_id, "生活 + 購物 + 牛奶"), message(user_id, "生活 + 購物 + 雞蛋")]
+    unit_of_work = db.unit_of_work
+
+    @contextmanager
+    def failing_commit():
+        with unit_of_work():
+            yield
+            raise RuntimeError("database is locked")
+    monkeypatch.setattr(db, "unit_of_work", failing_commit)
+    with pytest.raises(RuntimeError):
+        app.run_events(events)
+    monkeypatch.undo()
+    assert titles(user_id) == []
+
+    redelivered = [message(user_id, e.message.text, e.webhook_event_id, redelivery=True) for e in events]
+    assert len(app.run_events(redelivered)) == 2
+    assert titles(user_id) == ["牛奶", "雞蛋"]
+
+
+def signed_body(events):
+    body = json.dumps({"destination": "test", "events": events}, ensure_ascii=False)
+    secret = os.environ["LINE_CHANNEL_SECRET"].encode()
+    return body, base64.b64encode(hmac.new(secret, body.encode(), hashlib.sha256).digest()).decode()
+
+
+def webhook_message(user_id, text, event_id, redelivery=False):
+    return {
+        "type": "message", "mode": "active", "timestamp": 1700000000000,
+        "source": {"type": "user", "userId": user_id},
+        "webhookEventId": event_id, "deliveryContext": {"isRedelivery": redelivery},
+        "replyToken": f"reply-{uuid.uuid4().hex}",
+        "message": {"type": "text", "id": "1", "text": text, "quoteToken": "q"},
+    }
+
+
+def test_redelivered_webhook_is_handled_once(monkeypatch):
+    sent = []
+    monkeypatch.setattr(app.reply_sender, "reply", lambda token, messages: sent.append(token))
+    client = app.app.test_client()
+    user_id, event_id = new_user(), uuid.uuid4().hex
+    for redelivery in (False, True):
+        body, signature = signed_body([webhook_message(user_id, "生活 + 購物 + 牛奶", event_id, redelivery)])
+        response = client.post("/callback", data=body, headers={"X-Line-Signature": signature})
+        assert response.status_code == 200
+    assert len(sent) == 1
+    assert titles(user_id) == ["牛奶"]
+    assert app.deduplicator.stats()["duplicates"] >= 1
@@ -0,0 +1,46 @@
+import uuid
+
+import database as db
+from commands import LINE_MAX_MESSAGES, LINE_MESSAGE_LIMIT, message_length, render_list_pages, router
+
+
+def new_user():
+    return f"U{uuid.uuid4().hex}"
+
+
+def test_message_length_counts_utf16_units():
+    assert message_length("abc") == 3
+    assert message_length("待辦") == 2
+    assert message_length("📝") == 2
+
+
+def test_list_pages_fit_line_limit():
+    user_id = new_user()
+    db.add_items(user_id, "生活", "購物", [f"item {n}" for n in range(2000)])
+    pages, cursor = render_list_pages(user_id)
+    assert len(pages) == LINE_MAX_MESSAGES
+    assert cursor is not None
+    for page in pages:
+        assert message_length(page) <= LINE_MESSAGE_LIMIT
+
+
+def test_list_page_with_long_category_fits_line_limit():
+    user_id = new_user()
+    db.add_items(user_id, "📝" * 3000, "子", ["📝" * 3000, "短"])
+    pages, cursor = render_list_pages(user_id)
+    assert cursor is None
+    for page in pages:
+        assert message_length(page) <= LINE_MESSAGE_LIMIT
+
+
+def test_bulk_add_reply_fits_line_limit():
+    user_id = new_user()
+    reply = router.dispatch(user_id, "生活 + 購物 ++ " + ", ".join("📝" for _ in range(3000)))
+    assert message_length(reply) <= LINE_MESSAGE_LIMIT
+    assert reply.endswith("項")
+
+
+def test_bulk_add_reply_with_long_category_fits_line_limit():
+    user_id = new_user()
+    reply = router.dispatch(user_id, "📝" * 6000 + " + 購物 ++ 牛奶, 雞蛋")
+    assert message_length(reply) <= LINE_MESSAGE_LIMIT
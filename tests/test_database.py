@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+import database as db
+
+
+@pytest.fixture
+def engines(tmp_path):
+    # Two engines on one file stand in for two worker processes with their own category caches.
+    path = str(tmp_path / "todo.db")
+    first, second = db.SqliteEngine(path, announce=False), db.SqliteEngine(path, announce=False)
+    first.init_db()
+    yield first, second
+    first.close()
+    second.close()
+
+
+def titles_by_category(engine, user_id):
+    return sorted((row[6], row[7], row[1]) for row in engine.list_items(user_id))
+
+
+def test_add_item_after_another_worker_pruned_the_category(engines):
+    first, second = engines
+    first.add_item("U1", "生活", "購物", "牛奶")
+    second.delete_item("U1", [row[0] for row in second.list_items("U1")])
+    assert second.prune_orphan_categories(["U1"])
+    first.add_item("U1", "生活", "購物", "雞蛋")
+    assert titles_by_category(second, "U1") == [("生活", "購物", "雞蛋")]
+
+
+def test_add_items_after_another_worker_pruned_the_category(engines):
+    first, second = engines
+    first.add_items("U1", "生活", "購物", ["牛奶"])
+    second.delete_item("U1", [row[0] for row in second.list_items("U1")])
+    assert second.prune_orphan_categories(["U1"])
+    ids = first.add_items("U1", "生活", "購物", ["雞蛋", "麵包"])
+    assert len(ids) == 2
+    assert titles_by_category(second, "U1") == [("生活", "購物", "雞蛋"), ("生活", "購物", "麵包")]
+
+
+def test_prune_leaves_other_users_categories(engines):
+    first, second = engines
+    first.add_item("U1", "生活", "購物", "牛奶")
+    first.add_item("U2", "生活", "購物", "牛奶")
+    first.delete_item("U2", [row[0] for row in first.list_items("U2")])
+    second.prune_orphan_categories(["U1"])
+    first.add_item("U2", "生活", "購物", "雞蛋")
+    assert titles_by_category(first, "U1") == [("生活", "購物", "牛奶")]
+    assert titles_by_category(first, "U2") == [("生活", "購物", "雞蛋")]
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    engine = db.ShardedSqliteEngine(shards=4, db_file=str(tmp_path / "todo.db"))
+    engine.init_db()
+    yield engine
+    engine.close()
+
+
+def rows_in_shard(engine, n, table, column, value):
+    conn = sqlite3.connect(engine.shards[n].db_file)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} = ?", (value,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_sharded_engine_keeps_each_users_rows_in_one_shard(sharded):
+    users = [f"U{n}" for n in range(12)]
+    for user_id in users:
+        sharded.add_item(user_id, "工作", "會議", "準備簡報")
+        sharded.add_items(user_id, "生活", "購物", ["牛奶", "雞蛋"])
+        sharded.set_state(f"list-cursor:{user_id}", "{}", 10 ** 10)
+    assert len({db.shard_index(user_id, 4) for user_id in users}) > 1
+    for user_id in users:
+        home = db.shard_index(user_id, 4)
+        assert len(sharded.list_items(user_id)) == 3
+        for n in range(4):
+            expected = n == home
+            assert bool(rows_in_shard(sharded, n, "items", "user_id", user_id)) == expected
+            assert bool(rows_in_shard(sharded, n, "categories", "user_id", user_id)) == expected
+            assert bool(rows_in_shard(sharded, n, "conversation_states", "user_id",
+                                      f"list-cursor:{user_id}")) == expected
+
+
+def test_sharded_unit_of_work_rolls_back_a_failed_savepoint_in_every_shard(sharded):
+    users = [f"U{n}" for n in range(8)]
+    kept, dropped = users[0], next(u for u in users if db.shard_index(u, 4) != db.shard_index(users[0], 4))
+    with sharded.unit_of_work():
+        sharded.add_item(kept, "a", "b", "kept")
+        with pytest.raises(RuntimeError):
+            with sharded.savepoint():
+                sharded.add_item(dropped, "a", "b", "dropped")
+                sharded.add_item(kept, "a", "b", "dropped too")
+                raise RuntimeError
+    assert [row[1] for row in sharded.list_items(kept)] == ["kept"]
+    assert sharded.list_items(dropped) == []
@@ -0,0 +1,49 @@
+import sqlite3
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+import database as db
+from dedupe import EventDeduplicator
+
+
+def event(event_id=None, redelivery=False):
+    return SimpleNamespace(webhook_event_id=event_id or uuid.uuid4().hex,
+                           delivery_context=SimpleNamespace(is_redelivery=redelivery))
+
+
+def test_redelivered_event_is_duplicate():
+    dedupe = EventDeduplicator()
+    first = event()
+    assert not dedupe.is_duplicate(first)
+    assert dedupe.is_duplicate(event(first.webhook_event_id, redelivery=True))
+    assert dedupe.stats()["duplicates"] == 1
+    assert dedupe.stats()["redeliveries"] == 1
+
+
+def test_redelivery_is_accepted_after_forget():
+    dedupe = EventDeduplicator()
+    first = event()
+    dedupe.is_duplicate(first)
+    dedupe.forget(first)
+    assert not dedupe.is_duplicate(event(first.webhook_event_id, redelivery=True))
+
+
+def test_persistent_claim_seen_by_other_process():
+    first = event()
+    assert not EventDeduplicator(persistent=True).is_duplicate(first)
+    assert EventDeduplicator(persistent=True).is_duplicate(event(first.webhook_event_id, redelivery=True))
+
+
+def test_failed_claim_does_not_drop_redelivery(monkeypatch):
+    dedupe = EventDeduplicator(persistent=True)
+    first = event()
+
+    def locked(event_id, now):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(db, "claim_webhook_event", locked)
+    with pytest.raises(sqlite3.OperationalError):
+        dedupe.is_duplicate(first)
+    monkeypatch.undo()
+    assert not dedupe.is_duplicate(event(first.webhook_event_id, redelivery=True))
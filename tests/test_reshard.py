@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import database as db
+
+RESHARD = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reshard.py")
+USERS = [f"U{n}" for n in range(10)]
+
+
+def reshard(tmp_path, *args):
+    env = dict(os.environ, SQLITE_SHARDS="1")
+    subprocess.run([sys.executable, RESHARD, *args], cwd=tmp_path, env=env, check=True, capture_output=True)
+
+
+def items_by_user(engine):
+    return {user_id: sorted((row[6], row[7], row[1]) for row in engine.list_items(user_id)) for user_id in USERS}
+
+
+def test_reshard_moves_every_user_to_their_new_shard(tmp_path):
+    engine = db.ShardedSqliteEngine(shards=2, db_file=str(tmp_path / "todo.db"))
+    engine.init_db()
+    for n, user_id in enumerate(USERS):
+        engine.add_items(user_id, "生活", "購物", [f"牛奶{n}", f"雞蛋{n}"])
+        engine.add_item(user_id, "工作", "會議", f"簡報{n}")
+        engine.set_state(f"history-cursor:{user_id}", "{}", 10 ** 10)
+    before = items_by_user(engine)
+    engine.close()
+
+    reshard(tmp_path, "--from", "2", "--to", "3")
+    engine = db.ShardedSqliteEngine(shards=3, db_file=str(tmp_path / "todo.db"))
+    try:
+        assert items_by_user(engine) == before
+        for n, shard in enumerate(engine.shards):
+            conn = sqlite3.connect(shard.db_file)
+            owners = [row[0] for row in conn.execute("SELECT user_id FROM items")]
+            states = [row[0] for row in conn.execute("SELECT user_id FROM conversation_states")]
+            conn.close()
+            assert all(db.shard_index(user_id, 3) == n for user_id in owners)
+            assert all(db.shard_index(db.state_owner(key), 3) == n for key in states)
+    finally:
+        engine.close()
+
+
+def test_reshard_to_one_file_renumbers_clashing_ids(tmp_path):
+    engine = db.ShardedSqliteEngine(shards=3, db_file=str(tmp_path / "todo.db"))
+    engine.init_db()
+    for n, user_id in enumerate(USERS):
+        engine.add_items(user_id, "生活", "購物", [f"牛奶{n}", f"雞蛋{n}"])
+    before = items_by_user(engine)
+    engine.close()
+
+    reshard(tmp_path, "--from", "3", "--to", "1")
+    assert not (tmp_path / "todo-0.db").exists()
+    engine = db.SqliteEngine(str(tmp_path / "todo.db"), announce=False)
+    try:
+        assert items_by_user(engine) == before
+        ids = [row[0] for user_id in USERS for row in engine.list_items(user_id)]
+        assert len(ids) == len(set(ids)) == 2 * len(USERS)
+    finally:
+        engine.close()
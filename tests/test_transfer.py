@@ -0,0 +1,41 @@
+import pytest
+
+import transfer
+
+
+def test_token_round_trip():
+    token = transfer.sign_token("export", "U1", now=1000)
+    assert transfer.verify_token(token, "export", now=1001) == "U1"
+
+
+@pytest.mark.parametrize("scope, now", [("import", 1001), ("export", 10 ** 10)])
+def test_token_for_other_scope_or_expired_is_rejected(scope, now):
+    token = transfer.sign_token("export", "U1", now=1000)
+    assert transfer.verify_token(token, scope, now=now) is None
+
+
+@pytest.mark.parametrize("tamper", [
+    lambda token: token[:-1] + ("A" if token[-1] != "A" else "B"),
+    lambda token: "e30" + token[token.index("."):],
+    lambda token: token + "é",
+    lambda token: "代辦." + token.partition(".")[2],
+    lambda token: token.partition(".")[0],
+    lambda token: "",
+])
+def test_forged_token_is_rejected(tamper):
+    token = transfer.sign_token("export", "U1")
+    assert transfer.verify_token(tamper(token), "export") is None
+
+
+def test_export_with_non_ascii_token_is_forbidden():
+    import app
+    client = app.app.test_client()
+    token = transfer.sign_token("export", "U1")
+    assert client.get(f"/export/{token}é").status_code == 403
+    assert client.post("/import/代辦.x").status_code == 403
+
+
+def test_asgi_transfer_request_with_non_ascii_token_is_forbidden():
+    asgi = pytest.importorskip("asgi")
+    user_id, (status, _) = asgi.transfer_request({"path": "/import/代辦.x", "query_string": b""}, "import")
+    assert user_id is None and status == 403
@@ -0,0 +1,99 @@
+import os
+import re
+import time
+import unicodedata
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# Timestamps (completed_date, created_at) are stored as epoch seconds and
+# shown to users in APP_TIMEZONE, independent of the server's local zone.
+APP_TIMEZONE = ZoneInfo(os.getenv("APP_TIMEZONE", "Asia/Taipei"))
+
+# Due times: `30m` / `2h` / `3d` (also 分鐘 / 小時 / 天, optionally followed by
+# 後) from now, or an optional day (今天 / 明天 / 後天, today / tomorrow,
+# MM/DD, YYYY-MM-DD) followed by an optional time (HH:MM, 9點, 9點半, 9點15分).
+# A day without a time means DUE_DEFAULT_HOUR o'clock; a time without a day
+# means its next occurrence.
+DUE_DEFAULT_HOUR = 9
+_DUE_UNITS = {"m": 60, "min": 60, "分鐘": 60, "h": 3600, "小時": 3600, "d": 86400, "天": 86400}
+_DUE_RELATIVE = re.compile(r"(\d{1,4})\s*(min|m|分鐘|h|小時|d|天)後?")
+_DUE_DAY_WORDS = {"今天": 0, "today": 0, "明天": 1, "tomorrow": 1, "後天": 2}
+_DUE_ABSOLUTE = re.compile(
+    r"(?:(?P<word>今天|today|明天|tomorrow|後天)|(?:(?P<year>\d{4})[-/])?(?P<month>\d{1,2})[-/](?P<day>\d{1,2}))?"
+    r"\s*(?:(?P<hour>\d{1,2})(?::(?P<minute>\d{2})|點(?:(?P<half>半)|(?P<minutes>\d{1,2})分?)?))?")
+
+
+@lru_cache(maxsize=4096)
+def _format_minute(minute):
+    return datetime.fromtimestamp(minute * 60, APP_TIMEZONE).strftime("%Y-%m-%d %H:%M")
+
+
+def format_timestamp(epoch):
+    """Formats epoch seconds as `YYYY-MM-DD HH:MM` in APP_TIMEZONE.
+
+    Results are cached per minute, since a list shows many items finished
+    around the same time.
+    """
+    return _format_minute(int(epoch) // 60)
+
+
+def format_iso(epoch):
+    """Formats epoch seconds as ISO 8601 with the APP_TIMEZONE offset, e.g. for exports."""
+    return datetime.fromtimestamp(epoch, APP_TIMEZONE).isoformat()
+
+
+def parse_timestamp(value):
+    """Parses epoch seconds or an ISO 8601 date/time (read in APP_TIMEZONE without an offset).
+
+    Returns None for an empty value and raises ValueError for anything else.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    text = "" if value is None else str(value).strip()
+    if not text:
+        return None
+    if text.isdigit():
+        return int(text)
+    parsed = datetime.fromisoformat(text)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=APP_TIMEZONE)
+    return int(parsed.timestamp())
+
+
+def start_of_day(days_ago=0):
+    """Returns the epoch seconds of midnight `days_ago` days before today in APP_TIMEZONE."""
+    day = datetime.now(APP_TIMEZONE).date() - timedelta(days=days_ago)
+    return int(datetime(day.year, day.month, day.day, tzinfo=APP_TIMEZONE).timestamp())
+
+
+def parse_due(text, now=None):
+    """Parses a due time (see the formats above) into epoch seconds, or None if it is not one."""
+    text = unicodedata.normalize("NFKC", text or "").strip().lower()
+    now = time.time() if now is None else now
+    match = _DUE_RELATIVE.fullmatch(text)
+    if match:
+        return int(now + int(match.group(1)) * _DUE_UNITS[match.group(2)])
+    match = _DUE_ABSOLUTE.fullmatch(text)
+    if not text or not match:
+        return None
+    today = datetime.fromtimestamp(now, APP_TIMEZONE).date()
+    try:
+        if match["word"]:
+            day = today + timedelta(days=_DUE_DAY_WORDS[match["word"]])
+        elif match["month"]:
+            day = date(int(match["year"] or today.year), int(match["month"]), int(match["day"]))
+            if not match["year"] and day < today:
+                day = day.replace(year=day.year + 1)
+        else:
+            day = today
+        if match["hour"]:
+            minute = 30 if match["half"] else int(match["minute"] or match["minutes"] or 0)
+            due = datetime(day.year, day.month, day.day, int(match["hour"]), minute, tzinfo=APP_TIMEZONE)
+        else:
+            due = datetime(day.year, day.month, day.day, DUE_DEFAULT_HOUR, tzinfo=APP_TIMEZONE)
+    except ValueError:
+        return None
+    if not (match["word"] or match["month"]) and due.timestamp() <= now:
+        due += timedelta(days=1)
+    return int(due.timestamp())
@@ -0,0 +1,224 @@
+import base64
+import codecs
+import csv
+import hashlib
+import hmac
+import io
+import json
+import os
+import time
+
+import database as db
+from timeutil import format_iso, parse_timestamp
+
+# Bulk export and import of a user's items as CSV or JSON Lines. Both
+# directions stream: exports are read from the database in batches and sent as
+# they are written, imports are parsed line by line and inserted
+# IMPORT_CHUNK_SIZE rows per transaction, so memory use does not grow with the
+# size of a list. The HTTP endpoints are reached through signed links handed
+# out in chat, since LINE users have no other credentials for this server.
+
+FIELDS = ("category", "sub_category", "title", "place", "done", "completed_at", "created_at", "due_at")
+# Header names accepted on import besides FIELDS themselves.
+FIELD_ALIASES = {"主分類": "category", "子分類": "sub_category", "名稱": "title", "地點": "place", "完成": "done",
+                 "完成時間": "completed_at", "建立時間": "created_at", "到期時間": "due_at"}
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+TIMESTAMP_FIELDS = ("completed_at", "created_at", "due_at")
+TRUE_VALUES = {"1", "true", "yes", "y", "done", "是", "完成", "✅"}
+FALSE_VALUES = {"", "0", "false", "no", "n", "否", "未完成"}
+
+# Links handed out by the export/import commands start with PUBLIC_URL, the
+# base URL of this server as LINE users reach it (e.g. the ngrok URL), and
+# expire after TRANSFER_LINK_TTL seconds.
+TRANSFER_LINK_TTL = int(os.getenv("TRANSFER_LINK_TTL", 900))
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
+# An export is written out in pieces of about this many characters.
+EXPORT_FLUSH_SIZE = 64 * 1024
+# Only the first few bad rows are described in an import report.
+MAX_REPORTED_ERRORS = 5
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _signature(payload, secret):
+    key = (secret or os.getenv("LINE_CHANNEL_SECRET") or "").encode()
+    return _b64(hmac.new(key, b"transfer:" + payload.encode(), hashlib.sha256).digest())
+
+
+def sign_token(scope, user_id, ttl=None, secret=None, now=None):
+    """Returns a URL-safe token granting `scope` ("export" or "import") on the user's items until it expires."""
+    expires = int((time.time() if now is None else now) + (TRANSFER_LINK_TTL if ttl is None else ttl))
+    payload = _b64(json.dumps([scope, user_id, expires], separators=(",", ":")).encode())
+    return f"{payload}.{_signature(payload, secret)}"
+
+
+def verify_token(token, scope, secret=None, now=None):
+    """Returns the user_id a token was issued to, or None if it is forged, expired or for another scope."""
+    # Tokens are URL-safe base64; compare_digest raises on non-ASCII strings.
+    if not token.isascii():
+        return None
+    payload, _, signature = token.partition(".")
+    if not hmac.compare_digest(signature, _signature(payload, secret)):
+        return None
+    try:
+        token_scope, user_id, expires = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except ValueError:
+        return None
+    if token_scope != scope or expires < (time.time() if now is None else now):
+        return None
+    return user_id
+
+
+def transfer_url(scope, user_id, fmt):
+    """Returns a signed link for the export/import endpoint, or None without PUBLIC_URL."""
+    # Read per call: app.py loads .env after the command modules are imported.
+    base = os.getenv("PUBLIC_URL", "").rstrip("/")
+    if not base:
+        return None
+    return f"{base}/{scope}/{sign_token(scope, user_id)}?format={fmt}"
+
+
+def export_chunks(user_id, fmt="csv"):
+    """Yields the user's items, archived ones included, as `fmt` text in pieces of about EXPORT_FLUSH_SIZE."""
+    buffer = io.StringIO()
+    if fmt == "csv":
+        # The byte order mark lets spreadsheet apps recognise UTF-8.
+        buffer.write("\ufeff")
+        writer = csv.writer(buffer)
+        writer.writerow(FIELDS)
+    for row in db.export_items(user_id):
+        record = list(row)
+        record[4] = int(bool(record[4]))
+        for i in range(5, 8):
+            record[i] = None if record[i] is None else format_iso(record[i])
+        if fmt == "csv":
+            writer.writerow(record)
+        else:
+            buffer.write(json.dumps(dict(zip(FIELDS, record)), ensure_ascii=False) + "\n")
+        if buffer.tell() >= EXPORT_FLUSH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def decode_lines(chunks):
+    """Turns an iterable of byte chunks into lines of text (line ends kept), decoding UTF-8 with or without a BOM."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    rest = ""
+    for chunk in chunks:
+        parts = (rest + decoder.decode(chunk)).split("\n")
+        rest = parts.pop()
+        for part in parts:
+            yield part + "\n"
+    rest += decoder.decode(b"", final=True)
+    if rest:
+        yield rest
+
+
+class Importer:
+    """Parses CSV or JSON Lines and adds the rows to a user's items in chunks.
+
+    CSV may start with a header naming FIELDS (or the Chinese labels in
+    FIELD_ALIASES) in any order; without one, columns are taken in FIELDS
+    order, so pasted `主分類,子分類,名稱[,地點]` lines work as they are. Rows
+    that cannot be read are skipped and counted. `on_due` is called with the
+    earliest upcoming due time of each committed chunk.
+    """
+
+    def __init__(self, user_id, fmt="csv", chunk_size=IMPORT_CHUNK_SIZE, on_due=None):
+        self.user_id = user_id
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.on_due = on_due
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+        self._pending = []
+
+    def run(self, lines):
+        """Imports every row from an iterable of text lines; returns self."""
+        records = self._csv_records(lines) if self.fmt == "csv" else self._jsonl_records(lines)
+        try:
+            for line_number, record in records:
+                try:
+                    self._pending.append(self._parse(record))
+                except (ValueError, TypeError, AttributeError) as e:
+                    self._skip(line_number, e)
+                if len(self._pending) >= self.chunk_size:
+                    self._flush()
+        except csv.Error as e:
+            self._skip(None, e)
+        self._flush()
+        return self
+
+    def stats(self):
+        return {"imported": self.imported, "skipped": self.skipped, "errors": self.errors}
+
+    def summary(self):
+        text = f"已匯入 {self.imported} 筆項目" + (f"，略過 {self.skipped} 筆無法讀取的資料：" if self.skipped else "。")
+        return "\n".join([text] + self.errors)
+
+    def _csv_records(self, lines):
+        reader = csv.reader(lines)
+        columns = None
+        for record in reader:
+            if not any(cell.strip() for cell in record):
+                continue
+            if columns is None:
+                names = [FIELD_ALIASES.get(cell.strip(), cell.strip().lower()) for cell in record]
+                columns = names if set(names) <= set(FIELDS) else FIELDS
+                if columns is names:
+                    continue
+            yield reader.line_num, dict(zip(columns, record))
+
+    def _jsonl_records(self, lines):
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self._skip(line_number, "不是有效的 JSON")
+                continue
+            if not isinstance(record, dict):
+                self._skip(line_number, "每行需要是一個 JSON 物件")
+                continue
+            yield line_number, {FIELD_ALIASES.get(key, key): value for key, value in record.items()}
+
+    def _parse(self, record):
+        category, sub_category, title = (str(record.get(field) or "").strip()
+                                         for field in ("category", "sub_category", "title"))
+        if not (category and sub_category and title):
+            raise ValueError("主分類、子分類與名稱都不可空白")
+        place = str(record.get("place") or "").strip() or None
+        done = record.get("done")
+        if not isinstance(done, bool):
+            done = str(done if done is not None else "").strip().lower()
+            if done not in TRUE_VALUES | FALSE_VALUES:
+                raise ValueError(f"看不懂完成狀態「{done}」")
+            done = done in TRUE_VALUES
+        try:
+            completed_at, created_at, due_at = (parse_timestamp(record.get(field)) for field in TIMESTAMP_FIELDS)
+        except ValueError:
+            raise ValueError("時間格式需為 ISO 8601（例如 2026-10-20T18:30:00+08:00）或 epoch 秒") from None
+        if done and completed_at is None:
+            completed_at = int(time.time())
+        return (category, sub_category, title, place, done, completed_at if done else None, created_at, due_at)
+
+    def _skip(self, line_number, error):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"第 {line_number} 行：{error}" if line_number else str(error))
+
+    def _flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        self.imported += db.import_items(self.user_id, rows)
+        now = time.time()
+        upcoming = [row[7] for row in rows if row[7] is not None and not row[4] and row[7] > now]
+        if upcoming and self.on_due:
+            db.after_commit(lambda: self.on_due(min(upcoming)))
@@ -0,0 +1,69 @@
+import logging
+import queue
+import threading
+import zlib
+
+# Background processing of webhook events, so /callback can acknowledge LINE
+# as soon as the signature is verified.
+
+
+class EventDispatcher:
+    """Runs a handler over queued items on a fixed pool of worker threads.
+
+    Every key (the LINE user_id) is pinned to one worker, so items for the same
+    user are handled one at a time and in arrival order, while different users
+    are processed in parallel. Each worker has a bounded queue; `submit` waits
+    at most `enqueue_timeout` seconds for room and reports False when the pool
+    is saturated, so the caller can push back on the sender.
+    """
+
+    def __init__(self, handler, workers=4, queue_size=1000, enqueue_timeout=1.0, logger=None):
+        self.handler = handler
+        self.enqueue_timeout = enqueue_timeout
+        self.logger = logger or logging.getLogger(__name__)
+        per_worker = max(1, queue_size // workers)
+        self._queues = [queue.Queue(maxsize=per_worker) for _ in range(workers)]
+        self._threads = []
+        self._stopped = False
+        for n, q in enumerate(self._queues):
+            t = threading.Thread(target=self._run, args=(q,), name=f"event-worker-{n}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, key, item):
+        q = self._queues[zlib.crc32(str(key).encode()) % len(self._queues)]
+        try:
+            q.put(item, timeout=self.enqueue_timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def join(self):
+        """Blocks until every queued item has been handled."""
+        for q in self._queues:
+            q.join()
+
+    def shutdown(self):
+        """Lets the workers finish what is already queued, then stops them; later calls do nothing."""
+        if self._stopped:
+            return
+        self._stopped = True
+        for q in self._queues:
+            q.put(None)
+        for t in self._threads:
+            t.join()
+
+    def _run(self, q):
+        while True:
+            item = q.get()
+            try:
+                if item is None:
+                    return
+                self.handler(item)
+            except Exception:
+                self.logger.exception("Background event handler failed")
+            finally:
+                q.task_done()